@@ -0,0 +1,211 @@
+# analytics.py
+# Long-term completion analytics for the Family Task Bot.
+# History only keeps HISTORY_RETENTION_DAYS of events, so they are rolled up into one row per
+# (day, owner, task), kept indefinitely. A row holds the task's final state that day: completed
+# or incomplete (the last such event wins, so a task logged incomplete by the morning reminder and
+# finished later counts as done), plus whether it was deleted. Rows are credited to the task's
+# owner, not to whoever pressed the button. Rows are stored
+# column by column in typed arrays and appended in day order, so a report bisects the day column
+# to its date range and scans only that slice. Users and tasks are dictionary-encoded, and each
+# user's completion days are a CompletionSet for streaks. Rollups are built from history alone:
+# each ingest counts the entries after a timestamp watermark, so it must run at least once per
+# retention window (the daily reminder does it).
+
+import array
+import json
+import logging
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from completions import CompletionSet
+from storage import write_atomically
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("completed", "incomplete", "deleted")
+COLUMNS = ("day", "user", "task") + STATUSES
+TYPECODE = "i"
+# 2: rows hold each (day, owner, task)'s final state; version 1 counted events per acting user
+FORMAT_VERSION = 2
+
+def period_start(period, day):
+    """Return the first day of the "week" (Monday) or "month" containing day."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError("Report period must be 'week' or 'month'.")
+
+class Rollups:
+    def __init__(self, path):
+        self.path = path
+        self._columns = {name: array.array(TYPECODE) for name in COLUMNS}
+        self._users = []  # user code -> username (task owners)
+        self._user_codes = {}
+        self._tasks = []  # task code -> [task_id, latest title]
+        self._task_codes = {}
+        self._completion_days = {}  # user code -> CompletionSet of day ordinals with a completion
+        # Rows of the newest day, by (user code, task code); older rows never change again
+        self._last_day = 0
+        self._open_rows = {}
+        # (timestamp, n): every entry before timestamp is counted, plus the first n at it
+        self._watermark = ("", 0)
+        # Ingests may come from the writer thread (daily reminder) and read threads (/report)
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._columns["day"])
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("Ignoring unreadable %s; rebuilding rollups from retained history.", self.path)
+            return
+        if header.get("version") != FORMAT_VERSION:
+            logger.warning("Ignoring %s (format %s); rebuilding rollups from retained history.",
+                           self.path, header.get("version"))
+            return
+        size = header["rows"] * array.array(TYPECODE).itemsize
+        for index, name in enumerate(COLUMNS):
+            column = array.array(TYPECODE)
+            column.frombytes(body[index * size:(index + 1) * size])
+            if header["byteorder"] != sys.byteorder:
+                column.byteswap()
+            self._columns[name] = column
+        self._users = header["users"]
+        self._user_codes = {username: code for code, username in enumerate(self._users)}
+        self._tasks = header["tasks"]
+        self._task_codes = {task_id: code for code, (task_id, _) in enumerate(self._tasks)}
+        self._watermark = tuple(header["watermark"])
+        columns = self._columns
+        for day, user, completed in zip(columns["day"], columns["user"], columns["completed"]):
+            if completed:
+                self._completion_days.setdefault(user, CompletionSet()).add(day)
+        if len(self):
+            self._last_day = columns["day"][-1]
+            start = bisect_left(columns["day"], self._last_day)
+            self._open_rows = {(columns["user"][row], columns["task"][row]): row for row in range(start, len(self))}
+
+    def _save(self):
+        header = {"version": FORMAT_VERSION, "rows": len(self), "byteorder": sys.byteorder,
+                  "watermark": list(self._watermark), "users": self._users, "tasks": self._tasks}
+        write_atomically(self.path, json.dumps(header).encode() + b"\n" +
+                         b"".join(self._columns[name].tobytes() for name in COLUMNS))
+
+    def _code(self, codes, values, key):
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(values)
+            values.append(key)
+        return code
+
+    def _add(self, entry):
+        status = entry.get("status")
+        if status not in STATUSES:
+            return
+        # Days only move forward; a clock stepped backwards counts toward the newest day
+        day = max(date.fromisoformat(entry["timestamp"][:10]).toordinal(), self._last_day)
+        if day != self._last_day:
+            self._last_day = day
+            self._open_rows = {}
+        # Entries only carry "owner" when someone else acted on the task
+        user = self._code(self._user_codes, self._users, entry.get("owner") or entry.get("user") or "unknown")
+        task = self._task_codes.get(entry["task_id"])
+        if task is None:
+            task = self._task_codes[entry["task_id"]] = len(self._tasks)
+            self._tasks.append([entry["task_id"], entry["title"]])
+        else:
+            self._tasks[task][1] = entry["title"]
+        row = self._open_rows.get((user, task))
+        if row is None:
+            row = self._open_rows[(user, task)] = len(self)
+            for name, value in zip(COLUMNS, (day, user, task, 0, 0, 0)):
+                self._columns[name].append(value)
+        columns = self._columns
+        if status == "deleted":
+            columns["deleted"][row] = 1
+            return
+        done = status == "completed"
+        columns["completed"][row] = int(done)
+        columns["incomplete"][row] = int(not done)
+        if done:
+            self._completion_days.setdefault(user, CompletionSet()).add(day)
+        elif day in self._completion_days.get(user, ()):
+            # Un-done: the day only stays in the streak if another of the user's tasks is done
+            if not any(columns["completed"][r] for (u, _), r in self._open_rows.items() if u == user):
+                self._completion_days[user].remove(day)
+
+    def ingest(self, entries):
+        """Roll up history entries (oldest first) not counted yet; returns how many were new."""
+        with self._lock:
+            stamp, seen = self._watermark
+            start = bisect_left(entries, stamp, key=lambda entry: entry["timestamp"])
+            skip = seen
+            added = 0
+            for entry in entries[start:]:
+                timestamp = entry["timestamp"]
+                if timestamp == stamp and skip:
+                    skip -= 1
+                    continue
+                self._add(entry)
+                added += 1
+                if timestamp == stamp:
+                    seen += 1
+                else:
+                    stamp, seen = timestamp, 1
+            if added:
+                self._watermark = (stamp, seen)
+                self._save()
+            return added
+
+    def _streaks(self, user, start, end):
+        """Return (streak of completion days ending at end or the day before, longest run within start..end)."""
+        days = self._completion_days.get(user, CompletionSet())
+        current = 0
+        day = end if end in days else end - 1
+        while day in days:
+            current += 1
+            day -= 1
+        best = run = 0
+        for day in range(start, end + 1):
+            run = run + 1 if day in days else 0
+            best = max(best, run)
+        return current, best
+
+    def summary(self, start, end, top=5):
+        """Summarize the days start..end (dates, inclusive).
+
+        Returns {"users": {username: {"completed", "incomplete", "deleted", "rate", "streak",
+        "best_streak"}}, "top_tasks": [(title, completions)]}; rate is None with nothing to rate.
+        """
+        with self._lock:
+            columns = self._columns
+            lo = bisect_left(columns["day"], start.toordinal())
+            hi = bisect_right(columns["day"], end.toordinal())
+            per_user = {}
+            per_task = {}
+            for user, task, completed, incomplete, deleted in zip(
+                    *(columns[name][lo:hi] for name in ("user", "task") + STATUSES)):
+                counts = per_user.setdefault(user, [0, 0, 0])
+                counts[0] += completed
+                counts[1] += incomplete
+                counts[2] += deleted
+                if completed:
+                    per_task[task] = per_task.get(task, 0) + completed
+            users = {}
+            for user, (completed, incomplete, deleted) in per_user.items():
+                streak, best = self._streaks(user, start.toordinal(), end.toordinal())
+                users[self._users[user]] = {
+                    "completed": completed, "incomplete": incomplete, "deleted": deleted,
+                    "rate": completed / (completed + incomplete) if completed + incomplete else None,
+                    "streak": streak, "best_streak": best,
+                }
+            ranked = sorted(per_task.items(), key=lambda item: -item[1])[:top]
+            return {"users": users, "top_tasks": [(self._tasks[task][1], count) for task, count in ranked]}
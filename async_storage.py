@@ -0,0 +1,89 @@
+# async_storage.py
+# Async access to the blocking storage layer for the bot's handlers.
+# Reads run on a small dedicated thread pool so many callbacks can proceed at once;
+# writes are queued to a single writer task that runs them one at a time, in order,
+# on its own thread. The event loop itself never touches the disk.
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Methods that change data; everything else callable is treated as a read
+STORAGE_WRITES = frozenset({"add_user_if_new", "save_task", "delete_task", "delete_user",
+                            "log_history", "log_history_many", "prune_history", "flush", "set_user_settings",
+                            "save_tasks", "delete_tasks", "detach_chat"})
+TASK_MANAGER_WRITES = frozenset({"add_task", "complete_task", "toggle_task", "edit_task", "delete_task",
+                                 "log_incomplete_tasks", "add_tasks_bulk", "complete_tasks_bulk",
+                                 "delete_tasks_bulk", "import_tasks"})
+
+class BlockingIO:
+    """Dedicated threads for blocking storage calls: a read pool and one serialized writer."""
+    def __init__(self, read_workers=4):
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="storage-read")
+        self._writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-write")
+        self._queue = None
+        self._writer = None
+
+    async def read(self, fn, *args, **kwargs):
+        """Run fn on the read pool and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(fn, *args, **kwargs))
+
+    async def write(self, fn, *args, **kwargs):
+        """Queue fn for the writer task and return its result once it has run."""
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._writer.done() or self._writer.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._drain(), name="storage-writer")
+        future = loop.create_future()
+        self._queue.put_nowait((functools.partial(fn, *args, **kwargs), future))
+        metrics.incr("storage.writes_queued")
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            call, future = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(self._writer_thread, call)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        """Wait for queued writes to finish, then stop the writer task and threads."""
+        if self._writer is not None:
+            await self._queue.join()
+            self._writer.cancel()
+            self._writer = None
+        self._readers.shutdown(wait=True)
+        self._writer_thread.shutdown(wait=True)
+
+class AsyncFacade:
+    """Awaitable view of a Storage or TaskManager: `await facade.method(...)` runs it on `io`.
+
+    `sync` is the wrapped object, for pure helpers (validators) that do no I/O.
+    """
+    def __init__(self, target, write_methods, io):
+        self.sync = target
+        self._write_methods = write_methods
+        self._io = io
+
+    def __getattr__(self, name):
+        attr = getattr(self.sync, name)
+        if not callable(attr):
+            return attr
+        run = self._io.write if name in self._write_methods else self._io.read
+        method = functools.partial(run, attr)
+        # Cache the bound wrapper so repeated calls skip __getattr__
+        setattr(self, name, method)
+        return method
@@ -0,0 +1,311 @@
+# benchmark.py
+# Benchmarks the Family Task Bot's hot paths against synthetic households.
+#
+# Usage:
+#   python benchmark.py                                  # 10 and 100 users, 10-50 tasks each
+#   python benchmark.py --users 10 100 1000 --tasks 10 500 --output bench.json
+#   python benchmark.py --compare bench.json             # flag cases that got slower
+#   python benchmark.py --startup                        # check import times against STARTUP_TARGETS_MS
+#
+# Each scale runs in its own temporary directory with generated tasks.json and history
+# segments. Results are printed (or written) as JSON so runs can be diffed for regressions.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Median milliseconds to import each module in a fresh interpreter without BOT_TOKEN set. Modules
+# that don't talk to Telegram must also import without loading python-telegram-bot.
+STARTUP_TARGETS_MS = {"config": 50, "task_manager": 100, "ui": 100, "main": 750}
+STARTUP_WITHOUT_TELEGRAM = ("config", "task_manager", "ui")
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def generate_household(users, min_tasks, max_tasks, completion_days, history_events, seed=0):
+    """Write tasks.json and history segments for a synthetic household into the current directory."""
+    from config import TASKS_FILE, HISTORY_DIR
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    data = {"users": {}}
+    all_tasks = []
+    for u in range(users):
+        username = f"user{u:04d}"
+        tasks = []
+        for _ in range(rng.randint(min_tasks, max_tasks)):
+            task_type = rng.choice(["daily", "recurring", "one-time"])
+            task = {"id": str(uuid.UUID(int=rng.getrandbits(128))), "title": f"Chore {rng.randint(1, 9999)}",
+                    "type": task_type, "time": f"{rng.randint(0, 23):02d}:{rng.choice(['00', '30'])}"}
+            if task_type == "one-time":
+                task["date"] = (today + timedelta(days=rng.randint(-10, 30))).isoformat()
+                task["completions"] = [task["date"]] if rng.random() < 0.3 else []
+            else:
+                if task_type == "recurring":
+                    task["days"] = sorted(rng.sample(DAYS, rng.randint(1, 4)), key=DAYS.index)
+                task["completions"] = [
+                    (today - timedelta(days=d)).isoformat()
+                    for d in range(completion_days, -1, -1) if rng.random() < 0.7
+                ]
+            tasks.append(task)
+            all_tasks.append((username, task))
+        data["users"][username] = {"chat_id": 100000 + u, "tasks": tasks}
+    with open(TASKS_FILE, "w") as f:
+        json.dump(data, f)
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    now = datetime.now()
+    segments = {}
+    for i in range(history_events):
+        username, task = rng.choice(all_tasks)
+        timestamp = (now - timedelta(seconds=rng.randint(0, 13 * 86400))).isoformat()
+        segments.setdefault(timestamp[:10], []).append({
+            "task_id": task["id"], "title": task["title"],
+            "status": rng.choice(["completed", "incomplete", "deleted"]),
+            "timestamp": timestamp, "user": username,
+        })
+    for day, entries in segments.items():
+        entries.sort(key=lambda e: e["timestamp"])
+        with open(os.path.join(HISTORY_DIR, f"{day}.jsonl"), "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in entries)
+    return all_tasks
+
+def measure(fn, repeat):
+    """Run fn repeat times and summarize wall-clock times in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+class StubQuery:
+    """Minimal CallbackQuery stand-in: records edits instead of calling Telegram."""
+    def __init__(self, data, username, chat_id):
+        self.data = data
+        self.from_user = SimpleNamespace(username=username)
+        self.message = SimpleNamespace(chat_id=chat_id, message_id=1)
+        self.edits = 0
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, *args, **kwargs):
+        self.edits += 1
+
+    async def edit_message_reply_markup(self, *args, **kwargs):
+        self.edits += 1
+
+class StubBot:
+    async def send_message(self, *args, **kwargs):
+        pass
+
+def run_scale(users, min_tasks, max_tasks, completion_days, history_events, repeat, seed):
+    """Benchmark one household size; returns {case: stats}."""
+    from storage import create_storage
+    from task_manager import TaskManager
+    results = {}
+    all_tasks = generate_household(users, min_tasks, max_tasks, completion_days, history_events, seed)
+    rng = random.Random(seed + 1)
+    storage = create_storage()
+    task_mgr = TaskManager(storage)
+    usernames = storage.get_all_users()
+
+    results["storage.get_all_users"] = measure(storage.get_all_users, repeat)
+    results["storage.get_user_tasks"] = measure(lambda: storage.get_user_tasks(rng.choice(usernames)), repeat)
+    results["storage.find_task"] = measure(lambda: storage.find_task(rng.choice(all_tasks)[1]["id"]), repeat)
+
+    def save_task():
+        username, task = rng.choice(all_tasks)
+        storage.save_task(username, dict(task, title=f"Renamed {rng.randint(1, 9999)}"))
+    results["storage.save_task"] = measure(save_task, repeat)
+
+    def add_delete_task():
+        task = {"id": str(uuid.uuid4()), "title": "Temp", "type": "daily"}
+        username = rng.choice(usernames)
+        storage.save_task(username, task)
+        storage.delete_task(username, task["id"])
+    results["storage.save_task+delete_task"] = measure(add_delete_task, repeat)
+    results["storage.log_history"] = measure(
+        lambda: storage.log_history(rng.choice(all_tasks)[1], "completed", rng.choice(usernames)), repeat)
+
+    def due_today_cold():
+        task_mgr._agenda.clear()
+        task_mgr.get_tasks_due_today(rng.choice(usernames))
+    results["task_mgr.get_tasks_due_today (cold)"] = measure(due_today_cold, repeat)
+    task_mgr.get_agenda()
+    results["task_mgr.get_tasks_due_today (warm)"] = measure(
+        lambda: task_mgr.get_tasks_due_today(rng.choice(usernames)), repeat)
+    results["task_mgr.toggle_task"] = measure(lambda: task_mgr.toggle_task(*_pick_id(rng, all_tasks)), repeat)
+    results["task_mgr.log_incomplete_tasks"] = measure(task_mgr.log_incomplete_tasks, max(1, repeat // 10))
+    results["task_mgr.get_report (month)"] = measure(lambda: task_mgr.get_report("month", rng.choice(usernames)), repeat)
+
+    try:
+        import main
+        from ui import UI
+    except ImportError as e:
+        # ui/main need python-telegram-bot; storage numbers above are still useful without it
+        for case in ("ui.all_tasks_message_and_keyboard", "ui.history_view", "button(view_all)", "button(history_)",
+                     "button(toggle_)"):
+            results[case] = {"skipped": str(e)}
+        return results
+
+    # Keep per-task log lines out of the benchmark output
+    logging.getLogger().setLevel(logging.WARNING)
+    ui = UI()
+    agenda_tasks = []
+    for username, tasks in task_mgr.get_agenda().items():
+        for task in tasks:
+            task["owner"] = username
+            agenda_tasks.append(task)
+    results["ui.all_tasks_message_and_keyboard"] = measure(lambda: ui.all_tasks_message_and_keyboard(agenda_tasks), repeat)
+    def history_page():
+        page = rng.randint(0, 5)
+        entries, total, _ = task_mgr.get_history_page(page, ui.history_page_size)
+        ui.history_view(entries, total, page)
+    results["ui.history_view"] = measure(history_page, repeat)
+
+    # Point the bot's module-level state at this scale's data
+    from async_storage import BlockingIO
+    from households import HouseholdPool, DEFAULT_HOUSEHOLD
+    main.io = BlockingIO()
+    main.pool = HouseholdPool(main.households, main.io, 1)
+    main.pool.attach(DEFAULT_HOUSEHOLD, storage, task_mgr)
+    context = SimpleNamespace(bot=StubBot())
+    loop = asyncio.new_event_loop()
+
+    def press(data):
+        query = StubQuery(data, rng.choice(usernames), 4242)
+        loop.run_until_complete(main.button(SimpleNamespace(callback_query=query), context))
+
+    results["button(view_all)"] = measure(lambda: press("view_all"), repeat)
+    results["button(history_)"] = measure(lambda: press(f"history_{rng.randint(0, 5)}"), repeat)
+    results["button(toggle_)"] = measure(lambda: press(f"toggle_{_pick_id(rng, all_tasks)[1]}"), repeat)
+    loop.run_until_complete(main.io.close())
+    loop.close()
+    return results
+
+def _pick_id(rng, all_tasks):
+    username, task = rng.choice(all_tasks)
+    return username, task["id"]
+
+def measure_startup(repeat):
+    """Time importing each module of STARTUP_TARGETS_MS in fresh interpreters without BOT_TOKEN."""
+    env = {key: value for key, value in os.environ.items() if key != "BOT_TOKEN"}
+    results = {}
+    for module in STARTUP_TARGETS_MS:
+        code = (f"import sys, time; started = time.perf_counter(); import {module}; "
+                f"print((time.perf_counter() - started) * 1000, 'telegram' in sys.modules)")
+        samples = []
+        for _ in range(repeat):
+            run = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+            if run.returncode:
+                error = run.stderr.strip().splitlines()[-1]
+                results[module] = {"skipped" if "No module named 'telegram'" in error else "error": error}
+                break
+            milliseconds, telegram_loaded = run.stdout.split()
+            samples.append(float(milliseconds))
+        else:
+            results[module] = {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3),
+                               "runs": len(samples), "telegram_loaded": telegram_loaded == "True"}
+    return results
+
+def check_startup(startup):
+    """Print each module's import time against its target; return the number of failures."""
+    failures = 0
+    for module, stats in startup.items():
+        target = STARTUP_TARGETS_MS[module]
+        if "median_ms" not in stats:
+            failures += "error" in stats
+            print(f"{module:<16} {stats.get('error') or stats.get('skipped')}", file=sys.stderr)
+            continue
+        problems = []
+        if stats["median_ms"] > target:
+            problems.append("OVER TARGET")
+        if stats["telegram_loaded"] and module in STARTUP_WITHOUT_TELEGRAM:
+            problems.append("LOADS TELEGRAM")
+        failures += bool(problems)
+        print(f"{module:<16} {stats['median_ms']:>10.3f} ms  (target {target} ms) {' '.join(problems)}", file=sys.stderr)
+    return failures
+
+def compare(current, baseline_path, threshold):
+    """Print median-time ratios against a previous run; return the number of regressions."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    regressions = 0
+    for scale, cases in current["scales"].items():
+        for case, stats in cases.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(case, {})
+            if "median_ms" not in stats or "median_ms" not in before or not before["median_ms"]:
+                continue
+            ratio = stats["median_ms"] / before["median_ms"]
+            flag = "REGRESSION" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"{scale:>20} {case:<40} {before['median_ms']:>10.3f} -> {stats['median_ms']:>10.3f} ms  x{ratio:.2f} {flag}", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Family Task Bot hot paths on synthetic households.")
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100], help="household sizes to run")
+    parser.add_argument("--tasks", type=int, nargs=2, default=[10, 50], metavar=("MIN", "MAX"), help="tasks per user")
+    parser.add_argument("--completion-days", type=int, default=90, help="days of completions on daily/recurring tasks")
+    parser.add_argument("--history-events", type=int, default=5000, help="history entries across the retention window")
+    parser.add_argument("--repeat", type=int, default=50, help="samples per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON results to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio above which --compare reports a regression")
+    parser.add_argument("--startup", action="store_true",
+                        help="only time module imports against STARTUP_TARGETS_MS; exits 1 if any misses")
+    args = parser.parse_args()
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "scales": {},
+    }
+    if args.startup:
+        report["startup"] = measure_startup(max(1, args.repeat // 5))
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if check_startup(report["startup"]) else 0)
+    cwd = os.getcwd()
+    for users in args.users:
+        scale = f"{users}u_{args.tasks[0]}-{args.tasks[1]}t"
+        with tempfile.TemporaryDirectory(prefix="taskbot-bench-") as workdir:
+            os.chdir(workdir)
+            try:
+                report["scales"][scale] = run_scale(users, args.tasks[0], args.tasks[1], args.completion_days,
+                                                    args.history_events, args.repeat, args.seed)
+            finally:
+                os.chdir(cwd)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        sys.exit(1 if compare(report, args.compare, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# completions.py
+# Compact completion tracking for tasks.
+# A task's completion days are kept as a bitmap over day ordinals instead of a growing
+# list of ISO date strings, so "done today?" and "completed on/after the due date?" are
+# O(1). On disk (tasks.json, SQLite) completions stay a sorted list of "YYYY-MM-DD".
+
+from datetime import date
+from config import COMPLETION_RETENTION_DAYS
+
+def _ordinal(day):
+    """Convert an ISO date string, date or ordinal to a day ordinal."""
+    if isinstance(day, str):
+        return date.fromisoformat(day).toordinal()
+    if isinstance(day, date):
+        return day.toordinal()
+    return day
+
+class CompletionSet:
+    """Set of completion days; behaves like the old list of ISO strings (in, append, remove, iteration)."""
+    __slots__ = ("_base", "_bits")
+
+    def __init__(self, days=()):
+        # Bit i set means day ordinal _base + i is completed; _base is always the earliest day
+        self._base = 0
+        self._bits = 0
+        for day in days:
+            self.add(day)
+
+    @classmethod
+    def coerce(cls, days):
+        """Return a CompletionSet copy of days (a CompletionSet or an iterable of days)."""
+        if isinstance(days, cls):
+            return days.copy()
+        return cls(days or ())
+
+    def copy(self):
+        other = CompletionSet()
+        other._base = self._base
+        other._bits = self._bits
+        return other
+
+    def _normalize(self):
+        """Shift the bitmap so its lowest set bit is day _base."""
+        if not self._bits:
+            self._base = 0
+            return
+        low = (self._bits & -self._bits).bit_length() - 1
+        if low:
+            self._bits >>= low
+            self._base += low
+
+    def add(self, day):
+        """Mark a day as completed."""
+        ordinal = _ordinal(day)
+        if not self._bits:
+            self._base = ordinal
+            self._bits = 1
+            return
+        if ordinal < self._base:
+            self._bits <<= self._base - ordinal
+            self._base = ordinal
+        self._bits |= 1 << (ordinal - self._base)
+
+    append = add
+
+    def remove(self, day):
+        """Unmark a day; raises ValueError if it wasn't completed (like list.remove)."""
+        if day not in self:
+            raise ValueError(f"{day} is not a completion day.")
+        self._bits &= ~(1 << (_ordinal(day) - self._base))
+        self._normalize()
+
+    def __contains__(self, day):
+        try:
+            offset = _ordinal(day) - self._base
+        except (TypeError, ValueError):
+            return False
+        return offset >= 0 and bool(self._bits >> offset & 1)
+
+    def earliest(self):
+        """Return the earliest completion date, or None."""
+        return date.fromordinal(self._base) if self._bits else None
+
+    def latest(self):
+        """Return the latest completion date, or None."""
+        return date.fromordinal(self._base + self._bits.bit_length() - 1) if self._bits else None
+
+    def completed_on_or_after(self, day):
+        """Return True if any completion falls on or after day."""
+        return bool(self._bits) and self._base + self._bits.bit_length() - 1 >= _ordinal(day)
+
+    def completed_on_or_before(self, day):
+        """Return True if any completion falls on or before day."""
+        return bool(self._bits) and self._base <= _ordinal(day)
+
+    def trim(self, keep_from):
+        """Drop completions before keep_from (windowed retention)."""
+        shift = _ordinal(keep_from) - self._base
+        if self._bits and shift > 0:
+            self._bits >>= shift
+            self._base += shift
+            self._normalize()
+
+    def __iter__(self):
+        bits, ordinal = self._bits, self._base
+        while bits:
+            if bits & 1:
+                yield date.fromordinal(ordinal).isoformat()
+            bits >>= 1
+            ordinal += 1
+
+    def __len__(self):
+        return self._bits.bit_count()
+
+    def __bool__(self):
+        return bool(self._bits)
+
+    def __eq__(self, other):
+        if isinstance(other, CompletionSet):
+            return (self._base, self._bits) == (other._base, other._bits) or not (self._bits or other._bits)
+        try:
+            return list(self) == sorted(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"CompletionSet({list(self)!r})"
+
+    def to_list(self):
+        """Return completions as sorted ISO date strings (the on-disk format)."""
+        return list(self)
+
+def compact_completions(task, retention_days=COMPLETION_RETENTION_DAYS):
+    """Return a task's completions as a CompletionSet, trimmed to the retention window for daily/recurring tasks."""
+    completions = CompletionSet.coerce(task.get("completions"))
+    if task.get("type") in ("daily", "recurring"):
+        completions.trim(date.today().toordinal() - retention_days)
+    return completions
+
+def task_completions(task):
+    """Return a task's completions as a CompletionSet without copying when it already is one."""
+    completions = task.get("completions")
+    return completions if isinstance(completions, CompletionSet) else CompletionSet(completions or ())
+
+def json_default(obj):
+    """json.dumps default= hook that writes CompletionSets in the on-disk list format."""
+    if isinstance(obj, CompletionSet):
+        return obj.to_list()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -1,30 +1,123 @@
 """
 File: config.py
 Purpose: Configuration settings and constants for the Family Task Bot.
-Dependencies: python-dotenv==1.0.1
+Dependencies: python-dotenv==1.0.1 (optional; without it .env is not read)
 Last Modified: 2024-11-01
 """
 
 import os
-try:
-    from dotenv import load_dotenv
-except ImportError:
-    raise ImportError(
-        "Could not import dotenv module. "
-        "Please install it using 'pip install python-dotenv==1.0.1'"
-    )
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Telegram Bot Token (loaded from .env)
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise ValueError("BOT_TOKEN not found in .env file.")
+import secrets
+
+# Settings taken from the environment are declared with _from_env() and read (after loading .env)
+# on first access, e.g. `from config import LOG_LEVEL`, so importing config itself touches nothing.
+_env_loaded = False
+# name -> (default, parse); parse turns the string value into the setting's type
+_ENV_SETTINGS = {}
+_settings = {}
+
+def _load_env():
+    """Load .env into the environment once; quietly skipped if python-dotenv isn't installed."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+def _from_env(name, default=None, parse=None):
+    """Declare config.<name> as the environment variable of that name, parsed on first access."""
+    _ENV_SETTINGS[name] = (default, parse)
+
+def __getattr__(name):
+    if name == "BOT_TOKEN":
+        return bot_token()
+    if name == "WEBHOOK_SECRET":
+        return webhook_secret()
+    if name not in _ENV_SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name not in _settings:
+        _load_env()
+        default, parse = _ENV_SETTINGS[name]
+        value = os.getenv(name, default)
+        _settings[name] = parse(value) if parse and value is not None else value
+    return _settings[name]
+
+def _flag(value):
+    return value == "1"
+
+# Telegram Bot Token (loaded from .env). Only the bot itself needs it, so it is checked when read
+# (bot_token() or config.BOT_TOKEN) rather than at import; tools and the benchmark import config without one.
+def bot_token():
+    """Return the bot token, or raise ValueError if it isn't set."""
+    _load_env()
+    token = os.getenv("BOT_TOKEN")
+    if not token:
+        raise ValueError("BOT_TOKEN not found in .env file.")
+    return token
+
+# How updates arrive: "polling" (long polling) or "webhook" (Telegram POSTs each update to a local
+# HTTP server at WEBHOOK_LISTEN:WEBHOOK_PORT/WEBHOOK_PATH, published at WEBHOOK_URL by a reverse proxy).
+# Telegram echoes WEBHOOK_SECRET in a header on every POST; requests without it are rejected.
+_from_env("UPDATE_MODE", "polling")
+_from_env("WEBHOOK_URL")  # Public HTTPS base URL, e.g. https://bot.example.com
+_from_env("WEBHOOK_LISTEN", "127.0.0.1")
+_from_env("WEBHOOK_PORT", "8443", int)
+_from_env("WEBHOOK_PATH", "telegram")
+_webhook_secret = None
+
+def webhook_secret():
+    """Return WEBHOOK_SECRET, or a random secret generated on first use and kept for the process."""
+    global _webhook_secret
+    if _webhook_secret is None:
+        _load_env()
+        _webhook_secret = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    return _webhook_secret
+
+# Bot API server, e.g. a self-hosted one or a local fake for testing (None = api.telegram.org)
+_from_env("TELEGRAM_API_URL")
+# Only the update types the bot's handlers use are requested from Telegram
+ALLOWED_UPDATES = ["message", "callback_query"]
+# Updates handled at once (storage calls still share STORAGE_READ_WORKERS and one writer)
+_from_env("CONCURRENT_UPDATES", "16", int)
 
 # File paths for JSON storage
 TASKS_FILE = "tasks.json"
-HISTORY_FILE = "history.json"
+HISTORY_FILE = "history.json"  # Legacy single-file history, read for compatibility
+HISTORY_DIR = "history"  # Per-day JSON-lines history segments
+ANALYTICS_FILE = "analytics.bin"  # Per-day, per-user, per-task rollups of history, kept indefinitely
+
+# Storage backend: "json" (tasks.json + history/) or "sqlite" (imports the JSON files on first run)
+_from_env("STORAGE_BACKEND", "json")
+SQLITE_FILE = "tasks.db"
+
+# Households: HOUSEHOLDS_FILE maps chats and invite codes to households, each of which keeps its
+# own copy of the files above under HOUSEHOLDS_DIR/<id>/. At most HOUSEHOLD_MAX_OPEN stay loaded.
+HOUSEHOLDS_FILE = "households.json"
+HOUSEHOLDS_DIR = "households"
+HOUSEHOLD_MAX_OPEN = 256
+
+# Threads for blocking storage reads from the async handlers; writes always go through one writer thread
+STORAGE_READ_WORKERS = 4
+
+# Multi-step flow state per chat: idle timeout, size cap, and file to survive restarts (None = memory only).
+# Changed flows are written every USER_STATES_SAVE_INTERVAL seconds and at shutdown, not on every tap.
+USER_STATE_TTL_SECONDS = 30 * 60
+USER_STATE_MAX_ENTRIES = 1000
+USER_STATES_FILE = "user_states.json"
+USER_STATES_SAVE_INTERVAL = 5
+
+# Write-behind for tasks.json (off by default): each change is appended to TASKS_JOURNAL_FILE at once
+# and tasks.json is rewritten after WRITE_BEHIND_DELAY seconds or WRITE_BEHIND_MAX_PENDING changes
+_from_env("WRITE_BEHIND", "0", _flag)
+WRITE_BEHIND_DELAY = 2.0
+WRITE_BEHIND_MAX_PENDING = 50
+TASKS_JOURNAL_FILE = "tasks.journal"
+
+# JSON indentation for tasks.json; None writes compact JSON (faster), 2 is human-readable
+JSON_INDENT = None
 
 # Constants for task types
 TASK_TYPES = {
@@ -36,11 +129,47 @@ TASK_TYPES = {
 # Valid days for recurring tasks
 VALID_DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
-# Time for daily reminders (7 AM)
+# Default time for daily reminders (7 AM); users can pick their own with /reminder
 REMINDER_TIME = "07:00"
 
+# Reminder jobs: users sharing a timezone and reminder time form a bucket with one job each;
+# buckets larger than REMINDER_BUCKET_SIZE are split into chunks REMINDER_CHUNK_SPACING seconds apart
+REMINDER_BUCKET_SIZE = 200
+REMINDER_CHUNK_SPACING = 60
+
+# Reminder fan-out: parallel sends and Telegram's rate limits (messages per second)
+REMINDER_CONCURRENCY = 8
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_PER_CHAT_RATE = 1
+REMINDER_MAX_RETRIES = 3
+
+# Due-time alerts: one repeating job checks the alert heap every DUE_ALERT_TICK_SECONDS, and
+# each user's alerts are rebuilt when their local day changes (checked every DUE_ALERT_ROLLOVER_SECONDS)
+_from_env("DUE_ALERTS_ENABLED", "1", _flag)
+DUE_ALERT_TICK_SECONDS = 30
+DUE_ALERT_ROLLOVER_SECONDS = 300
+
+# Completion days kept on daily/recurring tasks (one-time tasks keep all of theirs)
+COMPLETION_RETENTION_DAYS = 60
+
 # History retention period (14 days)
 HISTORY_RETENTION_DAYS = 14
 
-# Timezone assumption (single time zone for this version)
+# Logging: root level, per-module overrides ("module=LEVEL,..."), "text" or "json" output, and the
+# fraction of per-task filter decisions traced when task_manager logs at DEBUG
+_from_env("LOG_LEVEL", "INFO")
+_from_env("LOG_LEVELS", "task_manager=WARNING,httpx=WARNING,apscheduler=WARNING")
+_from_env("LOG_FORMAT", "text")
+_from_env("LOG_TRACE_SAMPLE_RATE", "0.01", float)
+
+# Metrics for /stats (off by default); optional periodic JSON dump of the snapshot
+_from_env("METRICS_ENABLED", "0", _flag)
+METRICS_MAX_SAMPLES = 1024  # Recent samples kept per timer for percentiles
+_from_env("METRICS_DUMP_FILE")  # e.g. "metrics.json"; None disables the dump
+METRICS_DUMP_INTERVAL = 300  # Seconds between dumps
+
+# Telegram usernames allowed to use admin commands such as /stats (comma-separated in .env)
+_from_env("ADMIN_USERS", "", lambda value: [u.strip().lstrip("@") for u in value.split(",") if u.strip()])
+
+# Default timezone for users who haven't set one with /timezone
 TIMEZONE = "America/Chicago"
\ No newline at end of file
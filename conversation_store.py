@@ -0,0 +1,132 @@
+# conversation_store.py
+# Conversation state for multi-step flows (add task, edit task, add/delete user), keyed by chat ID.
+# Entries expire after a TTL of inactivity, the least recently used entries are evicted
+# past a size cap, and the store can be persisted so in-flight flows survive a restart.
+# Changes only mark the store dirty; the owner writes a snapshot() with save() off the event
+# loop every few seconds, so a tap never waits on the disk.
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from storage import write_atomically
+
+logger = logging.getLogger(__name__)
+
+class ConversationStore:
+    def __init__(self, ttl, max_size, path=None, persist_if=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path = path
+        # Only states persist_if(state) accepts are saved (all if None); the rest are memory-only
+        self.persist_if = persist_if
+        # True when a saved state changed since the last snapshot()
+        self.dirty = False
+        # chat_id -> (state, expires_at); ordered least to most recently used. None until first use,
+        # so the saved file is read when a flow is first touched rather than when the store is created
+        self._entries = None
+        self.expired = 0
+        self.evicted = 0
+
+    @property
+    def _states(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            if self.path:
+                self._load()
+        return self._entries
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            logger.warning("Ignoring unreadable conversation state file %s: %s", self.path, e)
+            return
+        now = time.time()
+        for chat_id, (state, expires_at) in sorted(saved.items(), key=lambda item: item[1][1]):
+            if expires_at > now:
+                # JSON object keys are strings; chat IDs are ints
+                self._states[int(chat_id)] = (state, expires_at)
+
+    def _persisted(self, state):
+        return self.persist_if is None or self.persist_if(state)
+
+    def _changed(self, *states):
+        """Mark the store dirty if any of the added or removed states is one that gets saved."""
+        if self.path and any(state is not None and self._persisted(state) for state in states):
+            self.dirty = True
+
+    def snapshot(self):
+        """Return the saved states as JSON for save() and clear dirty."""
+        self.dirty = False
+        return json.dumps({str(k): [s, e] for k, (s, e) in self._states.items() if self._persisted(s)})
+
+    def save(self, snapshot=None):
+        """Write a snapshot() (taken now if not given) to path; blocking, so run it off the event loop."""
+        if self.path:
+            write_atomically(self.path, self.snapshot() if snapshot is None else snapshot)
+
+    def _sweep(self, now):
+        """Drop expired entries; with a sliding TTL they are always at the LRU end."""
+        while self._states:
+            chat_id, (state, expires_at) = next(iter(self._states.items()))
+            if expires_at > now:
+                break
+            del self._states[chat_id]
+            self.expired += 1
+            self._changed(state)
+
+    def get(self, chat_id, default=None):
+        """Return the chat's state (refreshing its TTL), or default if missing or expired."""
+        now = time.time()
+        entry = self._states.get(chat_id)
+        if entry is None:
+            return default
+        if entry[1] <= now:
+            del self._states[chat_id]
+            self.expired += 1
+            self._changed(entry[0])
+            return default
+        self._states[chat_id] = (entry[0], now + self.ttl)
+        self._states.move_to_end(chat_id)
+        # The refreshed expiry is saved too, or a flow that is only read would expire after a restart
+        self._changed(entry[0])
+        return entry[0]
+
+    def set(self, chat_id, state):
+        """Store (or replace) a chat's state."""
+        now = time.time()
+        self._sweep(now)
+        previous = self._states.get(chat_id)
+        self._states[chat_id] = (state, now + self.ttl)
+        self._states.move_to_end(chat_id)
+        self._changed(state, previous and previous[0])
+        while len(self._states) > self.max_size:
+            _, (evicted, _) = self._states.popitem(last=False)
+            self.evicted += 1
+            self._changed(evicted)
+
+    def update(self, chat_id, **fields):
+        """Merge fields into a chat's state and store it; returns the updated state."""
+        state = dict(self.get(chat_id, {}), **fields)
+        self.set(chat_id, state)
+        return state
+
+    def pop(self, chat_id, default=None):
+        """Remove and return a chat's state."""
+        entry = self._states.pop(chat_id, None)
+        if entry is None:
+            return default
+        self._changed(entry[0])
+        return entry[0] if entry[1] > time.time() else default
+
+    def __contains__(self, chat_id):
+        return self.get(chat_id) is not None
+
+    def stats(self):
+        """Return counters for active, expired and evicted flows."""
+        self._sweep(time.time())
+        return {"active": len(self._states), "expired": self.expired, "evicted": self.evicted}
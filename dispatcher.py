@@ -0,0 +1,90 @@
+# dispatcher.py
+# Concurrent, rate-limited fan-out of bot messages (used for the daily reminders).
+# Works with any object exposing an async send_message(chat_id=..., text=...), so a
+# local fake bot can stand in for telegram.Bot.
+
+import asyncio
+import logging
+import time
+from telegram.error import RetryAfter, TimedOut
+from metrics import metrics
+from config import REMINDER_CONCURRENCY, TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE, REMINDER_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        """Allow `rate` acquisitions per second with bursts of up to `capacity`."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retry_after_seconds(error):
+    """RetryAfter.retry_after is an int in older PTB releases and a timedelta in newer ones."""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+class ReminderDispatcher:
+    def __init__(self, bot, concurrency=REMINDER_CONCURRENCY, global_rate=TELEGRAM_GLOBAL_RATE,
+                 per_chat_rate=TELEGRAM_PER_CHAT_RATE, max_retries=REMINDER_MAX_RETRIES):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.per_chat_rate = per_chat_rate
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.chat_buckets = {}
+
+    async def _send_one(self, payload, semaphore):
+        """Send one payload with retries; return a result dict (never raises)."""
+        bucket = self.chat_buckets.setdefault(payload["chat_id"], TokenBucket(self.per_chat_rate))
+        result = {"username": payload.get("username"), "chat_id": payload["chat_id"],
+                  "ok": False, "attempts": 0, "latency": 0.0, "error": None}
+        started = time.monotonic()
+        async with semaphore:
+            while result["attempts"] <= self.max_retries:
+                result["attempts"] += 1
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                try:
+                    await self.bot.send_message(chat_id=payload["chat_id"], text=payload["text"])
+                    result["ok"] = True
+                    result["error"] = None
+                    break
+                except RetryAfter as e:
+                    result["error"] = str(e)
+                    await asyncio.sleep(_retry_after_seconds(e))
+                except TimedOut as e:
+                    result["error"] = str(e)
+                    await asyncio.sleep(2 ** (result["attempts"] - 1))
+                except Exception as e:
+                    # Blocked bot, unknown chat, etc.: retrying won't help
+                    result["error"] = str(e)
+                    break
+        result["latency"] = time.monotonic() - started
+        metrics.observe("reminders.delivery", result["latency"])
+        metrics.incr("reminders.sent" if result["ok"] else "reminders.failed")
+        return result
+
+    async def send_all(self, payloads):
+        """Send every {"username", "chat_id", "text"} payload; return per-recipient results."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._send_one(p, semaphore) for p in payloads))
+        failed = [r for r in results if not r["ok"]]
+        for r in failed:
+            logger.warning("Reminder to %s (chat %s) failed after %d attempts: %s", r["username"], r["chat_id"], r["attempts"], r["error"])
+        if results:
+            slowest = max(r["latency"] for r in results)
+            logger.info("Sent %d/%d reminders; slowest took %.2fs", len(results) - len(failed), len(results), slowest)
+        return results
@@ -0,0 +1,96 @@
+# due_alerts.py
+# Due-time alerts for the Family Task Bot.
+# Every actionable task's alert for the day sits in one min-heap ordered by due time, so a
+# single repeating job pops whatever is due instead of the bot registering a job per task.
+# Changes are O(log n): rescheduling pushes a new entry and cancelling just forgets the live
+# one; superseded heap entries are skipped when they surface and compacted away in bulk.
+
+import heapq
+import itertools
+import threading
+
+class DueAlerts:
+    def __init__(self):
+        # Heap of (due_at, seq, task_id); an entry counts only while _live[task_id] has the same seq
+        self._heap = []
+        self._live = {}  # task_id -> (due_at, seq, username, title)
+        self._by_user = {}  # username -> {task_id}
+        # Local day each user's alerts were last built for; a new day means a rebuild
+        self.days = {}
+        self._seq = itertools.count()
+        # Updated from storage writer/reader threads, popped on the event loop
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._live)
+
+    def _forget(self, task_id):
+        entry = self._live.pop(task_id, None)
+        if entry is not None:
+            tasks = self._by_user.get(entry[2])
+            if tasks is not None:
+                tasks.discard(task_id)
+
+    def _push(self, username, task_id, title, due_at):
+        self._forget(task_id)
+        seq = next(self._seq)
+        self._live[task_id] = (due_at, seq, username, title)
+        self._by_user.setdefault(username, set()).add(task_id)
+        heapq.heappush(self._heap, (due_at, seq, task_id))
+
+    def _compact(self):
+        """Drop superseded heap entries once they outnumber live ones (keeps the heap O(live))."""
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [(due_at, seq, task_id) for task_id, (due_at, seq, _, _) in self._live.items()]
+            heapq.heapify(self._heap)
+
+    def update(self, username, task_id, title, due_at):
+        """Schedule a task's alert at due_at (POSIX time), or cancel it if due_at is None."""
+        with self._lock:
+            if due_at is None:
+                self._forget(task_id)
+            else:
+                self._push(username, task_id, title, due_at)
+            self._compact()
+
+    def replace_user(self, username, alerts, day=None):
+        """Replace all of a user's alerts with [(task_id, title, due_at)] built for their local day."""
+        with self._lock:
+            for task_id in list(self._by_user.get(username, ())):
+                self._forget(task_id)
+            for task_id, title, due_at in alerts:
+                self._push(username, task_id, title, due_at)
+            if day is not None:
+                self.days[username] = day
+            self._compact()
+
+    def remove_user(self, username):
+        """Drop all of a user's alerts and their built day."""
+        with self._lock:
+            for task_id in self._by_user.pop(username, ()):
+                self._forget(task_id)
+            self.days.pop(username, None)
+
+    def next_due(self):
+        """Return the earliest live due time, or None."""
+        with self._lock:
+            while self._heap:
+                due_at, seq, task_id = self._heap[0]
+                live = self._live.get(task_id)
+                if live is not None and live[1] == seq:
+                    return due_at
+                heapq.heappop(self._heap)
+            return None
+
+    def pop_due(self, now):
+        """Remove and return [(username, task_id, title, due_at)] for alerts due at or before now."""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_at, seq, task_id = heapq.heappop(self._heap)
+                live = self._live.get(task_id)
+                if live is None or live[1] != seq:
+                    continue  # Rescheduled or cancelled since this entry was pushed
+                self._forget(task_id)
+                due.append((live[2], task_id, live[3], due_at))
+        return due
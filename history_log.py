@@ -0,0 +1,208 @@
+# history_log.py
+# Append-only, day-segmented history log for the Family Task Bot.
+# Each local day gets its own JSON-lines file (history/YYYY-MM-DD.jsonl), so logging an
+# event is a single append and retention is enforced by deleting whole segment files.
+# Retained entries are also kept in memory in time order, with per-user/owner/task/status
+# posting lists, so a history page is a slice from the end instead of a full sort. Positions are
+# never reused: entries leaving the retention window are trimmed from the front and the base
+# position moves past them, so paging cursors stay valid while the window moves.
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+INDEXED_FIELDS = ("user", "owner", "task_id", "status")
+
+def _field(entry, field):
+    """An entry's value for an indexed field; "owner" is only stored when someone else acted, so it defaults to "user"."""
+    if field == "owner":
+        return entry.get("owner") or entry.get("user")
+    return entry.get(field)
+
+class HistoryLog:
+    def __init__(self, directory, retention_days, legacy_file=None):
+        self.directory = directory
+        self.retention_days = retention_days
+        # history.json from before segmented logging; read until its entries age out
+        self.legacy_file = legacy_file
+        self._pruned_on = None
+        # In-memory index: entries oldest first, bytes consumed per segment, and
+        # {field: {value: [positions]}} posting lists for filtered paging. An entry's position
+        # is _base plus its index in _entries.
+        self._entries = None
+        self._base = 0
+        self._offsets = {}
+        self._postings = {}
+        # Appends, pruning and index refreshes may come from several executor threads
+        self._lock = threading.RLock()
+        self._indexed_cutoff = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_path(self, day):
+        return os.path.join(self.directory, f"{day}{SEGMENT_SUFFIX}")
+
+    def _cutoff(self):
+        return datetime.now() - timedelta(days=self.retention_days)
+
+    def _segment_days(self):
+        """Return the days that have a segment file, oldest first."""
+        return sorted(
+            name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def append(self, entry):
+        """Append one history entry to its day's segment."""
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """Append several entries with one write per day segment (normally just one)."""
+        by_day = {}
+        for entry in entries:
+            by_day.setdefault(entry["timestamp"][:10], []).append(json.dumps(entry) + "\n")
+        with self._lock:
+            for day, lines in by_day.items():
+                with open(self._segment_path(day), "a") as f:
+                    f.write("".join(lines))
+            self.prune()
+
+    def prune(self, force=False):
+        """Drop segments older than the retention window (at most once per day unless forced)."""
+        today = datetime.now().date()
+        if self._pruned_on == today and not force:
+            return
+        cutoff_day = self._cutoff().date().isoformat()
+        with self._lock:
+            for day in self._segment_days():
+                if day >= cutoff_day:
+                    break
+                try:
+                    os.remove(self._segment_path(day))
+                except FileNotFoundError:
+                    pass  # Another Storage instance pruned it first
+            if self.legacy_file and os.path.exists(self.legacy_file) and not self._read_legacy():
+                logger.info("All entries in %s are past retention; removing it.", self.legacy_file)
+                os.remove(self.legacy_file)
+            self._pruned_on = today
+
+    def _read_legacy(self):
+        """Read entries still inside the retention window from the old history.json."""
+        try:
+            with open(self.legacy_file, "r") as f:
+                entries = json.load(f).get("history", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+        # ISO timestamps from datetime.isoformat() sort lexicographically
+        cutoff = self._cutoff().isoformat()
+        return [entry for entry in entries if entry["timestamp"] >= cutoff]
+
+    def _index(self, entry):
+        position = self._base + len(self._entries)
+        self._entries.append(entry)
+        for field in INDEXED_FIELDS:
+            self._postings[field].setdefault(_field(entry, field), []).append(position)
+
+    def _rebuild(self, days):
+        if self._entries is not None:
+            # Start past every position handed out so far, so old cursors can't land on other entries
+            self._base += len(self._entries)
+        self._entries = []
+        self._offsets = {}
+        self._postings = {field: {} for field in INDEXED_FIELDS}
+        if self.legacy_file:
+            for entry in sorted(self._read_legacy(), key=lambda e: e["timestamp"]):
+                self._index(entry)
+        for day in days:
+            self._offsets[day] = 0
+
+    def _trim(self, cutoff_day):
+        """Drop entries from days before cutoff_day off the front of the index."""
+        dropped = 0
+        while dropped < len(self._entries) and self._entries[dropped]["timestamp"][:10] < cutoff_day:
+            dropped += 1
+        if dropped:
+            del self._entries[:dropped]
+            self._base += dropped
+            for postings in self._postings.values():
+                for value in list(postings):
+                    positions = postings[value]
+                    del positions[:bisect_left(positions, self._base)]
+                    if not positions:
+                        del postings[value]
+        for day in [day for day in self._offsets if day < cutoff_day]:
+            del self._offsets[day]
+
+    def _refresh(self):
+        """Bring the in-memory index up to date with the segment files (reads only new bytes)."""
+        cutoff_day = self._cutoff().date().isoformat()
+        days = [day for day in self._segment_days() if day >= cutoff_day]
+        if self._entries is not None and self._indexed_cutoff != cutoff_day:
+            # A new day moved the retention window: forget the days that left it
+            self._trim(cutoff_day)
+            self._indexed_cutoff = cutoff_day
+        if self._entries is None or any(day not in days for day in self._offsets):
+            # First use, or a segment inside the window disappeared (deleted by hand)
+            self._rebuild(days)
+            self._indexed_cutoff = cutoff_day
+        for day in days:
+            offset = self._offsets.setdefault(day, 0)
+            try:
+                with open(self._segment_path(day), "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+            except FileNotFoundError:
+                continue
+            # Only consume complete lines; a partial last line is still being written
+            end = chunk.rfind(b"\n") + 1
+            for line in chunk[:end].splitlines():
+                try:
+                    self._index(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn line from a crash mid-append; skip it
+                    logger.warning("Skipping malformed history line in segment %s.", day)
+            self._offsets[day] = offset + end
+
+    def read(self):
+        """Return all retained history entries, oldest first."""
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def cursor(self):
+        """Return a cursor just past the newest entry, to page from with `before` while new events arrive."""
+        with self._lock:
+            self._refresh()
+            return self._base + len(self._entries)
+
+    def page(self, page=0, size=10, before=None, user=None, task_id=None, status=None, owner=None):
+        """Return (entries newest first, total matching, next_cursor) for one page of history.
+
+        Pages are counted from the newest entry, or from `before` (a cursor() or the previous
+        call's next_cursor) if given, so new events (or older ones leaving the retention window)
+        don't shift the results; the total then counts only matching entries before it.
+        `user` is who acted; `owner` is whose task it was.
+        """
+        with self._lock:
+            self._refresh()
+            filters = {field: value for field, value in
+                       (("user", user), ("owner", owner), ("task_id", task_id), ("status", status)) if value is not None}
+            if filters:
+                # Walk the shortest posting list and check the remaining filters against it
+                field = min(filters, key=lambda f: len(self._postings[f].get(filters[f], ())))
+                positions = self._postings[field].get(filters.pop(field), [])
+                if filters:
+                    positions = [p for p in positions
+                                 if all(_field(self._entries[p - self._base], f) == v for f, v in filters.items())]
+            else:
+                positions = range(self._base, self._base + len(self._entries))
+            total = bisect_left(positions, before) if before is not None else len(positions)
+            end = max(0, total - page * size)
+            start = max(0, end - size)
+            entries = [self._entries[p - self._base] for p in reversed(positions[start:end])]
+            return entries, total, positions[start] if start > 0 else None
@@ -0,0 +1,159 @@
+# households.py
+# Households (tenants) for serving many families from one bot.
+# Every household has its own data shard (households/<id>/tasks.json and history/, or tasks.db),
+# so a request loads, locks and rewrites only its own household's files. households.json maps
+# chats to households and invite codes to households. Chats that never created or joined a
+# household use the default one, whose shard is the original top-level tasks.json and history/.
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from storage import create_storage, write_atomically
+from task_manager import TaskManager
+from async_storage import AsyncFacade, STORAGE_WRITES, TASK_MANAGER_WRITES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOUSEHOLD = "default"
+
+# An open household: its ID and awaitable storage/task manager (see async_storage.py)
+Household = namedtuple("Household", "id storage task_mgr")
+
+class Households:
+    """Registry of households, the chats that belong to them and their invite codes."""
+    def __init__(self, path, shard_dir):
+        self.path = path
+        self.shard_dir = shard_dir
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    @property
+    def _data(self):
+        # households.json is read on first lookup, not when the registry is created at import
+        if self._loaded is None:
+            self.load()
+        return self._loaded
+
+    def load(self):
+        """Read households.json; blocking, so the bot runs it off the event loop before the first lookup."""
+        data = {"households": {}, "chats": {}, "invites": {}}
+        try:
+            with open(self.path, "r") as f:
+                data.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        self._loaded = data
+
+    def _save(self):
+        write_atomically(self.path, json.dumps(self._data))
+
+    def all(self):
+        """Return every household ID, the default one first."""
+        return [DEFAULT_HOUSEHOLD] + list(self._data["households"])
+
+    def for_chat(self, chat_id):
+        """Return the household a chat belongs to."""
+        return self._data["chats"].get(str(chat_id), DEFAULT_HOUSEHOLD)
+
+    def data_dir(self, household_id):
+        """Return a household's shard directory (None for the default household's top-level files)."""
+        return None if household_id == DEFAULT_HOUSEHOLD else os.path.join(self.shard_dir, household_id)
+
+    def name(self, household_id):
+        return self._data["households"].get(household_id, {}).get("name", "Default household")
+
+    def invite_code(self, household_id):
+        return self._data["households"].get(household_id, {}).get("invite")
+
+    def create(self, chat_id, name):
+        """Create a household owned by chat_id, move the chat into it and return (household_id, invite)."""
+        with self._lock:
+            household_id = f"h{secrets.token_hex(4)}"
+            while household_id in self._data["households"]:
+                household_id = f"h{secrets.token_hex(4)}"
+            invite = secrets.token_urlsafe(6)
+            self._data["households"][household_id] = {"name": name, "invite": invite, "created": datetime.now().isoformat()}
+            self._data["invites"][invite] = household_id
+            self._data["chats"][str(chat_id)] = household_id
+            self._save()
+        return household_id, invite
+
+    def join(self, chat_id, invite):
+        """Move a chat into the household an invite code belongs to and return its ID."""
+        with self._lock:
+            household_id = self._data["invites"].get(invite)
+            if household_id is None:
+                raise ValueError("Unknown invite code.")
+            self._data["chats"][str(chat_id)] = household_id
+            self._save()
+        return household_id
+
+class HouseholdPool:
+    """Open households' storage and TaskManagers, opened on first use and closed least recently used first."""
+    def __init__(self, households, io, max_open, on_open=None):
+        self.households = households
+        self.io = io
+        self.max_open = max_open
+        # Called as on_open(household_id, task_mgr) for each newly opened household's TaskManager
+        self.on_open = on_open
+        self._open = OrderedDict()
+        self._opening = asyncio.Lock()
+
+    def _build(self, household_id):
+        storage = create_storage(self.households.data_dir(household_id))
+        return storage, TaskManager(storage)
+
+    def attach(self, household_id, storage, task_mgr):
+        """Register already-built storage and TaskManager for a household and return it."""
+        if self.on_open:
+            self.on_open(household_id, task_mgr)
+        household = Household(household_id, AsyncFacade(storage, STORAGE_WRITES, self.io),
+                              AsyncFacade(task_mgr, TASK_MANAGER_WRITES, self.io))
+        self._open[household_id] = household
+        return household
+
+    async def get(self, household_id):
+        """Return an open household, opening its shard (off the event loop) if needed."""
+        household = self._open.get(household_id)
+        if household is None:
+            async with self._opening:
+                household = self._open.get(household_id)
+                if household is None:
+                    household = self.attach(household_id, *await self.io.read(self._build, household_id))
+                    await self._evict()
+        self._open.move_to_end(household_id)
+        return household
+
+    def _read_user_settings(self, household_id):
+        return create_storage(self.households.data_dir(household_id)).get_all_user_settings()
+
+    async def user_settings(self, household_id):
+        """Return a household's {username: settings}, reading a closed shard without opening it here.
+
+        Reading settings for every household (at startup) thus doesn't evict open ones.
+        """
+        household = self._open.get(household_id)
+        if household is not None:
+            return await household.storage.get_all_user_settings()
+        return await self.io.read(self._read_user_settings, household_id)
+
+    async def for_chat(self, chat_id):
+        """Return the open household for a chat."""
+        return await self.get(self.households.for_chat(chat_id))
+
+    async def _evict(self):
+        while len(self._open) > self.max_open:
+            household_id, household = self._open.popitem(last=False)
+            # Its write-behind changes must reach disk before the Storage is dropped
+            await household.storage.flush()
+            logger.info("Closed household %s (more than %d open).", household_id, self.max_open)
+
+    async def flush_all(self):
+        """Flush every open household's pending writes."""
+        for household in list(self._open.values()):
+            await household.storage.flush()
@@ -0,0 +1,52 @@
+# log_setup.py
+# Logging configuration for the Family Task Bot.
+# Records go through a QueueHandler so handlers never block the asyncio event loop with
+# console/file I/O; a QueueListener thread does the actual writing. Verbosity can be set
+# per module (LOG_LEVELS) and output can be plain text or one JSON object per line.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from config import LOG_LEVEL, LOG_LEVELS, LOG_FORMAT
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON for log shippers."""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+def parse_levels(spec):
+    """Parse "task_manager=WARNING,storage=DEBUG" into {"task_manager": "WARNING", "storage": "DEBUG"}."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging():
+    """Install the queued root handler and per-module levels; returns the running QueueListener."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
@@ -1,47 +1,144 @@
 from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
 import logging
-from datetime import datetime, date
-from config import BOT_TOKEN, REMINDER_TIME
-from storage import Storage
-from task_manager import TaskManager
+from config import (bot_token, USER_STATE_TTL_SECONDS, USER_STATE_MAX_ENTRIES, USER_STATES_FILE, USER_STATES_SAVE_INTERVAL,
+                    ADMIN_USERS, METRICS_DUMP_FILE, METRICS_DUMP_INTERVAL, STORAGE_READ_WORKERS,
+                    DUE_ALERTS_ENABLED, DUE_ALERT_TICK_SECONDS, DUE_ALERT_ROLLOVER_SECONDS,
+                    HOUSEHOLDS_FILE, HOUSEHOLDS_DIR, HOUSEHOLD_MAX_OPEN, UPDATE_MODE, WEBHOOK_URL, WEBHOOK_LISTEN,
+                    WEBHOOK_PORT, WEBHOOK_PATH, webhook_secret, TELEGRAM_API_URL, ALLOWED_UPDATES, CONCURRENT_UPDATES,
+                    REMINDER_CONCURRENCY)
+from async_storage import BlockingIO
+from households import Households, HouseholdPool
+from task_manager import zone
 from ui import UI
-from datetime import timedelta
+from task_files import FORMATS, file_format
+from dispatcher import ReminderDispatcher
+from reminder_schedule import schedule_reminders, bucket_users
+from due_alerts import DueAlerts
+from conversation_store import ConversationStore
+from metrics import metrics, instrumented_request
+from log_setup import setup_logging
+from datetime import datetime, timedelta
+from functools import partial
+from collections import OrderedDict
+from io import StringIO
 import telegram.error
+import time
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
-storage = Storage()
-task_mgr = TaskManager()
+# Handlers await storage/task_mgr calls; the blocking work runs on io's threads
+io = BlockingIO(STORAGE_READ_WORKERS)
 ui = UI()
-user_states = {}
+# Alerts for every household in one heap, keyed by (household_id, username)
+alerts = DueAlerts()
+# Every household's {(household_id, username): {"timezone", "reminder_time"}}, loaded at startup and
+# kept current by the commands that change it, so reminder and alert jobs only open the shards they need
+user_settings = {}
+
+def on_task_changed(household_id, task_mgr, username, task_id, task):
+    """Keep the due-time alert heap in step with task changes (runs on the storage writer thread)."""
+    alerts.update((household_id, username), task_id, task["title"] if task else None, task_mgr.due_alert_at(username, task))
+
+def on_household_open(household_id, task_mgr):
+    if DUE_ALERTS_ENABLED:
+        task_mgr.add_listener(partial(on_task_changed, household_id, task_mgr))
+
+households = Households(HOUSEHOLDS_FILE, HOUSEHOLDS_DIR)
+# Each household's Storage is shared with its TaskManager, so write-behind has a single in-memory copy
+pool = HouseholdPool(households, io, HOUSEHOLD_MAX_OPEN, on_open=on_household_open)
+# Text shown when a button from a multi-step flow is pressed after its state expired
+FLOW_EXPIRED_TEXT = "That step has expired. Please start again."
+# Only multi-step flows ("step") are saved across restarts; which grid a chat is viewing ("view") is not
+user_states = ConversationStore(USER_STATE_TTL_SECONDS, USER_STATE_MAX_ENTRIES, USER_STATES_FILE,
+                                persist_if=lambda state: "step" in state)
+# Last (text, keyboard) shown per (chat_id, message_id), so refreshes that change nothing skip the API call
+last_rendered = OrderedDict()
+
+async def due_tasks_view(home, target_user=None, page=0):
+    """Message and keyboard for one page of a household's All Tasks grid (or one user's due tasks).
+
+    Cached per data version and page. The page boundaries are cached per layout version, which
+    toggling a task doesn't change, so a tap fetches and renders only the requested page's tasks.
+    """
+    # Users' local dates roll over on quarter-hour boundaries in every timezone, so a render is
+    # reused at most until the next one
+    view = (home.id, "user" if target_user else "all", target_user, int(time.time() // 900))
+    key = (*view, page, await home.task_mgr.data_version())
+    rendered = ui.cached_view(key)
+    if rendered is None:
+        metrics.incr("ui.view_cache_misses")
+        layout_key = ("layout", *view, await home.task_mgr.layout_version())
+        layout = ui.cached_view(layout_key)
+        if layout is None:
+            metrics.incr("ui.layout_cache_misses")
+            tasks = await home.task_mgr.get_due_tasks_view(target_user)
+            layout = ui.cache_view(layout_key, ui.task_layout(tasks, target_user))
+        page, task_ids = ui.layout_page(layout, page)
+        tasks = await home.task_mgr.get_grid_tasks(task_ids)
+        rendered = ui.cache_view(key, ui.task_page_message_and_keyboard(layout, page, tasks, target_user))
+    return rendered
+
+async def edit_if_changed(query, text, keyboard, **kwargs):
+    """Edit the callback's message unless it already shows exactly this text and keyboard."""
+    message_key = (query.message.chat_id, query.message.message_id)
+    if last_rendered.get(message_key) == (text, keyboard):
+        metrics.incr("ui.edits_skipped")
+        return
+    await query.edit_message_text(text, reply_markup=keyboard, **kwargs)
+    last_rendered[message_key] = (text, keyboard)
+    last_rendered.move_to_end(message_key)
+    if len(last_rendered) > USER_STATE_MAX_ENTRIES:
+        last_rendered.popitem(last=False)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     username = update.message.from_user.username
     chat_id = update.message.chat_id
-    storage.add_user_if_new(username, chat_id)
-    users = sorted(storage.get_all_users())
+    home = await pool.for_chat(chat_id)
+    await home.storage.add_user_if_new(username, chat_id)
+    await note_user_settings(context.application, home, username)
+    users = sorted(await home.storage.get_all_users())
     await update.message.reply_text("Welcome to Family Task Bot!", reply_markup=ui.main_menu(users))
 
+# Callbacks without a dynamic suffix; everything else is timed under its prefix (e.g. "toggle")
+STATIC_CALLBACKS = {"add_task", "view_my", "view_others", "view_all", "users", "days_done",
+                    "add_user", "edit_user", "delete_user", "back", "cancel"}
+CALLBACK_PREFIXES = ("view_user_tasks_", "view_user_", "history_", "tasks_page_", "type_", "day_", "date_", "toggle_",
+                     "task_", "complete_", "edit_title_", "edit_time_", "edit_date_", "edit_", "delete_", "nudge_")
+
+def callback_name(data):
+    """Metric name for a callback: the static data itself, or its prefix without the ID/page."""
+    if data in STATIC_CALLBACKS:
+        return data
+    return next((prefix.rstrip("_") for prefix in CALLBACK_PREFIXES if data.startswith(prefix)), "other")
+
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not metrics.enabled:
+        await _button(update, context)
+        return
+    with metrics.timer(f"callback.{callback_name(update.callback_query.data)}"):
+        await _button(update, context)
+
+async def _button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     username = query.from_user.username
     chat_id = query.message.chat_id
     data = query.data
-    users = sorted(storage.get_all_users())
+    home = await pool.for_chat(chat_id)
+    storage, task_mgr = home.storage, home.task_mgr
+    users = sorted(await storage.get_all_users())
 
     await query.answer()
+    if not data.startswith(("toggle_", "tasks_page_")):
+        # Only toggles and page turns refresh the grid in place; anything else may replace what the message shows
+        last_rendered.pop((chat_id, query.message.message_id), None)
     try:
         if data == "add_task":
-            user_states[chat_id] = {"step": "task_type"}
+            user_states.set(chat_id, {"step": "task_type"})
             await query.edit_message_text("Select task type:", reply_markup=ui.task_types())
         elif data == "view_my":
-            tasks = task_mgr.get_user_tasks(username, mine=True)
-            logger.info(f"View My Tasks for {username}: {len(tasks)} tasks")
+            tasks = await task_mgr.get_user_tasks(username, mine=True)
+            logger.info("View My Tasks for %s: %d tasks", username, len(tasks))
             keyboard = ui.task_list(tasks, "task")
             text = "Your tasks:" if keyboard else "No tasks due today!"
             await query.edit_message_text(text, reply_markup=keyboard or ui.main_menu(users))
@@ -55,145 +152,142 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             if target_user not in users:
                 await query.edit_message_text(f"User @{target_user} not found.", reply_markup=ui.main_menu(users))
             else:
-                today = date.today()
-                today_str = today.isoformat()
-                weekday = today.strftime("%a")
-                tasks = task_mgr.get_tasks_due_today(target_user)  # Get all tasks due today for the user
-                logger.info(f"Viewing tasks due today for {target_user}: {len(tasks)} tasks found")
-                tasks_with_owner = [task.copy() for task in tasks]
-                for task in tasks_with_owner:
-                    task["owner"] = target_user  # Ensure owner is set
-                message, keyboard = ui.all_tasks_message_and_keyboard(tasks_with_owner, target_user)
-                logger.info(f"Message set to: {message}")
-                user_states[chat_id] = {"view": "user", "username": target_user}  # Track user view
-                await query.edit_message_text(message, reply_markup=keyboard, parse_mode="Markdown")
+                logger.info("Viewing tasks due today for %s", target_user)
+                message, keyboard = await due_tasks_view(home, target_user)  # All tasks due today for the user
+                logger.debug("Message set to: %s", message)
+                user_states.set(chat_id, {"view": "user", "username": target_user, "page": 0})  # Track user view
+                await edit_if_changed(query, message, keyboard, parse_mode="Markdown")
         elif data.startswith("view_user_"):  # Handle "View Others" selections
             target_user = data.split("_")[2]  # Extract username for "view_user_{username}"
             if target_user not in users:
                 await query.edit_message_text(f"User @{target_user} not found.", reply_markup=ui.main_menu(users))
             else:
-                tasks = task_mgr.get_user_tasks(target_user, mine=True)  # Use mine=True for actionable tasks
+                tasks = await task_mgr.get_user_tasks(target_user, mine=True)  # Use mine=True for actionable tasks
                 keyboard = ui.task_list(tasks, "task", target_user)
                 text = f"@{target_user}'s tasks:" if keyboard else f"No tasks due today for @{target_user}!"
                 await query.edit_message_text(text, reply_markup=keyboard or ui.main_menu(users))
         elif data == "view_all":
-            today = date.today()
-            today_str = today.isoformat()
-            weekday = today.strftime("%a")
-            tasks = []
-            for user in users:
-                user_tasks = task_mgr.get_tasks_due_today(user)
-                for task in user_tasks:
-                    task_with_owner = task.copy()
-                    task_with_owner["owner"] = user  # Ensure owner is set
-                    tasks.append(task_with_owner)
-            message, keyboard = ui.all_tasks_message_and_keyboard(tasks)
-            user_states[chat_id] = {"view": "all"}
-            await query.edit_message_text(message, reply_markup=keyboard, parse_mode="Markdown")
+            message, keyboard = await due_tasks_view(home)
+            user_states.set(chat_id, {"view": "all", "page": 0})
+            await edit_if_changed(query, message, keyboard, parse_mode="Markdown")
         elif data == "users":
             await query.edit_message_text("Manage users:", reply_markup=ui.user_management())
         elif data.startswith("history_"):
-            page = int(data.split("_")[1])
-            history = task_mgr.get_history()
-            text, keyboard = ui.history_view(history, page)
+            # history_{page}[_{cursor}][_{owner}]: the cursor pins the newest entry when browsing started,
+            # so pages don't shift as events are logged. Usernames may contain "_" but never start with a digit.
+            parts = data.split("_", 3)
+            page = int(parts[1])
+            cursor = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else None
+            history_user = "_".join(parts[3 if cursor is not None else 2:]) or None
+            if cursor is None:
+                cursor = await task_mgr.get_history_cursor()
+            entries, total, next_cursor = await task_mgr.get_history_page(page, ui.history_page_size, before=cursor,
+                                                                          owner=history_user)
+            if not entries and page:
+                # The pinned entries left the retention window; start again from the newest
+                page, cursor = 0, await task_mgr.get_history_cursor()
+                entries, total, next_cursor = await task_mgr.get_history_page(0, ui.history_page_size, before=cursor,
+                                                                              owner=history_user)
+            text, keyboard = ui.history_view(entries, total, page, user=history_user, viewer=username,
+                                             cursor=cursor, more=next_cursor is not None)
             await query.edit_message_text(text, reply_markup=keyboard, parse_mode="HTML")
         elif data.startswith("type_"):
             task_type_map = {"one": "one-time", "recurring": "recurring", "daily": "daily"}
             task_type = task_type_map[data.split("_")[1]]
-            user_states[chat_id] = {"step": "title", "type": task_type}
+            user_states.set(chat_id, {"step": "title", "type": task_type})
             await query.edit_message_text("Enter task title:")
         elif data == "days_done":
-            days = user_states[chat_id].get("days", [])
+            state = user_states.get(chat_id)
+            if state is None:
+                await query.edit_message_text(FLOW_EXPIRED_TEXT, reply_markup=ui.main_menu(users))
+                return
+            days = state.get("days", [])
             if not days:
                 await query.edit_message_text("Select at least one day.", reply_markup=ui.days_selection())
             else:
-                task_id = task_mgr.add_task(username, user_states[chat_id]["title"], "recurring", days=days)
+                task_id = await task_mgr.add_task(username, state["title"], "recurring", days=days)
                 user_states.pop(chat_id)
                 await query.edit_message_text(f"Task added (ID: {task_id})!", reply_markup=ui.main_menu(users))
         elif data.startswith("day_"):
             day = data.split("_")[1].capitalize()[:3]
-            state = user_states[chat_id]
+            state = user_states.get(chat_id)
+            if state is None:
+                await query.edit_message_text(FLOW_EXPIRED_TEXT, reply_markup=ui.main_menu(users))
+                return
             days = state.get("days", [])
             if day in days:
                 days.remove(day)
             else:
                 days.append(day)
-            state["days"] = days
+            user_states.update(chat_id, days=days)
             await query.edit_message_reply_markup(reply_markup=ui.days_selection(days))
         elif data.startswith("date_"):
             days_offset = int(data.split("_")[1])
-            due_date = (datetime.today() + timedelta(days=days_offset)).date().isoformat()
-            task_id = task_mgr.add_task(username, user_states[chat_id]["title"], "one-time", date=due_date)
+            due_date = ((await task_mgr.local_now(username)) + timedelta(days=days_offset)).date().isoformat()
+            state = user_states.get(chat_id)
+            if state is None:
+                await query.edit_message_text(FLOW_EXPIRED_TEXT, reply_markup=ui.main_menu(users))
+                return
+            task_id = await task_mgr.add_task(username, state["title"], "one-time", date=due_date)
             user_states.pop(chat_id)
             await query.edit_message_text(f"Task added (ID: {task_id})!", reply_markup=ui.main_menu(users))
         elif data.startswith("toggle_"):
             task_id = data.split("_")[1]
-            today = date.today().isoformat()
-            task_owner = next((u for u in users for t in storage.get_user_tasks(u) if t["id"] == task_id), None)
+            task_owner, _ = await task_mgr.find_task(task_id)
             if task_owner:
-                task = next(t for t in storage.get_user_tasks(task_owner) if t["id"] == task_id)
-                if today in task["completions"]:
-                    task["completions"].remove(today)
-                    status = "incomplete"
-                else:
-                    task["completions"].append(today)
-                    status = "completed"
-                storage.save_task(task_owner, task)
-                storage.log_history(task, status, username)
-            view_state = user_states.get(chat_id, {}).get("view")
-            if view_state == "all":
-                tasks = []
-                for user in users:
-                    user_tasks = task_mgr.get_tasks_due_today(user)
-                    for task in user_tasks:
-                        task_with_owner = task.copy()
-                        task_with_owner["owner"] = user  # Ensure owner is set
-                        tasks.append(task_with_owner)
-            elif view_state == "user":
-                target_user = user_states[chat_id]["username"]
-                tasks = task_mgr.get_tasks_due_today(target_user)
-                tasks_with_owner = [task.copy() for task in tasks]
-                for task in tasks_with_owner:
-                    task["owner"] = target_user  # Ensure owner is set
+                await task_mgr.toggle_task(task_owner, task_id, actor=username)
+            view_state = user_states.get(chat_id, {})
+            if view_state.get("view") == "all":
+                message, keyboard = await due_tasks_view(home, page=view_state.get("page", 0))
+            elif view_state.get("view") == "user":
+                message, keyboard = await due_tasks_view(home, view_state["username"], view_state.get("page", 0))
             else:
-                tasks = []
-            message, keyboard = ui.all_tasks_message_and_keyboard(tasks, target_user if view_state == "user" else None)
-            await query.edit_message_text(message, reply_markup=keyboard, parse_mode="Markdown")
+                message, keyboard = ui.all_tasks_message_and_keyboard([])
+            await edit_if_changed(query, message, keyboard, parse_mode="Markdown")
+        elif data.startswith("tasks_page_"):
+            page = int(data.split("_")[2])
+            view_state = user_states.get(chat_id)
+            if view_state is None or "view" not in view_state:
+                # Flow state expired; the grid being paged is most likely All Tasks
+                view_state = {"view": "all"}
+            user_states.set(chat_id, dict(view_state, page=page))
+            target_user = view_state.get("username") if view_state["view"] == "user" else None
+            message, keyboard = await due_tasks_view(home, target_user, page)
+            await edit_if_changed(query, message, keyboard, parse_mode="Markdown")
         elif data.startswith("task_"):
             task_id = data.split("_")[1]
-            task = next((t for u in users for t in storage.get_user_tasks(u) if t["id"] == task_id), None)
+            task_owner, task = await task_mgr.find_task(task_id)
             if task:
-                is_owner = task in storage.get_user_tasks(username)
+                is_owner = task_owner == username
                 await query.edit_message_text(f"Task: {task['title']}", reply_markup=ui.task_actions(task_id, is_owner))
             else:
                 await query.edit_message_text("Task not found.", reply_markup=ui.main_menu(users))
         elif data.startswith("complete_"):
             task_id = data.split("_")[1]
-            task_mgr.complete_task(username, task_id)
+            await task_mgr.complete_task(username, task_id)
             await query.edit_message_text("Task completed!", reply_markup=ui.main_menu(users))
         elif data.startswith("edit_"):
             task_id = data.split("_")[1]
-            task = next((t for t in storage.get_user_tasks(username) if t["id"] == task_id), None)
+            task = await task_mgr.get_task_by_id(username, task_id)
             if task:
-                user_states[chat_id] = {"step": "edit", "task_id": task_id}
+                user_states.set(chat_id, {"step": "edit", "task_id": task_id})
                 await query.edit_message_text("Edit task:", reply_markup=ui.edit_options(task_id))
             else:
                 await query.edit_message_text("Task not found.", reply_markup=ui.main_menu(users))
         elif data.startswith("delete_"):
             task_id = data.split("_")[1]
-            task_owner = next((u for u in users for t in storage.get_user_tasks(u) if t["id"] == task_id), None)
+            task_owner, _ = await task_mgr.find_task(task_id)
             if task_owner:
-                task_mgr.delete_task(task_owner, task_id)
+                await task_mgr.delete_task(task_owner, task_id)
                 await query.edit_message_text("Task deleted!", reply_markup=ui.main_menu(users))
             else:
-                logger.warning(f"Task {task_id} not found for deletion by {username}")
+                logger.warning("Task %s not found for deletion by %s", task_id, username)
                 await query.edit_message_text("Task not found.", reply_markup=ui.main_menu(users))
         elif data.startswith("nudge_"):
             task_id = data.split("_")[1]
-            task = next((t for u in users for t in storage.get_user_tasks(u) if t["id"] == task_id), None)
+            owner, task = await task_mgr.find_task(task_id)
             if task:
-                owner = next(u for u in users if task in storage.get_user_tasks(u))
-                owner_chat_id = storage.get_user_chat_id(owner)
+                owner_chat_id = await storage.get_user_chat_id(owner)
                 if owner_chat_id:
                     await context.bot.send_message(chat_id=owner_chat_id, text=f"Nudge from @{username}: {task['title']} due at {task['time']}!")
                     await query.edit_message_text("Nudge sent!", reply_markup=ui.main_menu(users))
@@ -202,16 +296,16 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         elif data.startswith("edit_title_") or data.startswith("edit_time_") or data.startswith("edit_date_"):
             task_id = data.split("_")[2]
             field = data.split("_")[1]
-            user_states[chat_id] = {"step": f"edit_{field}", "task_id": task_id}
+            user_states.set(chat_id, {"step": f"edit_{field}", "task_id": task_id})
             prompt = {"title": "Enter new title:", "time": "Enter new time (HH:MM):", "date": "Enter new date (YYYY-MM-DD) or days:"}
             await query.edit_message_text(prompt[field])
         elif data == "add_user":
-            user_states[chat_id] = {"step": "add_user"}
+            user_states.set(chat_id, {"step": "add_user"})
             await query.edit_message_text("Enter Telegram username to add (e.g., @username):")
         elif data == "edit_user":
             await query.edit_message_text("Edit user not implemented yet.", reply_markup=ui.main_menu(users))
         elif data == "delete_user":
-            user_states[chat_id] = {"step": "delete_user"}
+            user_states.set(chat_id, {"step": "delete_user"})
             await query.edit_message_text("Enter Telegram username to delete:")
         elif data in ["back", "cancel"]:
             user_states.pop(chat_id, None)
@@ -221,61 +315,63 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if "Message is not modified" in str(e):
             logger.info("Ignored redundant message edit attempt.")
         else:
-            logger.error(f"BadRequest error in button handler: {e}")
+            logger.error("BadRequest error in button handler: %s", e)
             error_text, error_markup = ui.error_message(f"Something went wrong: {str(e)}")
             await query.edit_message_text(error_text, reply_markup=error_markup)
     except Exception as e:
-        import traceback
-        logger.error(f"Error in button handler: {e}\n{traceback.format_exc()}")
+        logger.exception("Error in button handler: %s", e)
         error_text, error_markup = ui.error_message(f"Something went wrong: {str(e)}")
         await query.edit_message_text(error_text, reply_markup=error_markup)
 
+@metrics.timed("message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.message.chat_id
     username = update.message.from_user.username
     text = update.message.text.strip()
-    users = sorted(storage.get_all_users())
+    home = await pool.for_chat(chat_id)
+    storage, task_mgr = home.storage, home.task_mgr
+    users = sorted(await storage.get_all_users())
 
-    if chat_id not in user_states:
+    state = user_states.get(chat_id)
+    if state is None:
         await update.message.reply_text("Please use /start to begin.", reply_markup=ui.main_menu(users))
         return
 
-    state = user_states[chat_id]
     try:
         if state["step"] == "title":
-            state["title"] = text
             if state["type"] == "one-time":
-                state["step"] = "date"
+                user_states.update(chat_id, title=text, step="date")
                 await update.message.reply_text("Select due date:", reply_markup=ui.date_selection())
             elif state["type"] == "recurring":
-                state["step"] = "days"
+                user_states.update(chat_id, title=text, step="days")
                 await update.message.reply_text("Select days:", reply_markup=ui.days_selection())
             else:  # daily
-                task_id = task_mgr.add_task(username, state["title"], "daily")
+                task_id = await task_mgr.add_task(username, text, "daily")
                 user_states.pop(chat_id)
                 await update.message.reply_text(f"Task added (ID: {task_id})!", reply_markup=ui.main_menu(users))
         elif state["step"].startswith("edit_"):
             field = state["step"].split("_")[1]
             task_id = state["task_id"]
             if field == "title":
-                task_mgr.edit_task(username, task_id, title=text)
+                await task_mgr.edit_task(username, task_id, title=text)
             elif field == "time":
-                time = task_mgr.validate_time(text)
-                task_mgr.edit_task(username, task_id, time=time)
+                time = task_mgr.sync.validate_time(text)
+                await task_mgr.edit_task(username, task_id, time=time)
             elif field == "date":
-                task = task_mgr.get_task_by_id(username, task_id)
+                task = await task_mgr.get_task_by_id(username, task_id)
                 if task["type"] == "one-time":
-                    date = task_mgr.validate_date(text)
-                    task_mgr.edit_task(username, task_id, date=date)
+                    date = await task_mgr.validate_date(text, username)
+                    await task_mgr.edit_task(username, task_id, date=date)
                 elif task["type"] == "recurring":
                     days = [d.strip().capitalize()[:3] for d in text.split(",")]
-                    days = task_mgr.validate_days(days)
-                    task_mgr.edit_task(username, task_id, days=days)
+                    days = task_mgr.sync.validate_days(days)
+                    await task_mgr.edit_task(username, task_id, days=days)
             user_states.pop(chat_id)
             await update.message.reply_text("Task updated!", reply_markup=ui.main_menu(users))
         elif state["step"] == "add_user":
             new_username = text.lstrip("@")
-            storage.add_user_if_new(new_username, None)
+            await storage.add_user_if_new(new_username, None)
+            await note_user_settings(context.application, home, new_username)
             user_states.pop(chat_id)
             await update.message.reply_text(f"User {new_username} added!", reply_markup=ui.main_menu(users))
         elif state["step"] == "delete_user":
@@ -285,32 +381,323 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             elif target_username == username:
                 await update.message.reply_text("You cannot delete yourself!", reply_markup=ui.main_menu(users))
             else:
-                storage.delete_user(target_username)
+                await storage.delete_user(target_username)
+                user_settings.pop((home.id, target_username), None)
                 await update.message.reply_text(f"User {target_username} deleted!", reply_markup=ui.main_menu(users))
             user_states.pop(chat_id)
+        elif state["step"] == "import":
+            await update.message.reply_text("Send the tasks as a .csv or .jsonl file, or /start to cancel.")
 
     except Exception as e:
-        logger.error(f"Error in handle_message: {e}")
+        logger.error("Error in handle_message: %s", e)
         error_text, error_markup = ui.error_message(f"Failed to process: {str(e)}")
         await update.message.reply_text(error_text, reply_markup=error_markup)
 
+async def import_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/import: ask for a CSV or JSON-lines file of tasks to add in one batch."""
+    user_states.set(update.message.chat_id, {"step": "import"})
+    await update.message.reply_text(
+        "Send a .csv or .jsonl file with the columns owner, title, type (daily, recurring or one-time), "
+        "time (HH:MM), date (YYYY-MM-DD, one-time tasks), days (e.g. Mon,Thu for recurring tasks) and, optionally, "
+        "completions (done days as YYYY-MM-DD). Rows without an owner are yours. /export shows the format.")
+
+@metrics.timed("document")
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Import a task file sent after /import; every row is validated and added in one batch."""
+    chat_id = update.message.chat_id
+    state = user_states.get(chat_id)
+    if state is None or state.get("step") != "import":
+        await update.message.reply_text("Use /import before sending a task file.")
+        return
+    try:
+        fmt = file_format(update.message.document.file_name or "")
+        content = await (await update.message.document.get_file()).download_as_bytearray()
+        home = await pool.for_chat(chat_id)
+        task_ids = await home.task_mgr.import_tasks(StringIO(content.decode("utf-8-sig")), fmt,
+                                                    update.message.from_user.username)
+    except (ValueError, UnicodeDecodeError) as e:
+        # Keep the import step so a corrected file can be sent straight away
+        await update.message.reply_text(f"Nothing was imported. {e}")
+        return
+    user_states.pop(chat_id, None)
+    await update.message.reply_text(f"Imported {len(task_ids)} task(s)!")
+
+async def export_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/export [csv|jsonl]: send this household's tasks as a file /import accepts."""
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in FORMATS:
+        await update.message.reply_text("Usage: /export csv or /export jsonl")
+        return
+    home = await pool.for_chat(update.message.chat_id)
+    stream = StringIO()
+    count = await home.task_mgr.export_tasks(stream, fmt)
+    await update.message.reply_document(stream.getvalue().encode(), filename=f"tasks.{fmt}", caption=f"{count} task(s)")
+
 async def send_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
-    task_mgr.log_incomplete_tasks()
-    for username in storage.get_all_users():
-        chat_id = storage.get_user_chat_id(username)
+    """Daily reminder job for one bucket chunk (see reminder_schedule.py), run household by household."""
+    job = context.job.data
+    by_household = {}
+    for household_id, username in bucket_users(user_settings, job["timezone"], job["reminder_time"], job["chunk"], job["chunks"]):
+        by_household.setdefault(household_id, []).append(username)
+    payloads = []
+    for household_id, usernames in by_household.items():
+        try:
+            payloads += await household_reminders(await pool.get(household_id), usernames)
+        except Exception as e:
+            # One household's broken shard must not cost every other household its reminders
+            logger.exception("Reminders failed for household %s: %s", household_id, e)
+    await ReminderDispatcher(context.bot).send_all(payloads)
+
+async def household_reminders(home, usernames):
+    """Log one household's incomplete tasks for usernames and return their reminder payloads."""
+    settings = await home.storage.get_all_user_settings()
+    await home.task_mgr.log_incomplete_tasks(usernames)
+    # Checkpoint: get any write-behind changes into the household's tasks.json
+    await home.storage.flush()
+    # Build every payload first (in one trip to the read pool) so one slow or failing chat can't hold up the rest
+    return await io.read(reminder_payloads, home.task_mgr.sync, usernames, settings)
+
+def reminder_payloads(task_mgr, usernames, settings):
+    """Blocking helper for send_reminders: a payload per user with a chat ID and tasks needing action."""
+    payloads = []
+    for username in usernames:
+        chat_id = settings.get(username, {}).get("chat_id")
         if chat_id:
             tasks = task_mgr.get_user_tasks(username, mine=True)
             if tasks:
-                await context.bot.send_message(chat_id=chat_id, text=ui.reminder_message(tasks))
+                payloads.append({"username": username, "chat_id": chat_id, "text": ui.reminder_message(tasks)})
+    return payloads
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin-only /stats: counters and p50/p95/p99 latencies for the hot paths."""
+    if update.message.from_user.username not in ADMIN_USERS:
+        await update.message.reply_text("Only bot admins can view stats.")
+        return
+    if not metrics.enabled:
+        await update.message.reply_text("Metrics are disabled. Set METRICS_ENABLED=1 in .env to collect them.")
+        return
+    snapshot = metrics.snapshot()
+    lines = ["<b>Counters</b>"]
+    lines += [f"{name}: {value}" for name, value in snapshot["counters"].items()]
+    flows = user_states.stats()
+    lines.append(f"flows: {flows['active']} active, {flows['expired']} expired, {flows['evicted']} evicted")
+    lines.append("\n<b>Timings (ms): count p50 / p95 / p99</b>")
+    lines += [f"{name}: {t['count']} {t['p50_ms']} / {t['p95_ms']} / {t['p99_ms']}" for name, t in snapshot["timings"].items()]
+    # Stay under Telegram's 4096-character message limit
+    await update.message.reply_text("\n".join(lines)[:4000], parse_mode="HTML")
+
+async def report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/report [week|month]: completion counts, rates and streaks for this chat's household."""
+    period = context.args[0].lower() if context.args else "week"
+    if period not in ("week", "month"):
+        await update.message.reply_text("Usage: /report week or /report month")
+        return
+    home = await pool.for_chat(update.message.chat_id)
+    summary = await home.task_mgr.get_report(period, update.message.from_user.username)
+    await update.message.reply_text(ui.report_message(period, summary))
+
+async def reschedule_reminders(application: Application) -> None:
+    """Load every household's user settings and (re)create the per-bucket reminder jobs from them."""
+    await io.read(households.load)
+    user_settings.clear()
+    for household_id in households.all():
+        for username, user in (await pool.user_settings(household_id)).items():
+            user_settings[(household_id, username)] = {"timezone": user["timezone"], "reminder_time": user["reminder_time"]}
+    schedule_reminders(application.job_queue, user_settings, send_reminders)
+
+async def note_user_settings(application: Application, home, username) -> None:
+    """Record a user's current timezone and reminder time, rescheduling the reminder jobs if they changed."""
+    settings = await home.storage.get_user_settings(username)
+    if user_settings.get((home.id, username)) != settings:
+        user_settings[(home.id, username)] = settings
+        schedule_reminders(application.job_queue, user_settings, send_reminders)
+
+async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/timezone [Area/City]: show or change the timezone used for your due dates and reminders."""
+    username = update.message.from_user.username
+    home = await pool.for_chat(update.message.chat_id)
+    if not context.args:
+        settings = await home.storage.get_user_settings(username)
+        await update.message.reply_text(f"Your timezone is {settings['timezone']}. Change it with /timezone Area/City.")
+        return
+    try:
+        timezone = home.task_mgr.sync.validate_timezone(context.args[0])
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    await home.storage.add_user_if_new(username, update.message.chat_id)
+    await home.storage.set_user_settings(username, timezone=timezone)
+    await note_user_settings(context.application, home, username)
+    if DUE_ALERTS_ENABLED:
+        await io.read(refresh_alerts, home, [username], True)
+    await update.message.reply_text(f"Timezone set to {timezone}.")
+
+async def set_reminder_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/reminder [HH:MM]: show or change the local time of your daily reminder."""
+    username = update.message.from_user.username
+    home = await pool.for_chat(update.message.chat_id)
+    if not context.args:
+        settings = await home.storage.get_user_settings(username)
+        await update.message.reply_text(f"Your daily reminder is at {settings['reminder_time']}. Change it with /reminder HH:MM.")
+        return
+    try:
+        reminder_time = home.task_mgr.sync.validate_time(context.args[0])
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    await home.storage.add_user_if_new(username, update.message.chat_id)
+    await home.storage.set_user_settings(username, reminder_time=reminder_time)
+    await note_user_settings(context.application, home, username)
+    await update.message.reply_text(f"Daily reminder set to {reminder_time}.")
+
+async def household(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/household [new NAME]: show this chat's household and invite code, or start a new household."""
+    username = update.message.from_user.username
+    chat_id = update.message.chat_id
+    if context.args and context.args[0].lower() == "new":
+        name = " ".join(context.args[1:]) or f"@{username}'s household"
+        previous = households.for_chat(chat_id)
+        household_id, invite = await io.write(households.create, chat_id, name)
+        await join_household(context.application, household_id, username, chat_id, previous)
+        await update.message.reply_text(f"Created {name}. Family members can join it with /join {invite}")
+        return
+    household_id = households.for_chat(chat_id)
+    invite = households.invite_code(household_id)
+    if invite:
+        await update.message.reply_text(f"This chat uses {households.name(household_id)}. Invite others with /join {invite}")
+    else:
+        await update.message.reply_text(f"This chat uses the {households.name(household_id).lower()}. "
+                                        "Start your own with /household new NAME.")
+
+async def join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/join CODE: move this chat into the household an invite code belongs to."""
+    if not context.args:
+        await update.message.reply_text("Usage: /join CODE (ask a member for their /household invite code).")
+        return
+    chat_id = update.message.chat_id
+    previous = households.for_chat(chat_id)
+    try:
+        household_id = await io.write(households.join, chat_id, context.args[0])
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    await join_household(context.application, household_id, update.message.from_user.username, chat_id, previous)
+    await update.message.reply_text(f"Joined {households.name(household_id)}! Use /start to see its tasks.")
+
+async def join_household(application: Application, household_id, username, chat_id, previous) -> None:
+    """Register a chat's user in the household it just moved to, after leaving the previous one."""
+    if previous != household_id:
+        await leave_household(application, previous, chat_id)
+    home = await pool.get(household_id)
+    await home.storage.add_user_if_new(username, chat_id)
+    await note_user_settings(application, home, username)
+
+async def leave_household(application: Application, household_id, chat_id) -> None:
+    """Stop a household's reminders and due-time alerts for the users of a chat that moved out.
+
+    Their tasks stay in the old household, but without a chat ID nothing is sent for them.
+    """
+    home = await pool.get(household_id)
+    for username in await home.storage.detach_chat(chat_id):
+        user_settings.pop((household_id, username), None)
+        alerts.remove_user((household_id, username))
+    schedule_reminders(application.job_queue, user_settings, send_reminders)
+
+def refresh_alerts(home, usernames, force=False):
+    """Blocking helper: rebuild a household's due-time alerts for users whose local day changed (or all given ones if force)."""
+    rebuilt = 0
+    for username in usernames:
+        day = home.task_mgr.sync.local_now(username).date()
+        if force or alerts.days.get((home.id, username)) != day:
+            alerts.replace_user((home.id, username), home.task_mgr.sync.get_due_alerts(username), day)
+            rebuilt += 1
+    return rebuilt
+
+async def roll_over_alerts(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Build each user's due-time alerts at startup and again when their local day rolls over."""
+    # Only households with a user whose local day changed are opened
+    stale = {}
+    for (household_id, username), settings in list(user_settings.items()):
+        if alerts.days.get((household_id, username)) != datetime.now(zone(settings["timezone"])).date():
+            stale.setdefault(household_id, []).append(username)
+    rebuilt = 0
+    for household_id, usernames in stale.items():
+        rebuilt += await io.read(refresh_alerts, await pool.get(household_id), usernames)
+    if rebuilt:
+        logger.info("Rebuilt due-time alerts for %d user(s); %d pending.", rebuilt, len(alerts))
+
+async def send_due_alerts(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send every alert whose due time has passed; this one job serves all tasks of every household."""
+    due = alerts.pop_due(time.time())
+    if not due:
+        return
+    titles = {}
+    for (household_id, username), _, title, _ in due:
+        titles.setdefault(household_id, {}).setdefault(username, []).append(title)
+    payloads = []
+    for household_id, user_titles in titles.items():
+        settings = await pool.user_settings(household_id)
+        payloads += [
+            {"username": username, "chat_id": settings[username]["chat_id"], "text": ui.due_alert_message(task_titles)}
+            for username, task_titles in user_titles.items() if settings.get(username, {}).get("chat_id")
+        ]
+    await ReminderDispatcher(context.bot).send_all(payloads)
+
+async def dump_metrics(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await io.read(metrics.dump, METRICS_DUMP_FILE)
+
+async def save_user_states(context: ContextTypes.DEFAULT_TYPE = None) -> None:
+    """Write changed multi-step flow state on the writer thread (snapshotted here, on the event loop)."""
+    if user_states.dirty:
+        await io.write(user_states.save, user_states.snapshot())
+
+async def close_storage(application: Application) -> None:
+    """Let queued storage writes finish and flush every open household's write-behind changes before exiting."""
+    await save_user_states()
+    await pool.flush_all()
+    await io.close()
 
 def main() -> None:
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Importing this module only builds the objects below; logging, the token check and every
+    # file read happen once the bot actually starts
+    setup_logging()
+    if UPDATE_MODE not in ("polling", "webhook"):
+        raise ValueError(f"Unknown UPDATE_MODE '{UPDATE_MODE}'. Use 'polling' or 'webhook'.")
+    if UPDATE_MODE == "webhook" and not WEBHOOK_URL:
+        raise ValueError("UPDATE_MODE=webhook needs WEBHOOK_URL (the public HTTPS base URL) in .env.")
+    # Enough connections for every concurrent handler plus the reminder fan-out
+    builder = (Application.builder().token(bot_token())
+               .request(instrumented_request(connection_pool_size=CONCURRENT_UPDATES + REMINDER_CONCURRENCY))
+               .concurrent_updates(CONCURRENT_UPDATES)
+               .post_init(reschedule_reminders).post_shutdown(close_storage))
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL.rstrip('/')}/bot").base_file_url(f"{TELEGRAM_API_URL.rstrip('/')}/file/bot")
+    application = builder.build()
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CommandHandler("report", report))
+    application.add_handler(CommandHandler("import", import_tasks))
+    application.add_handler(CommandHandler("export", export_tasks))
+    application.add_handler(CommandHandler("timezone", set_timezone))
+    application.add_handler(CommandHandler("reminder", set_reminder_time))
+    application.add_handler(CommandHandler("household", household))
+    application.add_handler(CommandHandler("join", join))
     application.add_handler(CallbackQueryHandler(button))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    reminder_time = datetime.strptime(REMINDER_TIME, "%H:%M").time()
-    application.job_queue.run_daily(send_reminders, time=reminder_time)
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    if DUE_ALERTS_ENABLED:
+        application.job_queue.run_repeating(roll_over_alerts, interval=DUE_ALERT_ROLLOVER_SECONDS, first=0)
+        application.job_queue.run_repeating(send_due_alerts, interval=DUE_ALERT_TICK_SECONDS)
+    application.job_queue.run_repeating(save_user_states, interval=USER_STATES_SAVE_INTERVAL)
+    if metrics.enabled and METRICS_DUMP_FILE:
+        application.job_queue.run_repeating(dump_metrics, interval=METRICS_DUMP_INTERVAL)
+    if UPDATE_MODE == "webhook":
+        # Registers the webhook (with the secret) on startup and serves it until stopped
+        application.run_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH,
+                                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}", secret_token=webhook_secret(),
+                                allowed_updates=ALLOWED_UPDATES, max_connections=CONCURRENT_UPDATES)
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
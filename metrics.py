@@ -0,0 +1,135 @@
+# metrics.py
+# Lightweight counters and timers for the Family Task Bot's hot paths.
+# When disabled (the default) timers are a shared no-op and counters return immediately,
+# so instrumented code pays roughly one attribute check per call.
+
+import functools
+import inspect
+import json
+import time
+from collections import defaultdict, deque
+from config import METRICS_ENABLED, METRICS_MAX_SAMPLES
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+def _percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+class Metrics:
+    def __init__(self, enabled=False, max_samples=1024):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        # name -> [count, total_seconds, recent samples]; percentiles use the recent samples
+        self.timings = {}
+
+    def incr(self, name, amount=1):
+        """Add amount to a counter."""
+        if self.enabled:
+            self.counters[name] += amount
+
+    def observe(self, name, seconds):
+        """Record one duration for a timer."""
+        if not self.enabled:
+            return
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = [0, 0.0, deque(maxlen=self.max_samples)]
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2].append(seconds)
+
+    def timer(self, name):
+        """Context manager timing its block under name."""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def timed(self, name):
+        """Decorator timing every call of a function or coroutine function under name."""
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    started = time.perf_counter()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        self.observe(name, time.perf_counter() - started)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Return counters and per-timer count/mean/p50/p95/p99/max (milliseconds) as a dict."""
+        timings = {}
+        for name, (count, total, samples) in sorted(self.timings.items()):
+            ordered = sorted(samples)
+            timings[name] = {
+                "count": count,
+                "mean_ms": round(total / count * 1000, 3),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+                "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return {
+            "enabled": self.enabled,
+            "since": self.started,
+            "counters": dict(sorted(self.counters.items())),
+            "timings": timings,
+        }
+
+    def dump(self, path):
+        """Write a snapshot to path as JSON."""
+        from storage import write_atomically
+        write_atomically(path, json.dumps(self.snapshot(), indent=2))
+
+def instrumented_request(**kwargs):
+    """Build a python-telegram-bot HTTPXRequest that times every Bot API call by method name."""
+    from telegram.request import HTTPXRequest
+
+    class InstrumentedRequest(HTTPXRequest):
+        async def do_request(self, url, method, *args, **kw):
+            if not metrics.enabled:
+                return await super().do_request(url, method, *args, **kw)
+            with metrics.timer(f"telegram.{url.rsplit('/', 1)[-1]}"):
+                return await super().do_request(url, method, *args, **kw)
+
+    return InstrumentedRequest(**kwargs)
+
+# Process-wide instance used by storage, task_manager and main
+metrics = Metrics(enabled=METRICS_ENABLED, max_samples=METRICS_MAX_SAMPLES)
@@ -0,0 +1,55 @@
+# reminder_schedule.py
+# Per-user daily reminder scheduling for the Family Task Bot.
+# Users who share a timezone and reminder time form a bucket that gets one daily job at that
+# local time. Large buckets are split into chunks that start REMINDER_CHUNK_SPACING seconds
+# apart, so no single job walks the whole user base. Chunk membership is a stable hash of the
+# user's key, so users added after scheduling still land in exactly one chunk. Keys are opaque:
+# the bot uses (household_id, username) so one set of jobs serves every household.
+
+import logging
+import zlib
+from datetime import datetime, timedelta
+from config import REMINDER_BUCKET_SIZE, REMINDER_CHUNK_SPACING
+from task_manager import zone
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "reminders:"
+
+def reminder_buckets(settings):
+    """Group {user: settings} into {(timezone, "HH:MM"): [users]}."""
+    buckets = {}
+    for user_key, user in settings.items():
+        buckets.setdefault((user["timezone"], user["reminder_time"]), []).append(user_key)
+    return buckets
+
+def chunk_of(user_key, chunks):
+    """Return which of a bucket's chunks a user belongs to."""
+    return zlib.crc32(str(user_key).encode()) % chunks
+
+def bucket_users(settings, timezone, reminder_time, chunk, chunks):
+    """Return the users a reminder job for (timezone, reminder_time, chunk of chunks) should handle."""
+    return [
+        user_key for user_key, user in settings.items()
+        if user["timezone"] == timezone and user["reminder_time"] == reminder_time and chunk_of(user_key, chunks) == chunk
+    ]
+
+def schedule_reminders(job_queue, settings, callback):
+    """Replace the bot's reminder jobs with one daily job per bucket chunk; returns the number of jobs."""
+    for job in job_queue.jobs():
+        if job.name and job.name.startswith(JOB_PREFIX):
+            job.schedule_removal()
+    count = 0
+    for (timezone, reminder_time), users in sorted(reminder_buckets(settings).items()):
+        chunks = -(-len(users) // REMINDER_BUCKET_SIZE)
+        start = datetime.strptime(reminder_time, "%H:%M")
+        for chunk in range(chunks):
+            # Aware local times let the job queue follow DST changes in the user's zone
+            at = (start + timedelta(seconds=chunk * REMINDER_CHUNK_SPACING)).time().replace(tzinfo=zone(timezone))
+            job_queue.run_daily(
+                callback, time=at, name=f"{JOB_PREFIX}{timezone}@{reminder_time}#{chunk}",
+                data={"timezone": timezone, "reminder_time": reminder_time, "chunk": chunk, "chunks": chunks},
+            )
+            count += 1
+    logger.info("Scheduled %d reminder job(s) for %d user(s).", count, len(settings))
+    return count
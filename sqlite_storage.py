@@ -0,0 +1,369 @@
+# sqlite_storage.py
+# SQLite storage backend for the Family Task Bot (STORAGE_BACKEND = "sqlite" in config.py).
+# Implements the same methods as storage.Storage on a WAL-mode database with indexed
+# tables, so a toggle touches one row instead of rewriting tasks.json.
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from config import HISTORY_RETENTION_DAYS, TIMEZONE, REMINDER_TIME
+from history_log import HistoryLog
+from completions import CompletionSet
+from storage import data_paths, history_entry, task_record
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    chat_id INTEGER,
+    timezone TEXT,
+    reminder_time TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    type TEXT NOT NULL,
+    time TEXT NOT NULL,
+    date TEXT,
+    days TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_owner ON tasks(owner);
+CREATE TABLE IF NOT EXISTS completions (
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    PRIMARY KEY (task_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user TEXT,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp);
+CREATE INDEX IF NOT EXISTS history_user ON history(user, id);
+CREATE INDEX IF NOT EXISTS history_task ON history(task_id, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses
+# the compiled (prepared) form on every call.
+INSERT_USER = "INSERT INTO users (username, chat_id) VALUES (?, ?) ON CONFLICT(username) DO NOTHING"
+UPDATE_CHAT_ID = "UPDATE users SET chat_id = ? WHERE username = ? AND chat_id IS NOT ?"
+SELECT_USERS = "SELECT username FROM users ORDER BY rowid"
+SELECT_USERS_BY_CHAT = "SELECT username FROM users WHERE chat_id = ? ORDER BY rowid"
+CLEAR_CHAT_ID = "UPDATE users SET chat_id = NULL WHERE chat_id = ?"
+SELECT_CHAT_ID = "SELECT chat_id FROM users WHERE username = ?"
+DELETE_USER = "DELETE FROM users WHERE username = ?"
+SELECT_USER_SETTINGS = "SELECT timezone, reminder_time FROM users WHERE username = ?"
+SELECT_ALL_USER_SETTINGS = "SELECT username, chat_id, timezone, reminder_time FROM users ORDER BY rowid"
+UPDATE_USER_SETTINGS = """
+UPDATE users SET timezone = COALESCE(?, timezone), reminder_time = COALESCE(?, reminder_time) WHERE username = ?
+"""
+# Columns added after the first release, with their tables and types, for ALTER TABLE on older databases
+ADDED_COLUMNS = (("users", "timezone", "TEXT"), ("users", "reminder_time", "TEXT"), ("history", "owner", "TEXT"))
+# Whose task a history entry was about: owner is only stored when someone else acted. Created after
+# ADDED_COLUMNS, since older databases lack the owner column until then.
+HISTORY_OWNER = "COALESCE(owner, user)"
+CREATE_HISTORY_OWNER_INDEX = f"CREATE INDEX IF NOT EXISTS history_owner ON history({HISTORY_OWNER}, id)"
+SELECT_HISTORY_CURSOR = "SELECT COALESCE(MAX(id), 0) + 1 FROM history"
+UPSERT_TASK = """
+INSERT INTO tasks (id, owner, title, type, time, date, days) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, title = excluded.title, type = excluded.type,
+    time = excluded.time, date = excluded.date, days = excluded.days
+"""
+SELECT_USER_TASKS = "SELECT id, owner, title, type, time, date, days FROM tasks WHERE owner = ? ORDER BY rowid"
+SELECT_TASK = "SELECT id, owner, title, type, time, date, days FROM tasks WHERE id = ?"
+DELETE_TASK = "DELETE FROM tasks WHERE id = ? AND owner = ?"
+SELECT_USER_COMPLETIONS = """
+SELECT c.task_id, c.day FROM completions c JOIN tasks t ON t.id = c.task_id
+WHERE t.owner = ? ORDER BY c.day
+"""
+SELECT_TASK_COMPLETIONS = "SELECT day FROM completions WHERE task_id = ? ORDER BY day"
+DELETE_TASK_COMPLETIONS = "DELETE FROM completions WHERE task_id = ?"
+INSERT_COMPLETION = "INSERT OR IGNORE INTO completions (task_id, day) VALUES (?, ?)"
+INSERT_HISTORY = "INSERT INTO history (task_id, title, status, timestamp, user, owner) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_HISTORY = "SELECT task_id, title, status, timestamp, user, owner FROM history WHERE timestamp >= ? ORDER BY id"
+PRUNE_HISTORY = "DELETE FROM history WHERE timestamp < ?"
+SELECT_META = "SELECT value FROM meta WHERE key = ?"
+SET_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+
+def _row_to_task(row, completions):
+    task_id, _, title, task_type, time, date, days = row
+    task = {"id": task_id, "title": title, "type": task_type, "time": time, "completions": CompletionSet(completions)}
+    if date is not None:
+        task["date"] = date
+    if days is not None:
+        task["days"] = days.split(",") if days else []
+    return task
+
+class SQLiteStorage:
+    def __init__(self, path, data_dir=None):
+        self.path = path
+        # JSON files imported on first run (a household's own directory, or the top-level ones)
+        self.json_paths = data_paths(data_dir)
+        # History rollups live next to the database in the same columnar file the JSON backend uses
+        self.analytics_file = self.json_paths[4]
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+        # One connection for writes (shared across threads behind a lock) and one per reader
+        # thread, so WAL readers never wait on, or see the middle of, a write transaction
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self._write_lock = threading.RLock()
+        self._readers = threading.local()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._add_missing_columns()
+        self._pruned_on = None
+        self._writes = 0
+        self._migrate_from_json()
+
+    @property
+    def version(self):
+        """Data version; changes on our own writes and on commits from other connections."""
+        with self._write_lock:
+            return (self._writes, self.conn.execute("PRAGMA data_version").fetchone()[0])
+
+    def _reader(self):
+        """Return this thread's read connection, opening it on first use."""
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(self.path, cached_statements=64)
+        return conn
+
+    def _add_missing_columns(self):
+        """Bring a database created by an older version up to the current tables."""
+        with self.conn:
+            for table, column, column_type in ADDED_COLUMNS:
+                if column not in {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            self.conn.execute(CREATE_HISTORY_OWNER_INDEX)
+
+    def _migrate_from_json(self):
+        """One-shot import of tasks.json and history (segments + history.json) into the database."""
+        if self.conn.execute(SELECT_META, ("migrated_from_json",)).fetchone():
+            return
+        with self._write_lock, self.conn:
+            tasks_file, history_dir, history_file, _, _ = self.json_paths
+            if os.path.exists(tasks_file):
+                with open(tasks_file, "r") as f:
+                    data = json.load(f)
+                for username, user in data.get("users", {}).items():
+                    self.conn.execute(INSERT_USER, (username, user.get("chat_id")))
+                    self.conn.execute(UPDATE_USER_SETTINGS, (user.get("timezone"), user.get("reminder_time"), username))
+                    for task in user.get("tasks", []):
+                        self._write_task(username, task)
+            if os.path.isdir(history_dir) or os.path.exists(history_file):
+                history = HistoryLog(history_dir, HISTORY_RETENTION_DAYS, legacy_file=history_file).read()
+                self.conn.executemany(INSERT_HISTORY, [
+                    (e["task_id"], e["title"], e["status"], e["timestamp"], e.get("user"), e.get("owner"))
+                    for e in history
+                ])
+            self.conn.execute(SET_META, ("migrated_from_json", datetime.now().isoformat()))
+
+    def _write_task(self, username, task):
+        days = task.get("days")
+        self.conn.execute(UPSERT_TASK, (
+            task["id"], username, task["title"], task["type"], task["time"],
+            task.get("date"), ",".join(days) if days is not None else None,
+        ))
+        self.conn.execute(DELETE_TASK_COMPLETIONS, (task["id"],))
+        self.conn.executemany(INSERT_COMPLETION, [(task["id"], day) for day in task.get("completions", [])])
+
+    def add_user_if_new(self, username, chat_id):
+        """Add a new user if they don’t exist, associating their chat ID."""
+        with self._write_lock, self.conn:
+            self.conn.execute(INSERT_USER, (username, chat_id))
+            if chat_id is not None:
+                self.conn.execute(UPDATE_CHAT_ID, (chat_id, username, chat_id))
+            self._writes += 1
+
+    def detach_chat(self, chat_id):
+        """Clear the chat ID of every user reached through chat_id; returns their usernames (tasks stay)."""
+        with self._write_lock, self.conn:
+            detached = [username for (username,) in self.conn.execute(SELECT_USERS_BY_CHAT, (chat_id,))]
+            if detached:
+                self.conn.execute(CLEAR_CHAT_ID, (chat_id,))
+                self._writes += 1
+        return detached
+
+    def flush(self):
+        """No-op: every write is already committed (kept for parity with Storage's write-behind)."""
+
+    def get_user_tasks(self, username):
+        """Retrieve all tasks for a given user."""
+        conn = self._reader()
+        completions = {}
+        for task_id, day in conn.execute(SELECT_USER_COMPLETIONS, (username,)):
+            completions.setdefault(task_id, []).append(day)
+        return [_row_to_task(row, completions.get(row[0], [])) for row in conn.execute(SELECT_USER_TASKS, (username,))]
+
+    def save_task(self, username, task):
+        """Save a new or updated task for a user, ensuring required fields."""
+        self.save_tasks([(username, task)])
+
+    def save_tasks(self, items):
+        """Save several (username, task) pairs in one transaction."""
+        records = [(username, task_record(task)) for username, task in items]
+        if not records:
+            return
+        with self._write_lock, self.conn:
+            self.conn.executemany(INSERT_USER, {(username, None) for username, _ in records})
+            for username, task in records:
+                self._write_task(username, task)
+            self._writes += 1
+
+    def delete_task(self, username, task_id):
+        """Remove a task by ID for a user and log it in history."""
+        # Looked up under the write lock, so the task logged is the one deleted
+        with self._write_lock, self.conn:
+            owner, task = self._find_task(self.conn, task_id)
+            if owner == username:
+                self.conn.execute(DELETE_TASK, (task_id, username))
+                self._writes += 1
+        if owner != username:
+            if username in self.get_all_users():
+                raise ValueError("Task not found.")
+            return
+        self.log_history(task, "deleted", username)
+
+    def delete_tasks(self, items):
+        """Remove several (username, task_id) tasks in one transaction and log them in history.
+
+        Tasks that don't exist (or belong to someone else) are skipped; returns the removed (username, task) pairs.
+        """
+        removed = []
+        seen = set()
+        with self._write_lock, self.conn:
+            for username, task_id in items:
+                owner, task = self._find_task(self.conn, task_id)
+                if owner == username and task_id not in seen:
+                    seen.add(task_id)
+                    removed.append((username, task))
+            if removed:
+                self.conn.executemany(DELETE_TASK, [(task["id"], username) for username, task in removed])
+                self._writes += 1
+        if removed:
+            self.log_history_many([(task, "deleted", username) for username, task in removed])
+        return removed
+
+    def find_task(self, task_id):
+        """Return (owner, task) for a task ID across all users, or (None, None)."""
+        return self._find_task(self._reader(), task_id)
+
+    @staticmethod
+    def _find_task(conn, task_id):
+        row = conn.execute(SELECT_TASK, (task_id,)).fetchone()
+        if row is None:
+            return None, None
+        completions = [day for (day,) in conn.execute(SELECT_TASK_COMPLETIONS, (task_id,))]
+        return row[1], _row_to_task(row, completions)
+
+    def get_all_users(self):
+        """Return a list of all usernames."""
+        conn = self._reader()
+        return [username for (username,) in conn.execute(SELECT_USERS)]
+
+    def delete_user(self, username):
+        """Remove a user and their tasks."""
+        with self._write_lock, self.conn:
+            self.conn.execute(DELETE_USER, (username,))
+            self._writes += 1
+
+    def get_user_settings(self, username):
+        """Return a user's {"timezone", "reminder_time"}, defaulting to config's TIMEZONE and REMINDER_TIME."""
+        row = self._reader().execute(SELECT_USER_SETTINGS, (username,)).fetchone() or (None, None)
+        return {"timezone": row[0] or TIMEZONE, "reminder_time": row[1] or REMINDER_TIME}
+
+    def get_all_user_settings(self):
+        """Return {username: {"chat_id", "timezone", "reminder_time"}} for every user."""
+        return {
+            username: {"chat_id": chat_id, "timezone": timezone or TIMEZONE, "reminder_time": reminder_time or REMINDER_TIME}
+            for username, chat_id, timezone, reminder_time in self._reader().execute(SELECT_ALL_USER_SETTINGS)
+        }
+
+    def set_user_settings(self, username, timezone=None, reminder_time=None):
+        """Set a user's timezone and/or reminder time; None leaves a setting unchanged."""
+        with self._write_lock, self.conn:
+            self.conn.execute(INSERT_USER, (username, None))
+            self.conn.execute(UPDATE_USER_SETTINGS, (timezone, reminder_time, username))
+            self._writes += 1
+
+    def log_history(self, task, status, username, owner=None):
+        """Log task activity (completed, incomplete, deleted) by username to history; owner defaults to username."""
+        self.log_history_many([(task, status, username, owner)])
+
+    def log_history_many(self, events):
+        """Log several (task, status, username[, owner]) events to history in one transaction."""
+        timestamp = datetime.now().isoformat()
+        entries = [history_entry(timestamp, *event) for event in events]
+        with self._write_lock, self.conn:
+            self.conn.executemany(INSERT_HISTORY, [
+                (e["task_id"], e["title"], e["status"], e["timestamp"], e["user"], e.get("owner")) for e in entries
+            ])
+        if self._pruned_on != datetime.now().date():
+            self.prune_history()
+
+    def prune_history(self):
+        """Remove history entries older than 14 days."""
+        cutoff = datetime.now() - timedelta(days=HISTORY_RETENTION_DAYS)
+        with self._write_lock, self.conn:
+            self.conn.execute(PRUNE_HISTORY, (cutoff.isoformat(),))
+        self._pruned_on = datetime.now().date()
+
+    def get_history(self):
+        """Retrieve all history entries."""
+        conn = self._reader()
+        cutoff = (datetime.now() - timedelta(days=HISTORY_RETENTION_DAYS)).isoformat()
+        return [
+            history_entry(timestamp, {"id": task_id, "title": title}, status, user, owner)
+            for task_id, title, status, timestamp, user, owner in conn.execute(SELECT_HISTORY, (cutoff,))
+        ]
+
+    def get_history_page(self, page=0, page_size=10, before=None, user=None, task_id=None, status=None, owner=None):
+        """Return (entries newest first, total matching, next_cursor) for one page of history.
+
+        Pages count back from `before` (a get_history_cursor() or a previous next_cursor) if given,
+        and the total then counts only matching entries before it.
+        """
+        conn = self._reader()
+        where = ["timestamp >= ?"]
+        params = [(datetime.now() - timedelta(days=HISTORY_RETENTION_DAYS)).isoformat()]
+        for column, value in (("user", user), (HISTORY_OWNER, owner), ("task_id", task_id), ("status", status)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if before is not None:
+            where.append("id < ?")
+            params.append(before)
+        clause = " AND ".join(where)
+        total = conn.execute(f"SELECT COUNT(*) FROM history WHERE {clause}", params).fetchone()[0]
+        # Fetch one extra row to know whether there is a next page
+        rows = conn.execute(
+            f"SELECT id, task_id, title, status, timestamp, user, owner FROM history WHERE {clause} "
+            "ORDER BY id DESC LIMIT ? OFFSET ?", params + [page_size + 1, page * page_size]).fetchall()
+        next_cursor = rows[page_size - 1][0] if len(rows) > page_size else None
+        entries = [
+            history_entry(timestamp, {"id": task_id, "title": title}, status, user, owner)
+            for _, task_id, title, status, timestamp, user, owner in rows[:page_size]
+        ]
+        return entries, total, next_cursor
+
+    def get_history_cursor(self):
+        """Return a cursor just past the newest history entry, for get_history_page's `before`."""
+        return self._reader().execute(SELECT_HISTORY_CURSOR).fetchone()[0]
+
+    def get_user_chat_id(self, username):
+        """Get the chat ID for a user."""
+        conn = self._reader()
+        row = conn.execute(SELECT_CHAT_ID, (username,)).fetchone()
+        return row[0] if row else None
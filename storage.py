@@ -2,130 +2,489 @@
 # Manages JSON storage for tasks and history in the Family Task Bot.
 
 import json
-from datetime import datetime, timedelta
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 import os
-from config import TASKS_FILE, HISTORY_FILE, HISTORY_RETENTION_DAYS
+from config import (TASKS_FILE, HISTORY_FILE, HISTORY_DIR, HISTORY_RETENTION_DAYS, ANALYTICS_FILE, STORAGE_BACKEND, SQLITE_FILE, JSON_INDENT,
+                    WRITE_BEHIND, WRITE_BEHIND_DELAY, WRITE_BEHIND_MAX_PENDING, TASKS_JOURNAL_FILE, TIMEZONE, REMINDER_TIME)
+from history_log import HistoryLog
+from completions import CompletionSet, compact_completions, json_default
+from metrics import metrics
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not available on Windows; fall back to unlocked writes
+
+logger = logging.getLogger(__name__)
+
+def _file_signature(filename):
+    """Return (mtime_ns, size) for a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def write_atomically(filename, text):
+    """Replace filename with text (or bytes) via a fsynced temp file, so readers never see a partial write."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filename)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(text, bytes) else "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def data_paths(data_dir=None):
+    """Return (tasks file, history dir, legacy history file, journal, analytics file) for a data directory.
+
+    None means the top-level files from config.py; households use their own directories.
+    """
+    if data_dir is None:
+        return TASKS_FILE, HISTORY_DIR, HISTORY_FILE, TASKS_JOURNAL_FILE, ANALYTICS_FILE
+    return tuple(os.path.join(data_dir, os.path.basename(path))
+                 for path in (TASKS_FILE, HISTORY_DIR, HISTORY_FILE, TASKS_JOURNAL_FILE, ANALYTICS_FILE))
+
+def task_record(task):
+    """Return the stored form of a task: required fields with defaults plus date/days if present."""
+    task = {
+        "id": task.get("id"),
+        "title": task.get("title", "Untitled"),
+        "type": task.get("type", "one-time"),
+        "time": task.get("time", "23:59"),
+        "completions": compact_completions(task),
+        **{k: (list(v) if k == "days" else v) for k, v in task.items() if k in ["date", "days"]}  # Preserve optional fields
+    }
+    if not task["id"] or not task["title"]:
+        raise ValueError("Task must have an 'id' and 'title'.")
+    return task
+
+def history_entry(timestamp, task, status, username, owner=None):
+    """Return a history entry; "owner" is only stored when someone other than the owner acted."""
+    entry = {"task_id": task["id"], "title": task["title"], "status": status, "timestamp": timestamp, "user": username}
+    if owner and owner != username:
+        entry["owner"] = owner
+    return entry
+
+def _copy_task(task):
+    """Copy a task dict so callers can't mutate the cached model by accident."""
+    task = dict(task)
+    for key in ("completions", "days"):
+        if key in task:
+            task[key] = task[key].copy()
+    return task
 
 class Storage:
-    def __init__(self):
+    def __init__(self, data_dir=None):
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+        self.tasks_file, history_dir, history_file, self.journal_file, self.analytics_file = data_paths(data_dir)
+        # In-memory model per file: {filename: (signature, data)}. Loaded once and kept
+        # write-through; a changed mtime/size means another writer touched the file.
+        self._cache = {}
+        # Advisory fcntl locks held by this instance: {filename: (lock_file, depth)}
+        self._locks = {}
+        # task_id -> (owner, task) over the cached tasks data; rebuilt when the file is reloaded
+        self._task_index = {}
+        self._indexed_data = None
+        # Bumped on every change to the tasks model (our writes or a reload of someone else's)
+        self._version = 0
+        # Guards the in-memory model when called from executor threads (see async_storage.py):
+        # readers copy under it, writers mutate and serialize under it, then write without it
+        self._mutex = threading.RLock()
+        # Serializes writers in this process; the fcntl lock below serializes processes
+        self._writer = threading.RLock()
+        # Write-behind state: changes applied in memory and journaled but not yet in tasks.json.
+        # While changes are pending this instance is the only up-to-date copy, so write-behind
+        # assumes a single bot process sharing one Storage.
+        self.write_behind = WRITE_BEHIND
+        self._pending = 0
+        self._journal = None
+        self._flush_timer = None
+        self._replaying = False
         # Ensure JSON files exist with default structure if they don’t
-        # Note: No file locking; assumes single-threaded access for simplicity (<10 users).
-        if not os.path.exists(TASKS_FILE):
-            self.save_data(TASKS_FILE, {"users": {}})
-        if not os.path.exists(HISTORY_FILE):
-            self.save_data(HISTORY_FILE, {"history": []})
+        if not os.path.exists(self.tasks_file):
+            self.save_data(self.tasks_file, {"users": {}})
+        self._replay_journal()
+        # History is an append-only segmented log; history.json is only read for compatibility
+        self.history = HistoryLog(history_dir, HISTORY_RETENTION_DAYS, legacy_file=history_file)
 
     def load_data(self, filename):
         """Load data from a JSON file, returning default structure if file is missing."""
+        signature = _file_signature(filename)
+        cached = self._cache.get(filename)
+        if cached is not None and signature is not None and cached[0] == signature:
+            metrics.incr("storage.load_cache_hits")
+            return cached[1]
+        try:
+            with metrics.timer("storage.load_data"), open(filename, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {"users": {}} if filename == self.tasks_file else {"history": []}
+        except json.JSONDecodeError as e:
+            # Never fall back to an empty structure here: the next save would wipe every task
+            if cached is not None:
+                logger.error("%s is unreadable (%s); keeping the last good copy in memory.", filename, e)
+                return cached[1]
+            raise ValueError(f"{filename} is corrupt ({e}); refusing to load or overwrite it.") from e
+        self._cache[filename] = (signature, data)
+        return data
+
+    @contextmanager
+    def _locked(self, filename):
+        """Hold an exclusive advisory lock on filename's .lock file (re-entrant per instance)."""
+        with self._writer:
+            if fcntl is None:
+                yield
+                return
+            with self._flock(filename):
+                yield
+
+    @contextmanager
+    def _flock(self, filename):
+        lock_file, depth = self._locks.get(filename, (None, 0))
+        if lock_file is None:
+            lock_file = open(f"{filename}.lock", "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        self._locks[filename] = (lock_file, depth + 1)
         try:
-            with open(filename, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"users": {}} if filename == TASKS_FILE else {"history": []}
+            yield
+        finally:
+            lock_file, depth = self._locks[filename]
+            if depth == 1:
+                del self._locks[filename]
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            else:
+                self._locks[filename] = (lock_file, depth - 1)
+
+    def save_data(self, filename, data, changed=True):
+        """Atomically save data to a JSON file: write a temp file, fsync it, then rename over the target.
+
+        changed=False writes tasks data whose changes were already counted in the version (a flush).
+        """
+        with metrics.timer("storage.save_data"):
+            with self._mutex:
+                payload = json.dumps(data, indent=JSON_INDENT, default=json_default)
+            with self._locked(filename):
+                write_atomically(filename, payload)
+                with self._mutex:
+                    self._cache[filename] = (_file_signature(filename), data)
+                    if changed and filename == self.tasks_file:
+                        self._version += 1
+        metrics.incr("storage.bytes_written", len(payload))
+
+    def _load_tasks(self):
+        """Load tasks data, rebuilding the task-id index if the data was (re)loaded."""
+        if self._pending:
+            # tasks.json on disk is behind our in-memory copy until the next flush
+            return self._indexed_data
+        data = self.load_data(self.tasks_file)
+        if data is not self._indexed_data:
+            self._task_index = {}
+            for username, user in data["users"].items():
+                for t in user.get("tasks", []):
+                    if not isinstance(t.get("completions"), CompletionSet):
+                        t["completions"] = CompletionSet(t.get("completions", []))
+                    self._task_index[t["id"]] = (username, t)
+            self._indexed_data = data
+            self._version += 1
+        return data
+
+    def _commit(self, method, *args):
+        """Persist a change already applied to the in-memory model (called with the writer lock held).
 
-    def save_data(self, filename, data):
-        """Save data to a JSON file with proper formatting."""
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=2)
+        Without write-behind this rewrites tasks.json; with it, the change is appended to the
+        journal as (method, args) and tasks.json is rewritten later by flush().
+        """
+        if self._replaying:
+            return
+        if not self.write_behind:
+            self.save_data(self.tasks_file, self._indexed_data)
+            return
+        line = json.dumps({"op": method, "args": args}, default=json_default) + "\n"
+        if self._journal is None:
+            self._journal = open(self.journal_file, "a")
+        # Flushed to the OS, so a killed process loses nothing; only a power cut can drop the last lines
+        self._journal.write(line)
+        self._journal.flush()
+        metrics.incr("storage.journal_writes")
+        with self._mutex:
+            self._pending += 1
+            self._version += 1
+        if self._pending >= WRITE_BEHIND_MAX_PENDING:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(WRITE_BEHIND_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Write pending write-behind changes to tasks.json and empty the journal."""
+        with self._locked(self.tasks_file):
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            # _commit() already bumped the version for each pending change
+            self.save_data(self.tasks_file, self._indexed_data, changed=False)
+            with self._mutex:
+                self._pending = 0
+            # Only after tasks.json is safely replaced; replaying a change twice is harmless
+            self._journal.truncate(0)
+            metrics.incr("storage.flushes")
+
+    def _replay_journal(self):
+        """Re-apply changes journaled by a process that died before flushing, then flush them."""
+        try:
+            with open(self.journal_file, "r") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        ops = []
+        for line in lines:
+            try:
+                ops.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("Skipping torn line in %s.", self.journal_file)
+        if ops:
+            logger.info("Replaying %d journaled change(s) from %s.", len(ops), self.journal_file)
+            with self._locked(self.tasks_file):
+                self._replaying = True
+                try:
+                    for op in ops:
+                        try:
+                            getattr(self, op["op"])(*op["args"])
+                        except ValueError:
+                            pass  # e.g. deleting a task that a later flush already removed
+                finally:
+                    self._replaying = False
+                self.save_data(self.tasks_file, self._load_tasks())
+        os.remove(self.journal_file)
+
+    @property
+    def version(self):
+        """Data version of the tasks model; changes whenever any task or user changes."""
+        with self._mutex:
+            self._load_tasks()
+            return self._version
 
     def add_user_if_new(self, username, chat_id):
         """Add a new user if they don’t exist, associating their chat ID."""
-        data = self.load_data(TASKS_FILE)
-        if username not in data["users"]:
-            data["users"][username] = {"chat_id": chat_id, "tasks": []}
-            self.save_data(TASKS_FILE, data)
-        elif data["users"][username]["chat_id"] != chat_id and chat_id is not None:
-            # Update chat ID if provided and different
-            data["users"][username]["chat_id"] = chat_id
-            self.save_data(TASKS_FILE, data)
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                data = self._load_tasks()
+                changed = True
+                if username not in data["users"]:
+                    data["users"][username] = {"chat_id": chat_id, "tasks": []}
+                elif data["users"][username]["chat_id"] != chat_id and chat_id is not None:
+                    # Update chat ID if provided and different
+                    data["users"][username]["chat_id"] = chat_id
+                else:
+                    changed = False
+            if changed:
+                self._commit("add_user_if_new", username, chat_id)
+
+    def detach_chat(self, chat_id):
+        """Clear the chat ID of every user reached through chat_id (it moved to another household).
+
+        Their tasks stay; returns the usernames that were detached.
+        """
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                detached = [username for username, user in self._load_tasks()["users"].items()
+                            if user.get("chat_id") == chat_id]
+                for username in detached:
+                    self._indexed_data["users"][username]["chat_id"] = None
+            if detached:
+                self._commit("detach_chat", chat_id)
+        return detached
 
     def get_user_tasks(self, username):
         """Retrieve all tasks for a given user."""
-        data = self.load_data(TASKS_FILE)
-        return data["users"].get(username, {}).get("tasks", [])
+        with self._mutex:
+            data = self._load_tasks()
+            return [_copy_task(t) for t in data["users"].get(username, {}).get("tasks", [])]
 
-    def save_task(self, username, task):
-        """Save a new or updated task for a user, ensuring required fields."""
-        # Ensure task has required fields with defaults if missing
-        task = {
-            "id": task.get("id"),
-            "title": task.get("title", "Untitled"),
-            "type": task.get("type", "one-time"),
-            "time": task.get("time", "23:59"),
-            "completions": task.get("completions", []),
-            **{k: v for k, v in task.items() if k in ["date", "days"]}  # Preserve optional fields
-        }
-        if not task["id"] or not task["title"]:
-            raise ValueError("Task must have an 'id' and 'title'.")
-        
-        data = self.load_data(TASKS_FILE)
+    def _put_task(self, data, username, task):
         if username not in data["users"]:
             data["users"][username] = {"chat_id": None, "tasks": []}
         tasks = data["users"][username]["tasks"]
-        task_ids = [t["id"] for t in tasks]
-        if task["id"] in task_ids:
-            for i, t in enumerate(tasks):
-                if t["id"] == task["id"]:
-                    tasks[i] = task
-                    break
+        indexed = self._task_index.get(task["id"])
+        if indexed and indexed[0] == username:
+            tasks[tasks.index(indexed[1])] = task
         else:
+            if indexed:
+                # Task moved between users; drop it from the previous owner
+                data["users"][indexed[0]]["tasks"].remove(indexed[1])
             tasks.append(task)
-        data["users"][username]["tasks"] = tasks
-        self.save_data(TASKS_FILE, data)
+        self._task_index[task["id"]] = (username, task)
+
+    def save_task(self, username, task):
+        """Save a new or updated task for a user, ensuring required fields."""
+        task = task_record(task)
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                self._put_task(self._load_tasks(), username, task)
+            self._commit("save_task", username, task)
+
+    def save_tasks(self, items):
+        """Save several (username, task) pairs as one change: one lock, one write (or journal line)."""
+        records = [(username, task_record(task)) for username, task in items]
+        if not records:
+            return
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                data = self._load_tasks()
+                for username, task in records:
+                    self._put_task(data, username, task)
+            self._commit("save_tasks", records)
 
     def delete_task(self, username, task_id):
         """Remove a task by ID for a user and log it in history."""
-        data = self.load_data(TASKS_FILE)
-        if username in data["users"]:
-            tasks = data["users"][username]["tasks"]
-            task_to_delete = next((t for t in tasks if t["id"] == task_id), None)
-            if task_to_delete:
-                tasks.remove(task_to_delete)
-                data["users"][username]["tasks"] = tasks
-                self.save_data(TASKS_FILE, data)
-                self.log_history(task_to_delete, "deleted", username)
-            else:
-                raise ValueError("Task not found.")
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                data = self._load_tasks()
+                if username not in data["users"]:
+                    return
+                indexed = self._task_index.get(task_id)
+                task_to_delete = indexed[1] if indexed and indexed[0] == username else None
+                if not task_to_delete:
+                    raise ValueError("Task not found.")
+                data["users"][username]["tasks"].remove(task_to_delete)
+                del self._task_index[task_id]
+            self._commit("delete_task", username, task_id)
+        if not self._replaying:
+            self.log_history(task_to_delete, "deleted", username)
+
+    def delete_tasks(self, items):
+        """Remove several (username, task_id) tasks as one change and log them in history.
+
+        Tasks that don't exist (or belong to someone else) are skipped; returns the removed (username, task) pairs.
+        """
+        removed = []
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                data = self._load_tasks()
+                doomed = {}
+                for username, task_id in items:
+                    indexed = self._task_index.get(task_id)
+                    if indexed and indexed[0] == username and task_id not in doomed.setdefault(username, set()):
+                        doomed[username].add(task_id)
+                        removed.append((username, indexed[1]))
+                        del self._task_index[task_id]
+                # One pass per user's list rather than a list.remove per task
+                for username, task_ids in doomed.items():
+                    user = data["users"][username]
+                    user["tasks"] = [task for task in user["tasks"] if task["id"] not in task_ids]
+            if removed:
+                self._commit("delete_tasks", [(username, task["id"]) for username, task in removed])
+        if removed and not self._replaying:
+            self.log_history_many([(task, "deleted", username) for username, task in removed])
+        return [(username, _copy_task(task)) for username, task in removed]
+
+    def find_task(self, task_id):
+        """Return (owner, task) for a task ID across all users, or (None, None)."""
+        with self._mutex:
+            self._load_tasks()
+            indexed = self._task_index.get(task_id)
+            if indexed is None:
+                return None, None
+            return indexed[0], _copy_task(indexed[1])
 
     def get_all_users(self):
         """Return a list of all usernames."""
-        data = self.load_data(TASKS_FILE)
-        return list(data["users"].keys())
+        with self._mutex:
+            data = self._load_tasks()
+            return list(data["users"].keys())
 
     def delete_user(self, username):
         """Remove a user and their tasks."""
-        data = self.load_data(TASKS_FILE)
-        if username in data["users"]:
-            del data["users"][username]
-            self.save_data(TASKS_FILE, data)
-
-    def log_history(self, task, status, username):
-        """Log task activity (completed, incomplete, deleted) to history."""
-        history_data = self.load_data(HISTORY_FILE)
-        history_entry = {
-            "task_id": task["id"],
-            "title": task["title"],
-            "status": status,
-            "timestamp": datetime.now().isoformat(),
-            "user": username
-        }
-        history_data["history"].append(history_entry)
-        self.prune_history(history_data)
-        self.save_data(HISTORY_FILE, history_data)
-
-    def prune_history(self, history_data):
-        """Remove history entries older than 14 days."""
-        cutoff = datetime.now() - timedelta(days=HISTORY_RETENTION_DAYS)
-        history_data["history"] = [
-            entry for entry in history_data["history"]
-            if datetime.fromisoformat(entry["timestamp"]) >= cutoff
-        ]
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                data = self._load_tasks()
+                if username not in data["users"]:
+                    return
+                for task in data["users"][username].get("tasks", []):
+                    self._task_index.pop(task["id"], None)
+                del data["users"][username]
+            self._commit("delete_user", username)
+
+    def get_user_settings(self, username):
+        """Return a user's {"timezone", "reminder_time"}, defaulting to config's TIMEZONE and REMINDER_TIME."""
+        with self._mutex:
+            user = self._load_tasks()["users"].get(username, {})
+            return {"timezone": user.get("timezone") or TIMEZONE, "reminder_time": user.get("reminder_time") or REMINDER_TIME}
+
+    def get_all_user_settings(self):
+        """Return {username: {"chat_id", "timezone", "reminder_time"}} for every user."""
+        with self._mutex:
+            return {
+                username: {"chat_id": user.get("chat_id"), "timezone": user.get("timezone") or TIMEZONE,
+                           "reminder_time": user.get("reminder_time") or REMINDER_TIME}
+                for username, user in self._load_tasks()["users"].items()
+            }
+
+    def set_user_settings(self, username, timezone=None, reminder_time=None):
+        """Set a user's timezone and/or reminder time; None leaves a setting unchanged."""
+        with self._locked(self.tasks_file):
+            with self._mutex:
+                data = self._load_tasks()
+                user = data["users"].setdefault(username, {"chat_id": None, "tasks": []})
+                if timezone:
+                    user["timezone"] = timezone
+                if reminder_time:
+                    user["reminder_time"] = reminder_time
+            self._commit("set_user_settings", username, timezone, reminder_time)
+
+    def log_history(self, task, status, username, owner=None):
+        """Log task activity (completed, incomplete, deleted) by username to history; owner defaults to username."""
+        self.log_history_many([(task, status, username, owner)])
+
+    def log_history_many(self, events):
+        """Log several (task, status, username[, owner]) events to history in a single write."""
+        metrics.incr("storage.history_events", len(events))
+        timestamp = datetime.now().isoformat()
+        self.history.append_many([history_entry(timestamp, *event) for event in events])
+
+    def prune_history(self):
+        """Drop history segments older than 14 days."""
+        self.history.prune(force=True)
 
     def get_history(self):
         """Retrieve all history entries."""
-        return self.load_data(HISTORY_FILE)["history"]
+        return self.history.read()
+
+    def get_history_page(self, page=0, page_size=10, before=None, user=None, task_id=None, status=None, owner=None):
+        """Return (entries newest first, total matching, next_cursor) for one page of history."""
+        return self.history.page(page, page_size, before=before, user=user, task_id=task_id, status=status, owner=owner)
+
+    def get_history_cursor(self):
+        """Return a cursor just past the newest history entry (see HistoryLog.cursor)."""
+        return self.history.cursor()
 
     def get_user_chat_id(self, username):
         """Get the chat ID for a user."""
-        data = self.load_data(TASKS_FILE)
-        return data["users"].get(username, {}).get("chat_id")
\ No newline at end of file
+        with self._mutex:
+            data = self._load_tasks()
+            return data["users"].get(username, {}).get("chat_id")
+
+def create_storage(data_dir=None):
+    """Build the storage backend selected by STORAGE_BACKEND in config.py for a data directory."""
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.path.join(data_dir, SQLITE_FILE) if data_dir else SQLITE_FILE, data_dir)
+    if STORAGE_BACKEND != "json":
+        raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'. Use 'json' or 'sqlite'.")
+    return Storage(data_dir)
@@ -0,0 +1,60 @@
+# task_files.py
+# CSV and JSON-lines task files for bulk import and export.
+# Both formats carry the same fields, one task per row/line, including completion days so an
+# export imports back unchanged. Rows are read and written one at a time from/to open text
+# streams, so a large file is never parsed or built as a whole string.
+
+import csv
+import json
+
+FIELDS = ("owner", "title", "type", "time", "date", "days", "completions")
+# Fields holding lists: comma-separated in CSV, JSON arrays in JSON lines
+LIST_FIELDS = ("days", "completions")
+FORMATS = ("csv", "jsonl")
+
+def file_format(filename):
+    """Return the task file format for a filename ("csv" or "jsonl"), or raise ValueError."""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        return "csv"
+    if extension in ("jsonl", "ndjson", "json"):
+        return "jsonl"
+    raise ValueError("Send a .csv or .jsonl file.")
+
+def read_rows(stream, fmt):
+    """Yield a dict per task from a CSV (with a header row) or JSON-lines text stream."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {field: (row.get(field) or "").strip() for field in FIELDS}
+    elif fmt == "jsonl":
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f"Line {number} is not valid JSON.")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {number} must be a JSON object.")
+            yield row
+    else:
+        raise ValueError(f"Unknown task file format '{fmt}'. Use {' or '.join(FORMATS)}.")
+
+def write_rows(stream, fmt, rows):
+    """Write (owner, task) pairs to a text stream as CSV (with a header row) or JSON lines; returns the count."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown task file format '{fmt}'. Use {' or '.join(FORMATS)}.")
+    count = 0
+    writer = csv.writer(stream) if fmt == "csv" else None
+    if writer:
+        writer.writerow(FIELDS)
+    for owner, task in rows:
+        row = {"owner": owner, "title": task["title"], "type": task["type"], "time": task.get("time", "23:59"),
+               "date": task.get("date"), "days": task.get("days"), "completions": list(task.get("completions") or [])}
+        if writer:
+            writer.writerow([",".join(row[field]) if field in LIST_FIELDS and row[field] else row[field] or ""
+                             for field in FIELDS])
+        else:
+            stream.write(json.dumps({field: value for field, value in row.items() if value}) + "\n")
+        count += 1
+    return count
@@ -1,35 +1,84 @@
 from datetime import datetime, timedelta
-from storage import Storage
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import functools
+from storage import create_storage
 import uuid
-from config import TASK_TYPES
+import random
+import threading
+from config import TASK_TYPES, LOG_TRACE_SAMPLE_RATE, TIMEZONE
+from completions import task_completions
+from analytics import Rollups, period_start
+from task_files import read_rows, write_rows
+from metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Row errors listed when a bulk add is rejected; the rest are only counted
+MAX_REPORTED_ERRORS = 5
+
+@functools.lru_cache(maxsize=None)
+def zone(name):
+    """Return the ZoneInfo for an IANA name, falling back to config's TIMEZONE if it's unknown."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone '%s'; using %s.", name, TIMEZONE)
+        return ZoneInfo(TIMEZONE)
+
 class TaskManager:
-    def __init__(self):
-        self.storage = Storage()
+    def __init__(self, storage=None):
+        # Share the bot's storage when given one; write-behind needs a single in-memory copy
+        self.storage = storage or create_storage()
         self.valid_days = {"Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"}
+        # Daily agenda: username -> (day, due_tasks, actionable_tasks), built once per day per user
+        # and dropped for a user whenever one of their tasks changes through this TaskManager.
+        self._agenda = {}
+        self._agenda_version = None
+        # Agenda reads and invalidations may run on different executor threads
+        self._agenda_lock = threading.Lock()
+        # Grid layout version (see layout_version) and the storage version it was last checked against
+        self._layout_version = 0
+        self._layout_seen = None
+        self._layout_lock = threading.Lock()
+        # Called as listener(username, task_id, task) after a task changes (task is None once deleted)
+        self._listeners = []
+        # Long-term history rollups for /report, loaded on first use (see rollups)
+        self._rollups = None
+        self._rollups_lock = threading.Lock()
+
+    @property
+    def rollups(self):
+        """Long-term history rollups for /report, next to this storage's other files."""
+        # Opening a household (or the bot) shouldn't read analytics.bin until a report or roll-up needs it
+        if self._rollups is None:
+            with self._rollups_lock:
+                if self._rollups is None:
+                    self._rollups = Rollups(self.storage.analytics_file)
+        return self._rollups
 
     def _needs_action(self, task, today, weekday):
         if "type" not in task:
-            logger.warning(f"Task {task.get('id', 'unknown')} is missing 'type' key.")
+            logger.warning("Task %s is missing 'type' key.", task.get("id", "unknown"))
             return False
         task_type = task["type"]
         if task_type == "one-time":
-            needs_action = len(task.get("completions", [])) == 0
+            needs_action = not task.get("completions")
         elif task_type == "daily":
-            needs_action = today not in task.get("completions", [])
+            needs_action = today not in task_completions(task)
         elif task_type == "recurring":
             if "days" not in task:
-                logger.warning(f"Recurring task {task['id']} is missing 'days'.")
+                logger.warning("Recurring task %s is missing 'days'.", task["id"])
                 needs_action = False
             else:
-                needs_action = weekday in task["days"] and today not in task.get("completions", [])
+                needs_action = weekday in task["days"] and today not in task_completions(task)
         else:
-            logger.warning(f"Unknown task type '{task_type}' for task {task['id']}.")
+            logger.warning("Unknown task type '%s' for task %s.", task_type, task["id"])
             needs_action = False
-        logger.info(f"Task {task['id']} ({task['title']}): needs_action={needs_action}, type={task_type}, completions={task.get('completions', [])}")
+        # Per-task decisions run for every task on every filter pass; trace only a sample of them
+        if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_TRACE_SAMPLE_RATE:
+            logger.debug("Task %s (%s): needs_action=%s, type=%s, completions=%s",
+                         task["id"], task["title"], needs_action, task_type, task.get("completions", []))
         return needs_action
 
     def _is_due_today(self, task, today, weekday):
@@ -38,11 +87,11 @@ class TaskManager:
         if task_type == "one-time":
             due_date = task.get("date")
             if due_date is None:
-                logger.warning(f"One-time task {task.get('id', 'unknown')} is missing 'date'.")
+                logger.warning("One-time task %s is missing 'date'.", task.get("id", "unknown"))
                 return False
             if due_date == today:
                 return True
-            elif due_date < today and not any(c for c in task.get("completions", []) if c <= today):
+            elif due_date < today and not task_completions(task).completed_on_or_before(today):
                 return True
             return False
         elif task_type == "daily":
@@ -53,25 +102,164 @@ class TaskManager:
             return weekday in task["days"]
         return False
 
+    def _today(self, username=None):
+        """Return (today's ISO date, weekday abbreviation) in the user's timezone (config's TIMEZONE if None)."""
+        now = self.local_now(username)
+        return now.date().isoformat(), now.strftime("%a")
+
+    def local_now(self, username=None):
+        """Return the current time in the user's timezone (config's TIMEZONE if None)."""
+        timezone = self.storage.get_user_settings(username)["timezone"] if username else TIMEZONE
+        return datetime.now(zone(timezone))
+
+    def _user_agenda(self, username):
+        """Return (day, due_tasks, actionable_tasks) for a user, building it if missing or stale."""
+        with self._agenda_lock:
+            version = self.storage.version
+            if version != self._agenda_version:
+                # Storage changed behind our back (another Storage instance or process): start over
+                self._agenda.clear()
+                self._agenda_version = version
+            today, weekday = self._today(username)
+            agenda = self._agenda.get(username)
+            if agenda is None or agenda[0] != today:
+                tasks = self.storage.get_user_tasks(username)
+                due = [task for task in tasks if self._is_due_today(task, today, weekday)]
+                actionable = [task for task in tasks if self._needs_action(task, today, weekday)]
+                agenda = (today, due, actionable)
+                self._agenda[username] = agenda
+            return agenda
+
+    def _agenda_changed(self, username, version_before):
+        """Drop one user's agenda after a change made through this TaskManager."""
+        self._agendas_changed([username], version_before)
+
+    def _agendas_changed(self, usernames, version_before):
+        """Drop several users' agendas after one storage change made through this TaskManager."""
+        with self._agenda_lock:
+            if version_before != self._agenda_version:
+                self._agenda.clear()
+            else:
+                for username in usernames:
+                    self._agenda.pop(username, None)
+            self._agenda_version = self.storage.version
+
+    def add_listener(self, listener):
+        """Register listener(username, task_id, task) to run after every task change made here."""
+        self._listeners.append(listener)
+
+    def _task_changed(self, username, task_id, task):
+        for listener in self._listeners:
+            try:
+                listener(username, task_id, task)
+            except Exception:
+                # The change is already saved; a failing listener must not turn it into an error
+                logger.exception("Task change listener failed for task %s", task_id)
+
+    def _alert_time(self, task, now):
+        """Return the POSIX time of a task's due-time alert today (now is owner-local), or None."""
+        today, weekday = now.date().isoformat(), now.strftime("%a")
+        if not (self._is_due_today(task, today, weekday) and self._needs_action(task, today, weekday)):
+            return None
+        try:
+            hour, minute = map(int, task.get("time", "23:59").split(":"))
+        except ValueError:
+            return None
+        due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return due.timestamp() if due > now else None
+
+    def due_alert_at(self, username, task):
+        """Return when to alert the owner about a task today (POSIX time), or None if no alert is due."""
+        if task is None:
+            return None
+        return self._alert_time(task, self.local_now(username))
+
+    @metrics.timed("task_mgr.get_due_alerts")
+    def get_due_alerts(self, username):
+        """Return [(task_id, title, due_at)] for the user's tasks still due later today, in their timezone."""
+        now = self.local_now(username)
+        alerts = []
+        for task in self.storage.get_user_tasks(username):
+            due_at = self._alert_time(task, now)
+            if due_at is not None:
+                alerts.append((task["id"], task["title"], due_at))
+        return alerts
+
+    @metrics.timed("task_mgr.get_agenda")
+    def get_agenda(self):
+        """Return {username: tasks due today} for every user."""
+        return {username: self.get_tasks_due_today(username) for username in self.storage.get_all_users()}
+
+    def data_version(self):
+        """Return the storage data version; equal versions mean equal task data."""
+        return self.storage.version
+
+    def layout_version(self):
+        """Return a version that changes with data_version, except for completion toggles that leave
+        every task listed in the grid; equal versions mean the grid has the same rows."""
+        with self._layout_lock:
+            version = self.storage.version
+            if version != self._layout_seen:
+                self._layout_version += 1
+                self._layout_seen = version
+            return self._layout_version
+
+    def _completion_saved(self, task, today, version_before):
+        """Keep the layout version across a save that only changed a task's completion for today.
+
+        Completing an overdue one-time task takes it off the due list, so that still counts as a change.
+        """
+        overdue = task.get("type") == "one-time" and task.get("date", today) < today
+        with self._layout_lock:
+            if not overdue and self._layout_seen == version_before:
+                self._layout_seen = self.storage.version
+
+    @metrics.timed("task_mgr.get_grid_tasks")
+    def get_grid_tasks(self, task_ids):
+        """Return {task_id: task} for the given IDs, each tagged like get_due_tasks_view's tasks.
+
+        Tasks deleted since the IDs were taken are left out.
+        """
+        todays = {}
+        tasks = {}
+        for task_id in task_ids:
+            owner, task = self.storage.find_task(task_id)
+            if task is None:
+                continue
+            if owner not in todays:
+                todays[owner] = self._today(owner)[0]
+            task.update(owner=owner, today=todays[owner])
+            tasks[task_id] = task
+        return tasks
+
+    @metrics.timed("task_mgr.get_due_tasks_view")
+    def get_due_tasks_view(self, username=None):
+        """Return tasks due today, each tagged with its "owner", for one user or (username=None) everyone."""
+        usernames = [username] if username else self.storage.get_all_users()
+        tasks = []
+        for user in usernames:
+            # "today" is the owner's local date, which the grid uses for the done/overdue marks
+            day, due, _ = self._user_agenda(user)
+            tasks.extend(dict(task, owner=user, today=day) for task in due)
+        return tasks
+
+    @metrics.timed("task_mgr.get_user_tasks")
     def get_user_tasks(self, username, mine=True):
-        tasks = self.storage.get_user_tasks(username)
         if not mine:
-            return tasks
-        today = datetime.now().date().isoformat()
-        weekday = datetime.now().strftime("%a")
-        filtered_tasks = [task for task in tasks if self._needs_action(task, today, weekday)]
-        logger.info(f"User {username} tasks (mine=True): {len(filtered_tasks)} tasks")
+            return self.storage.get_user_tasks(username)
+        filtered_tasks = [dict(task) for task in self._user_agenda(username)[2]]
+        logger.info("User %s tasks (mine=True): %d tasks", username, len(filtered_tasks))
         return filtered_tasks
 
+    @metrics.timed("task_mgr.get_tasks_due_today")
     def get_tasks_due_today(self, username):
         """Get all tasks due today for a user, including completed ones."""
-        tasks = self.storage.get_user_tasks(username)
-        today = datetime.now().date().isoformat()
-        weekday = datetime.now().strftime("%a")
-        filtered_tasks = [task for task in tasks if self._is_due_today(task, today, weekday)]
-        logger.info(f"Tasks due today for {username}: {len(filtered_tasks)} tasks, today={today}, weekday={weekday}")
+        today, due, _ = self._user_agenda(username)
+        filtered_tasks = [dict(task) for task in due]
+        logger.info("Tasks due today for %s: %d tasks, today=%s", username, len(filtered_tasks), today)
         return filtered_tasks
 
+    @metrics.timed("task_mgr.add_task")
     def add_task(self, username, title, task_type, time="23:59", date=None, days=None):
         task_id = str(uuid.uuid4())
         task = {
@@ -87,69 +275,252 @@ class TaskManager:
             task["date"] = date
         elif task_type == "recurring":
             task["days"] = days
+        version_before = self.storage.version
         self.storage.save_task(username, task)
+        self._agenda_changed(username, version_before)
+        self._task_changed(username, task_id, task)
         return task_id
 
+    @metrics.timed("task_mgr.complete_task")
     def complete_task(self, username, task_id):
-        tasks = self.storage.get_user_tasks(username)
-        for task in tasks:
-            if task["id"] == task_id:
-                today = datetime.now().date().isoformat()
-                if today not in task.get("completions", []):
-                    task["completions"] = task.get("completions", []) + [today]
-                    self.storage.save_task(username, task)
-                    self.storage.log_history(task, "completed", username)
-                break
-
-    def toggle_task(self, username, task_id):
-        tasks = self.storage.get_user_tasks(username)
-        for task in tasks:
-            if task["id"] == task_id:
-                today = datetime.now().date().isoformat()
-                if today in task.get("completions", []):
-                    task["completions"].remove(today)
-                    status = "incomplete"
-                else:
-                    task["completions"].append(today)
-                    status = "completed"
+        task = self.get_task_by_id(username, task_id)
+        if task:
+            today, _ = self._today(username)
+            completions = task_completions(task)
+            if today not in completions:
+                completions.add(today)
+                task["completions"] = completions
+                version_before = self.storage.version
                 self.storage.save_task(username, task)
-                self.storage.log_history(task, status, username)
-                return status
-        raise ValueError(f"Task {task_id} not found for user {username}")
+                self._agenda_changed(username, version_before)
+                self._completion_saved(task, today, version_before)
+                self.storage.log_history(task, "completed", username)
+                self._task_changed(username, task_id, task)
+
+    def _new_task(self, row):
+        """Validate one bulk row ({"owner", "title", "type", "time", "date", "days", "completions"}) into (owner, task).
 
+        Rows may describe existing plans (an export), so past dates are accepted; only their format is checked.
+        """
+        # JSON-lines rows may carry non-string values
+        owner = str(row.get("owner") or "").strip().lstrip("@")
+        title = str(row.get("title") or "").strip()
+        task_type = str(row.get("type") or "daily").strip()
+        if not owner:
+            raise ValueError("Missing owner.")
+        if not title:
+            raise ValueError("Missing title.")
+        if task_type not in TASK_TYPES:
+            raise ValueError(f"Unknown type '{task_type}'. Use {', '.join(TASK_TYPES)}.")
+        task = {"id": str(uuid.uuid4()), "title": title, "type": task_type,
+                "time": self.validate_time(str(row.get("time") or "23:59")), "completions": []}
+        if task_type == "one-time":
+            if not row.get("date"):
+                raise ValueError("One-time tasks must have a date.")
+            task["date"] = self.validate_date(str(row["date"]), owner, allow_past=True)
+        elif task_type == "recurring":
+            days = row.get("days") or []
+            if isinstance(days, str):
+                days = days.split(",")
+            days = [str(day).strip().capitalize()[:3] for day in days if str(day).strip()]
+            if not days:
+                raise ValueError("Recurring tasks must have days.")
+            task["days"] = self.validate_days(days)
+        completions = row.get("completions") or []
+        if isinstance(completions, str):
+            completions = completions.split(",")
+        task["completions"] = [self.validate_date(str(day).strip(), allow_past=True)
+                               for day in completions if str(day).strip()]
+        return owner, task
+
+    @metrics.timed("task_mgr.add_tasks_bulk")
+    def add_tasks_bulk(self, rows):
+        """Validate rows of {"owner", "title", "type", "time", "date", "days", "completions"} and add them in one storage write.
+
+        Returns the new task IDs. If any row is invalid nothing is added and the ValueError lists the bad rows.
+        """
+        items, errors = [], []
+        for number, row in enumerate(rows, 1):
+            try:
+                items.append(self._new_task(row))
+            except ValueError as e:
+                errors.append(f"Row {number}: {e}")
+        if errors:
+            more = f" (and {len(errors) - MAX_REPORTED_ERRORS} more)" if len(errors) > MAX_REPORTED_ERRORS else ""
+            raise ValueError("\n".join(errors[:MAX_REPORTED_ERRORS]) + more)
+        version_before = self.storage.version
+        self.storage.save_tasks(items)
+        self._agendas_changed({owner for owner, _ in items}, version_before)
+        for owner, task in items:
+            self._task_changed(owner, task["id"], task)
+        return [task["id"] for _, task in items]
+
+    @metrics.timed("task_mgr.complete_tasks_bulk")
+    def complete_tasks_bulk(self, items):
+        """Mark several (username, task_id) tasks done for their owner's today in one storage write.
+
+        Unknown and already-completed tasks are skipped; returns how many were completed.
+        """
+        todays = {}
+        changed = []
+        seen = set()
+        for username, task_id in items:
+            if task_id in seen:
+                continue
+            task = self.get_task_by_id(username, task_id)
+            if task is None:
+                continue
+            seen.add(task_id)
+            if username not in todays:
+                todays[username] = self._today(username)[0]
+            completions = task_completions(task)
+            if todays[username] not in completions:
+                completions.add(todays[username])
+                task["completions"] = completions
+                changed.append((username, task))
+        if changed:
+            version_before = self.storage.version
+            self.storage.save_tasks(changed)
+            self._agendas_changed({username for username, _ in changed}, version_before)
+            self.storage.log_history_many([(task, "completed", username) for username, task in changed])
+            for username, task in changed:
+                self._task_changed(username, task["id"], task)
+        return len(changed)
+
+    @metrics.timed("task_mgr.delete_tasks_bulk")
+    def delete_tasks_bulk(self, items):
+        """Delete several (username, task_id) tasks in one storage write; returns how many were deleted."""
+        version_before = self.storage.version
+        removed = self.storage.delete_tasks(items)
+        if removed:
+            self._agendas_changed({username for username, _ in removed}, version_before)
+            for username, task in removed:
+                self._task_changed(username, task["id"], None)
+        return len(removed)
+
+    @metrics.timed("task_mgr.import_tasks")
+    def import_tasks(self, stream, fmt, default_owner=None):
+        """Add every task in a CSV or JSON-lines text stream (see task_files.py) as one batch; returns the IDs.
+
+        Rows without an owner belong to default_owner.
+        """
+        rows = (dict(row, owner=row.get("owner") or default_owner) for row in read_rows(stream, fmt))
+        return self.add_tasks_bulk(rows)
+
+    @metrics.timed("task_mgr.export_tasks")
+    def export_tasks(self, stream, fmt, usernames=None):
+        """Write every task (or the given users' tasks) to a text stream as CSV or JSON lines; returns the count."""
+        usernames = usernames if usernames is not None else self.storage.get_all_users()
+        return write_rows(stream, fmt, ((username, task) for username in usernames
+                                        for task in self.storage.get_user_tasks(username)))
+
+    @metrics.timed("task_mgr.toggle_task")
+    def toggle_task(self, username, task_id, actor=None):
+        """Toggle today's completion of a task owned by username; history records actor (default: owner) and owner."""
+        task = self.get_task_by_id(username, task_id)
+        if task is None:
+            raise ValueError(f"Task {task_id} not found for user {username}")
+        today, _ = self._today(username)
+        completions = task_completions(task)
+        if today in completions:
+            completions.remove(today)
+            status = "incomplete"
+        else:
+            completions.add(today)
+            status = "completed"
+        task["completions"] = completions
+        version_before = self.storage.version
+        self.storage.save_task(username, task)
+        self._agenda_changed(username, version_before)
+        self._completion_saved(task, today, version_before)
+        self.storage.log_history(task, status, actor or username, owner=username)
+        self._task_changed(username, task_id, task)
+        return status
+
+    @metrics.timed("task_mgr.edit_task")
     def edit_task(self, username, task_id, title=None, time=None, date=None, days=None):
-        tasks = self.storage.get_user_tasks(username)
-        for task in tasks:
-            if task["id"] == task_id:
-                if title:
-                    task["title"] = title
-                if time:
-                    task["time"] = time
-                if date and task["type"] == "one-time":
-                    task["date"] = date
-                if days and task["type"] == "recurring":
-                    task["days"] = days
-                self.storage.save_task(username, task)
-                break
+        task = self.get_task_by_id(username, task_id)
+        if task:
+            if title:
+                task["title"] = title
+            if time:
+                task["time"] = time
+            if date and task["type"] == "one-time":
+                task["date"] = date
+            if days and task["type"] == "recurring":
+                task["days"] = days
+            version_before = self.storage.version
+            self.storage.save_task(username, task)
+            self._agenda_changed(username, version_before)
+            self._task_changed(username, task_id, task)
 
+    @metrics.timed("task_mgr.delete_task")
     def delete_task(self, username, task_id):
+        version_before = self.storage.version
         self.storage.delete_task(username, task_id)
+        self._agenda_changed(username, version_before)
+        self._task_changed(username, task_id, None)
+
+    @metrics.timed("task_mgr.log_incomplete_tasks")
+    def log_incomplete_tasks(self, usernames=None):
+        """Log every task due today (each user's local day) and not yet done as incomplete."""
+        events = []
+        for username in usernames if usernames is not None else self.storage.get_all_users():
+            today, due, _ = self._user_agenda(username)
+            for task in due:
+                if today not in task_completions(task):
+                    events.append((task, "incomplete", username))
+        if events:
+            self.storage.log_history_many(events)
+        # Daily, so every event is rolled up well before history retention drops it
+        self.update_rollups()
 
-    def log_incomplete_tasks(self):
-        today = datetime.now().date().isoformat()
-        weekday = datetime.now().strftime("%a")
-        for username in self.storage.get_all_users():
-            tasks = self.get_tasks_due_today(username)
-            for task in tasks:
-                if today not in task.get("completions", []):
-                    self.storage.log_history(task, "incomplete", username)
+    def update_rollups(self):
+        """Roll history events that aren't counted yet into the long-term rollups."""
+        return self.rollups.ingest(self.storage.get_history())
 
+    @metrics.timed("task_mgr.get_report")
+    def get_report(self, period, username=None):
+        """Return rollup summaries for the current "week"/"month" so far and the whole previous one.
+
+        Periods follow the user's local dates; each summary also carries its "start" and "end" dates.
+        """
+        self.update_rollups()
+        today = self.local_now(username).date()
+        start = period_start(period, today)
+        previous_start = period_start(period, start - timedelta(days=1))
+        report = {}
+        for name, first, last in (("current", start, today), ("previous", previous_start, start - timedelta(days=1))):
+            report[name] = dict(self.rollups.summary(first, last), start=first, end=last)
+        return report
+
+    @metrics.timed("task_mgr.get_history")
     def get_history(self):
         return self.storage.get_history()
 
+    @metrics.timed("task_mgr.get_history_page")
+    def get_history_page(self, page=0, page_size=10, before=None, user=None, task_id=None, status=None, owner=None):
+        """Return (entries newest first, total matching, next_cursor); filters are optional.
+
+        `user` matches who acted, `owner` whose task it was; pages count back from `before` if given.
+        """
+        return self.storage.get_history_page(page, page_size, before=before, user=user, task_id=task_id,
+                                             status=status, owner=owner)
+
+    @metrics.timed("task_mgr.get_history_cursor")
+    def get_history_cursor(self):
+        """Return a history cursor just past the newest entry, so paging from it ignores later events."""
+        return self.storage.get_history_cursor()
+
+    @metrics.timed("task_mgr.find_task")
+    def find_task(self, task_id):
+        """Return (owner, task) for a task ID across all users, or (None, None)."""
+        return self.storage.find_task(task_id)
+
+    @metrics.timed("task_mgr.get_task_by_id")
     def get_task_by_id(self, username, task_id):
-        tasks = self.storage.get_user_tasks(username)
-        return next((task for task in tasks if task["id"] == task_id), None)
+        owner, task = self.storage.find_task(task_id)
+        return task if owner == username else None
 
     def validate_time(self, time_str):
         try:
@@ -158,19 +529,24 @@ class TaskManager:
         except ValueError:
             raise ValueError("Time must be in HH:MM format (e.g., 14:30).")
 
-    def validate_date(self, date_str):
+    def validate_date(self, date_str, username=None, allow_past=False):
         try:
             date = datetime.strptime(date_str, "%Y-%m-%d").date()
-            if date < datetime.now().date():
-                raise ValueError("Date cannot be in the past.")
-            return date_str
-        except ValueError as e:
-            if str(e) == "Date cannot be in the past.":
-                raise
+        except ValueError:
             raise ValueError("Date must be in YYYY-MM-DD format (e.g., 2025-12-31).")
+        if not allow_past and date < self.local_now(username).date():
+            raise ValueError("Date cannot be in the past.")
+        return date_str
 
     def validate_days(self, days):
         invalid_days = set(days) - self.valid_days
         if invalid_days:
             raise ValueError(f"Invalid days: {', '.join(invalid_days)}. Use Mon, Tue, Wed, Thu, Fri, Sat, Sun.")
-        return days
\ No newline at end of file
+        return days
+
+    def validate_timezone(self, name):
+        try:
+            ZoneInfo(name)
+            return name
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError("Unknown timezone. Use an IANA name such as Europe/Berlin or America/New_York.")
@@ -0,0 +1,114 @@
+# test_analytics.py
+# Rollups: watermark ingestion, per-day final state, owner attribution, persistence and streaks.
+
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from analytics import Rollups, period_start
+from storage import Storage
+from task_manager import TaskManager
+
+def event(day, second, status, task_id="t1", user="alice", owner=None, title="Dishes"):
+    entry = {"task_id": task_id, "title": title, "status": status, "user": user,
+             "timestamp": f"{day.isoformat()}T12:00:{second:02d}"}
+    if owner:
+        entry["owner"] = owner
+    return entry
+
+DAY = date(2026, 9, 14)
+
+class RollupsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "analytics.bin")
+
+    def test_watermark_counts_each_entry_once(self):
+        rollups = Rollups(self.path)
+        # Three events share a timestamp; the first ingest only sees two of them
+        same = [event(DAY, 0, "completed", task_id=f"t{n}") for n in range(3)]
+        self.assertEqual(rollups.ingest(same[:2]), 2)
+        self.assertEqual(rollups.ingest(same), 1)
+        self.assertEqual(rollups.ingest(same), 0)
+        later = same + [event(DAY, 5, "deleted", task_id="t9")]
+        self.assertEqual(rollups.ingest(later), 1)
+        self.assertEqual(rollups.summary(DAY, DAY)["users"]["alice"]["completed"], 3)
+
+    def test_final_state_of_the_day_wins(self):
+        rollups = Rollups(self.path)
+        rollups.ingest([
+            event(DAY, 0, "incomplete"),               # morning reminder: still open
+            event(DAY, 10, "completed"),               # done later that day
+            event(DAY, 1, "incomplete", task_id="t2"),  # never done
+            event(DAY, 20, "completed", task_id="t3"),
+            event(DAY, 21, "incomplete", task_id="t3"),  # toggled back off
+            event(DAY, 22, "completed", task_id="t3"),   # and on again
+        ])
+        alice = rollups.summary(DAY, DAY)["users"]["alice"]
+        self.assertEqual((alice["completed"], alice["incomplete"]), (2, 1))
+        self.assertAlmostEqual(alice["rate"], 2 / 3)
+
+    def test_undone_day_leaves_the_streak(self):
+        rollups = Rollups(self.path)
+        rollups.ingest([event(DAY - timedelta(days=1), 0, "completed"),
+                        event(DAY, 0, "completed"), event(DAY, 1, "incomplete")])
+        alice = rollups.summary(DAY, DAY)["users"]["alice"]
+        self.assertEqual((alice["streak"], alice["best_streak"]), (1, 0))
+
+    def test_rows_belong_to_the_owner(self):
+        rollups = Rollups(self.path)
+        rollups.ingest([event(DAY, 0, "incomplete", user="alice"),
+                        event(DAY, 5, "completed", user="bob", owner="alice")])
+        users = rollups.summary(DAY, DAY)["users"]
+        self.assertEqual(list(users), ["alice"])
+        self.assertEqual((users["alice"]["completed"], users["alice"]["incomplete"], users["alice"]["streak"]), (1, 0, 1))
+
+    def test_reload_and_range(self):
+        rollups = Rollups(self.path)
+        rollups.ingest([event(DAY + timedelta(days=n), 0, "completed", task_id=f"t{n % 3}") for n in range(30)])
+        reloaded = Rollups(self.path)
+        self.assertEqual(len(reloaded), 30)
+        start, end = DAY + timedelta(days=7), DAY + timedelta(days=13)
+        self.assertEqual(reloaded.summary(start, end), rollups.summary(start, end))
+        self.assertEqual(reloaded.summary(start, end)["users"]["alice"]["completed"], 7)
+        self.assertEqual(reloaded.ingest([event(DAY + timedelta(days=29), 0, "completed", task_id="t2")]), 0)
+
+    def test_period_start(self):
+        self.assertEqual(period_start("week", date(2026, 10, 17)), date(2026, 10, 12))
+        self.assertEqual(period_start("month", date(2026, 10, 17)), date(2026, 10, 1))
+        with self.assertRaises(ValueError):
+            period_start("year", DAY)
+
+class ReportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.task_mgr = TaskManager(Storage(self.tmp.name))
+        for username in ("alice", "bob"):
+            self.task_mgr.storage.add_user_if_new(username, None)
+
+    def today(self, username):
+        summary = self.task_mgr.rollups.summary(date.today() - timedelta(days=1), date.today() + timedelta(days=1))
+        return summary["users"].get(username)
+
+    def test_reminder_then_completion_is_not_a_miss(self):
+        task_id = self.task_mgr.add_task("alice", "Dishes", "daily")
+        self.task_mgr.log_incomplete_tasks()
+        self.task_mgr.toggle_task("alice", task_id)
+        self.task_mgr.update_rollups()
+        alice = self.today("alice")
+        self.assertEqual((alice["completed"], alice["incomplete"], alice["rate"]), (1, 0, 1.0))
+
+    def test_completion_by_someone_else_counts_for_the_owner(self):
+        task_id = self.task_mgr.add_task("alice", "Dishes", "daily")
+        self.task_mgr.toggle_task("alice", task_id, actor="bob")
+        self.task_mgr.update_rollups()
+        self.assertEqual(self.today("alice")["completed"], 1)
+        self.assertIsNone(self.today("bob"))
+        # History still shows who pressed the button
+        entry = self.task_mgr.get_history()[-1]
+        self.assertEqual((entry["user"], entry["owner"]), ("bob", "alice"))
+
+if __name__ == "__main__":
+    unittest.main()
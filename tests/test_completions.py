@@ -0,0 +1,95 @@
+# test_completions.py
+# CompletionSet bit arithmetic, checked against a plain set of ISO dates.
+
+import json
+import random
+import unittest
+from datetime import date, timedelta
+from completions import CompletionSet, compact_completions, json_default
+
+def iso(offset, start=date(2026, 1, 1)):
+    return (start + timedelta(days=offset)).isoformat()
+
+class CompletionSetTest(unittest.TestCase):
+    def test_matches_a_reference_set(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            completions, reference = CompletionSet(), set()
+            for _ in range(200):
+                day = iso(rng.randint(-100, 100))
+                if rng.random() < 0.7:
+                    completions.add(day)
+                    reference.add(day)
+                elif day in reference:
+                    completions.remove(day)
+                    reference.remove(day)
+                else:
+                    self.assertNotIn(day, completions)
+            self.assertEqual(list(completions), sorted(reference))
+            self.assertEqual(len(completions), len(reference))
+            self.assertEqual(completions.earliest(), min(map(date.fromisoformat, reference), default=None))
+            self.assertEqual(completions.latest(), max(map(date.fromisoformat, reference), default=None))
+
+    def test_add_before_base_shifts_existing_days(self):
+        completions = CompletionSet([iso(10), iso(12)])
+        completions.add(iso(3))
+        self.assertEqual(list(completions), [iso(3), iso(10), iso(12)])
+        self.assertIn(date(2026, 1, 11), completions)
+        self.assertNotIn(iso(2), completions)
+
+    def test_accepts_strings_dates_and_ordinals(self):
+        completions = CompletionSet([iso(0)])
+        self.assertIn(date(2026, 1, 1), completions)
+        self.assertIn(date(2026, 1, 1).toordinal(), completions)
+        self.assertNotIn("not a date", completions)
+        self.assertNotIn(None, completions)
+
+    def test_remove_missing_day_raises_like_list(self):
+        with self.assertRaises(ValueError):
+            CompletionSet([iso(0)]).remove(iso(1))
+
+    def test_remove_lowest_day_moves_base(self):
+        completions = CompletionSet([iso(0), iso(5)])
+        completions.remove(iso(0))
+        self.assertEqual(completions.earliest(), date(2026, 1, 6))
+        completions.remove(iso(5))
+        self.assertFalse(completions)
+        self.assertIsNone(completions.latest())
+        completions.add(iso(-3))
+        self.assertEqual(list(completions), [iso(-3)])
+
+    def test_on_or_after_and_before(self):
+        completions = CompletionSet([iso(5), iso(9)])
+        self.assertTrue(completions.completed_on_or_after(iso(9)))
+        self.assertFalse(completions.completed_on_or_after(iso(10)))
+        self.assertTrue(completions.completed_on_or_before(iso(5)))
+        self.assertFalse(completions.completed_on_or_before(iso(4)))
+        self.assertFalse(CompletionSet().completed_on_or_after(iso(0)))
+
+    def test_trim_drops_only_earlier_days(self):
+        completions = CompletionSet([iso(0), iso(3), iso(7)])
+        completions.trim(iso(1))
+        self.assertEqual(list(completions), [iso(3), iso(7)])
+        completions.trim(iso(0))
+        self.assertEqual(list(completions), [iso(3), iso(7)])
+        completions.trim(iso(8))
+        self.assertFalse(completions)
+
+    def test_compact_trims_daily_but_not_one_time(self):
+        old, recent = (date.today() - timedelta(days=400)).isoformat(), date.today().isoformat()
+        self.assertEqual(list(compact_completions({"type": "daily", "completions": [old, recent]})), [recent])
+        self.assertEqual(list(compact_completions({"type": "one-time", "completions": [old, recent]})), [old, recent])
+
+    def test_copy_equality_and_json(self):
+        completions = CompletionSet([iso(2), iso(1)])
+        copy = completions.copy()
+        copy.add(iso(3))
+        self.assertEqual(list(completions), [iso(1), iso(2)])
+        self.assertEqual(completions, [iso(2), iso(1)])
+        emptied = CompletionSet([iso(4)])
+        emptied.remove(iso(4))
+        self.assertEqual(emptied, CompletionSet())
+        self.assertEqual(json.loads(json.dumps({"c": completions}, default=json_default)), {"c": [iso(1), iso(2)]})
+
+if __name__ == "__main__":
+    unittest.main()
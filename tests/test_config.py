@@ -0,0 +1,42 @@
+# test_config.py
+# Importing config has no side effects: .env is loaded on first access to a setting, if dotenv is installed.
+
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code, **env):
+    """Run code in a fresh interpreter with the repo importable; returns its stdout."""
+    environ = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    for name in ("BOT_TOKEN", "LOG_LEVEL", "WEBHOOK_SECRET"):
+        environ.pop(name, None)
+    environ.update(env)
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], env=environ,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+class ConfigImportTest(unittest.TestCase):
+    def test_import_defers_dotenv_and_secret(self):
+        output = run("""
+            import secrets, sys
+            secrets.token_urlsafe = None  # would fail if called at import
+            import config
+            print(config._env_loaded, "dotenv" in sys.modules)
+        """)
+        self.assertEqual(output, "False False")
+
+    def test_settings_without_dotenv(self):
+        output = run("""
+            import sys
+            sys.modules["dotenv"] = None  # as if python-dotenv weren't installed
+            import config
+            print(config.LOG_LEVEL, config.WEBHOOK_PORT + 1, config.ADMIN_USERS, config.WRITE_BEHIND)
+        """, ADMIN_USERS="@alice, bob", WEBHOOK_PORT="8000")
+        self.assertEqual(output, "INFO 8001 ['alice', 'bob'] False")
+
+if __name__ == "__main__":
+    unittest.main()
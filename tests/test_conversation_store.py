@@ -0,0 +1,79 @@
+# test_conversation_store.py
+# ConversationStore TTL/LRU behaviour and deferred, filtered persistence.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from conversation_store import ConversationStore
+
+class ConversationStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "user_states.json")
+
+    def store(self, ttl=60, max_size=10):
+        return ConversationStore(ttl, max_size, self.path, persist_if=lambda state: "step" in state)
+
+    def test_changes_only_mark_dirty_until_saved(self):
+        store = self.store()
+        store.set(1, {"step": "title"})
+        self.assertTrue(store.dirty)
+        self.assertFalse(os.path.exists(self.path))
+        store.save()
+        self.assertFalse(store.dirty)
+        self.assertEqual(self.store().get(1), {"step": "title"})
+
+    def test_view_only_states_are_not_saved(self):
+        store = self.store()
+        store.set(1, {"view": "all", "page": 2})
+        store.set(1, {"view": "all", "page": 3})
+        self.assertFalse(store.dirty)
+        store.set(2, {"step": "days", "days": ["Mon"]})
+        store.save()
+        restored = self.store()
+        self.assertIsNone(restored.get(1))
+        self.assertEqual(restored.get(2), {"step": "days", "days": ["Mon"]})
+
+    def test_replacing_or_popping_a_flow_marks_dirty(self):
+        store = self.store()
+        store.set(1, {"step": "title"})
+        store.save()
+        store.set(1, {"view": "all", "page": 0})
+        self.assertTrue(store.dirty)
+        store.save()
+        store.set(2, {"step": "edit"})
+        store.save()
+        self.assertEqual(store.pop(2), {"step": "edit"})
+        self.assertTrue(store.dirty)
+
+    def test_expiry_and_eviction(self):
+        store = self.store(ttl=10, max_size=2)
+        with mock.patch("conversation_store.time.time", return_value=1000):
+            store.set(1, {"step": "a"})
+            store.set(2, {"step": "b"})
+            store.set(3, {"step": "c"})
+            self.assertEqual(store.stats()["evicted"], 1)
+        with mock.patch("conversation_store.time.time", return_value=1005):
+            self.assertEqual(store.update(2, title="x"), {"step": "b", "title": "x"})
+        with mock.patch("conversation_store.time.time", return_value=1012):
+            self.assertNotIn(3, store)
+            self.assertIn(2, store)
+            self.assertEqual(store.stats(), {"active": 1, "expired": 1, "evicted": 1})
+
+    def test_reading_a_flow_saves_its_refreshed_expiry(self):
+        store = self.store(ttl=10)
+        with mock.patch("conversation_store.time.time", return_value=1000):
+            store.set(1, {"step": "title"})
+            store.save()
+        with mock.patch("conversation_store.time.time", return_value=1008):
+            self.assertEqual(store.get(1), {"step": "title"})
+            self.assertTrue(store.dirty)
+            store.save()
+        # Past the first expiry but within the refreshed one
+        with mock.patch("conversation_store.time.time", return_value=1015):
+            self.assertEqual(self.store(ttl=10).get(1), {"step": "title"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# test_dispatcher.py
+# ReminderDispatcher against a local fake bot: rate limits, retries and per-recipient results.
+
+import asyncio
+import time
+import unittest
+from unittest import mock
+from telegram.error import Forbidden, RetryAfter, TimedOut
+from dispatcher import ReminderDispatcher, TokenBucket
+
+class FakeBot:
+    """Records send_message calls; errors[chat_id] lists exceptions to raise on successive sends."""
+    def __init__(self, errors=None):
+        self.errors = {chat_id: list(queue) for chat_id, queue in (errors or {}).items()}
+        self.sent = []
+        self.attempts = []
+
+    async def send_message(self, chat_id, text):
+        self.attempts.append((chat_id, time.monotonic()))
+        queue = self.errors.get(chat_id)
+        if queue:
+            raise queue.pop(0)
+        self.sent.append((chat_id, text))
+
+def payload(chat_id, text="hi"):
+    return {"username": f"user{chat_id}", "chat_id": chat_id, "text": text}
+
+class TokenBucketTest(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=20, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        self.assertLess(time.monotonic() - started, 0.04)
+        for _ in range(4):
+            await bucket.acquire()
+        # Four more tokens at 20/s take about 0.2s once the burst is spent
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+class ReminderDispatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def test_sends_every_payload_once(self):
+        bot = FakeBot()
+        results = await ReminderDispatcher(bot, concurrency=4, global_rate=1000, per_chat_rate=1000).send_all(
+            [payload(chat_id) for chat_id in range(10)])
+        self.assertEqual(sorted(bot.sent), [(chat_id, "hi") for chat_id in range(10)])
+        self.assertEqual([r["chat_id"] for r in results], list(range(10)))
+        self.assertTrue(all(r["ok"] and r["attempts"] == 1 and r["error"] is None for r in results))
+
+    async def test_per_chat_rate_spaces_messages_to_one_chat(self):
+        bot = FakeBot()
+        await ReminderDispatcher(bot, concurrency=4, global_rate=1000, per_chat_rate=10).send_all(
+            [payload(1, "a"), payload(1, "b"), payload(1, "c"), payload(2, "d")])
+        times = [at for chat_id, at in bot.attempts if chat_id == 1]
+        self.assertEqual(len(times), 3)
+        self.assertTrue(all(later - earlier >= 0.08 for earlier, later in zip(times, times[1:])))
+
+    async def test_global_rate_limits_across_chats(self):
+        bot = FakeBot()
+        started = time.monotonic()
+        await ReminderDispatcher(bot, concurrency=10, global_rate=20, per_chat_rate=1000).send_all(
+            [payload(chat_id) for chat_id in range(30)])
+        # A burst of 20, then 10 more at 20/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+        self.assertEqual(len(bot.sent), 30)
+
+    async def test_retry_after_waits_and_retries(self):
+        bot = FakeBot({7: [RetryAfter(3)]})
+        with mock.patch("dispatcher.asyncio.sleep", new=mock.AsyncMock()) as sleep:
+            [result] = await ReminderDispatcher(bot, global_rate=1000, per_chat_rate=1000).send_all([payload(7)])
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["attempts"], 2)
+        self.assertIsNone(result["error"])
+        sleep.assert_any_await(3.0)
+
+    async def test_timed_out_backs_off_exponentially(self):
+        bot = FakeBot({7: [TimedOut(), TimedOut()]})
+        with mock.patch("dispatcher.asyncio.sleep", new=mock.AsyncMock()) as sleep:
+            [result] = await ReminderDispatcher(bot, global_rate=1000, per_chat_rate=1000).send_all([payload(7)])
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["attempts"], 3)
+        self.assertEqual([c.args[0] for c in sleep.await_args_list if c.args[0] >= 1], [1, 2])
+
+    async def test_gives_up_after_max_retries(self):
+        bot = FakeBot({7: [TimedOut()] * 5})
+        with mock.patch("dispatcher.asyncio.sleep", new=mock.AsyncMock()):
+            [result] = await ReminderDispatcher(bot, global_rate=1000, per_chat_rate=1000, max_retries=2).send_all(
+                [payload(7)])
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["attempts"], 3)
+        self.assertIsNotNone(result["error"])
+
+    async def test_permanent_errors_are_not_retried_and_others_still_sent(self):
+        bot = FakeBot({1: [Forbidden("bot was blocked by the user")]})
+        results = await ReminderDispatcher(bot, global_rate=1000, per_chat_rate=1000).send_all(
+            [payload(1), payload(2)])
+        self.assertEqual([(r["chat_id"], r["ok"], r["attempts"]) for r in results], [(1, False, 1), (2, True, 1)])
+        self.assertIn("blocked", results[0]["error"])
+        self.assertEqual(bot.sent, [(2, "hi")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# test_history_log.py
+# HistoryLog appends, incremental refresh, retention and cursor paging.
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from history_log import HistoryLog
+
+def entry(days_ago, n, user="alice", status="completed"):
+    timestamp = (datetime.now() - timedelta(days=days_ago)).replace(hour=12, minute=0, second=n % 60,
+                                                                     microsecond=n)
+    return {"task_id": f"t{n}", "title": f"Task {n}", "status": status, "timestamp": timestamp.isoformat(),
+            "user": user}
+
+class HistoryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log = HistoryLog(os.path.join(self.tmp.name, "history"), retention_days=10)
+
+    def fill(self, days=5, per_day=4):
+        entries = [entry(days_ago, days_ago * 100 + n, user="alice" if n % 2 else "bob")
+                   for days_ago in range(days - 1, -1, -1) for n in range(per_day)]
+        for e in entries:
+            self.log.append(e)
+        return entries
+
+    def test_pages_newest_first(self):
+        entries = self.fill()
+        page, total, cursor = self.log.page(0, 3)
+        self.assertEqual(total, len(entries))
+        self.assertEqual(page, entries[::-1][:3])
+        self.assertEqual(self.log.page(1, 3)[0], entries[::-1][3:6])
+        self.assertEqual(self.log.page(100, 3), ([], len(entries), None))
+
+    def test_cursor_ignores_new_events(self):
+        entries = self.fill()
+        first, _, cursor = self.log.page(0, 3)
+        self.log.append(entry(0, 99))
+        second, _, _ = self.log.page(size=3, before=cursor)
+        self.assertEqual(second, entries[::-1][3:6])
+
+    def test_filters_combine(self):
+        entries = self.fill()
+        self.log.append(entry(0, 7, user="alice", status="deleted"))
+        page, total, _ = self.log.page(0, 50, user="alice", status="completed")
+        expected = [e for e in entries if e["user"] == "alice"][::-1]
+        self.assertEqual((page, total), (expected, len(expected)))
+        self.assertEqual(self.log.page(0, 50, status="deleted")[1], 1)
+
+    def test_refresh_reads_appends_from_another_writer(self):
+        self.fill(days=1, per_day=2)
+        self.assertEqual(len(self.log.read()), 2)
+        other = HistoryLog(self.log.directory, retention_days=10)
+        other.append(entry(0, 50))
+        self.assertEqual(self.log.read()[-1]["task_id"], "t50")
+
+    def test_partial_and_torn_lines(self):
+        self.fill(days=1, per_day=1)
+        path = os.path.join(self.log.directory, f"{datetime.now().date().isoformat()}.jsonl")
+        late = entry(0, 60)
+        line = json.dumps(late)
+        with open(path, "a") as f:
+            f.write("{torn\n" + line[:10])
+        self.assertEqual(len(self.log.read()), 1)
+        with open(path, "a") as f:
+            f.write(line[10:] + "\n")
+        self.assertEqual(self.log.read()[-1], late)
+
+    def test_prune_drops_old_segments(self):
+        self.log.append(entry(30, 1))
+        self.log.prune(force=True)
+        self.assertEqual(os.listdir(self.log.directory), [])
+
+    def test_cursor_survives_retention_window_moving(self):
+        entries = self.fill(days=5, per_day=4)
+        newest_first = entries[::-1]
+        _, _, cursor = self.log.page(0, 6)
+        # Two days pass: the two oldest days leave the window and are pruned
+        self.log.retention_days = 2
+        self.log.prune(force=True)
+        page, total, cursor = self.log.page(size=6, before=cursor)
+        # 12 entries are retained; the total counts the 6 before the cursor
+        self.assertEqual(total, 6)
+        self.assertEqual(page, newest_first[6:12])
+        self.assertIsNone(cursor)
+        # A cursor from before the window moved still points at the same entry, not a renumbered one
+        _, _, old_cursor = self.log.page(0, 3)
+        self.log.retention_days = 1
+        self.assertEqual(self.log.page(size=3, before=old_cursor)[0], newest_first[3:6])
+        filtered, _, _ = self.log.page(0, 50, user="bob")
+        self.assertEqual(filtered, [e for e in newest_first[:8] if e["user"] == "bob"])
+
+    def test_pages_count_back_from_a_pinned_cursor(self):
+        entries = self.fill()
+        top = self.log.cursor()
+        self.log.append(entry(0, 98))
+        self.log.append(entry(0, 99))
+        self.assertEqual(self.log.page(1, 3, before=top)[0], entries[::-1][3:6])
+
+    def test_owner_filter_includes_own_actions(self):
+        self.log.append(entry(0, 1, user="alice"))
+        self.log.append(dict(entry(0, 2, user="bob"), owner="alice"))
+        self.log.append(dict(entry(0, 3, user="alice"), owner="bob"))
+        page, total, _ = self.log.page(0, 10, owner="alice")
+        self.assertEqual(([e["task_id"] for e in page], total), (["t2", "t1"], 2))
+        self.assertEqual([e["task_id"] for e in self.log.page(0, 10, user="alice")[0]], ["t3", "t1"])
+
+if __name__ == "__main__":
+    unittest.main()
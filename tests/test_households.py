@@ -0,0 +1,36 @@
+# test_households.py
+# HouseholdPool: reading every household's user settings doesn't open (or evict) shards.
+
+import os
+import tempfile
+import unittest
+from async_storage import BlockingIO
+from households import Households, HouseholdPool
+from storage import create_storage
+
+class HouseholdPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.households = Households(os.path.join(self.tmp.name, "households.json"), self.tmp.name)
+        self.io = BlockingIO(2)
+        self.addAsyncCleanup(self.io.close)
+        self.pool = HouseholdPool(self.households, self.io, max_open=1)
+
+    async def test_user_settings_leave_the_pool_alone(self):
+        ids = []
+        for chat_id in (1, 2, 3):
+            household_id, _ = self.households.create(chat_id, f"Home {chat_id}")
+            storage = create_storage(self.households.data_dir(household_id))
+            storage.add_user_if_new(f"user{chat_id}", chat_id)
+            storage.set_user_settings(f"user{chat_id}", reminder_time="08:30")
+            ids.append(household_id)
+        open_home = await self.pool.get(ids[0])
+        for chat_id, household_id in enumerate(ids, 1):
+            settings = await self.pool.user_settings(household_id)
+            self.assertEqual(settings[f"user{chat_id}"]["reminder_time"], "08:30")
+        self.assertEqual(list(self.pool._open), [ids[0]])
+        self.assertIs(await self.pool.get(ids[0]), open_home)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+# test_sqlite_storage.py
+# SQLiteStorage: tasks, completions and history survive a reopen and the one-time import from JSON.
+
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from sqlite_storage import SQLiteStorage
+from storage import Storage
+
+def comparable(storage):
+    return {
+        username: [(task["id"], task["title"], task["type"], task["time"], task.get("date"), task.get("days"),
+                    list(task["completions"])) for task in storage.get_user_tasks(username)]
+        for username in storage.get_all_users()
+    }
+
+def history(storage):
+    return [(e["task_id"], e["title"], e["status"], e["user"], e.get("owner")) for e in storage.get_history()]
+
+class SQLiteStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        self.db = os.path.join(self.dir, "tasks.db")
+        today = date.today()
+        self.days = [(today - timedelta(days=n)).isoformat() for n in (2, 1)]
+        self.tasks = [
+            {"id": "t1", "title": "Dishes", "type": "daily", "time": "19:00", "completions": self.days},
+            {"id": "t2", "title": "Mow", "type": "recurring", "time": "10:00", "days": ["Mon", "Thu"]},
+            {"id": "t3", "title": "Books", "type": "one-time", "time": "23:59", "date": today.isoformat()},
+        ]
+
+    def fill(self, storage):
+        storage.add_user_if_new("alice", 1)
+        storage.set_user_settings("alice", timezone="Europe/Paris", reminder_time="08:00")
+        storage.save_tasks([("alice", self.tasks[0]), ("alice", self.tasks[1]), ("bob", self.tasks[2])])
+        storage.log_history(self.tasks[0], "completed", "alice")
+        storage.log_history(self.tasks[2], "completed", "alice", owner="bob")
+
+    def test_round_trip(self):
+        self.fill(SQLiteStorage(self.db, self.dir))
+        reopened = SQLiteStorage(self.db, self.dir)
+        self.assertEqual(comparable(reopened), {
+            "alice": [("t1", "Dishes", "daily", "19:00", None, None, self.days),
+                      ("t2", "Mow", "recurring", "10:00", None, ["Mon", "Thu"], [])],
+            "bob": [("t3", "Books", "one-time", "23:59", date.today().isoformat(), None, [])],
+        })
+        self.assertEqual(history(reopened), [("t1", "Dishes", "completed", "alice", None),
+                                             ("t3", "Books", "completed", "alice", "bob")])
+        self.assertEqual(reopened.get_user_settings("alice"), {"timezone": "Europe/Paris", "reminder_time": "08:00"})
+
+    def test_migrates_json_once(self):
+        source = Storage(self.dir)
+        self.fill(source)
+        expected_tasks, expected_history = comparable(source), history(source)
+        migrated = SQLiteStorage(self.db, self.dir)
+        self.assertEqual(comparable(migrated), expected_tasks)
+        self.assertEqual(history(migrated), expected_history)
+        self.assertEqual(migrated.get_all_user_settings()["alice"]["chat_id"], 1)
+        # Later changes to the JSON files are not imported again
+        source.delete_task("bob", "t3")
+        self.assertEqual(comparable(SQLiteStorage(self.db, self.dir)), expected_tasks)
+
+    def test_delete_logs_the_deleted_task(self):
+        storage = SQLiteStorage(self.db, self.dir)
+        self.fill(storage)
+        storage.delete_task("alice", "t1")
+        with self.assertRaises(ValueError):
+            storage.delete_task("alice", "t3")  # bob's task
+        removed = storage.delete_tasks([("alice", "t2"), ("alice", "t2"), ("alice", "t3")])
+        self.assertEqual([(username, task["id"]) for username, task in removed], [("alice", "t2")])
+        self.assertEqual([entry for entry in history(storage) if entry[2] == "deleted"],
+                         [("t1", "Dishes", "deleted", "alice", None), ("t2", "Mow", "deleted", "alice", None)])
+        self.assertEqual({username: [task[0] for task in tasks] for username, tasks in comparable(storage).items()},
+                         {"alice": [], "bob": ["t3"]})
+
+    def test_history_pages_by_owner_from_a_cursor(self):
+        storage = SQLiteStorage(self.db, self.dir)
+        for n in range(5):
+            storage.log_history({"id": f"a{n}", "title": f"A{n}"}, "completed", "alice")
+        storage.log_history({"id": "b0", "title": "B0"}, "completed", "alice", owner="bob")
+        top = storage.get_history_cursor()
+        storage.log_history({"id": "a9", "title": "A9"}, "completed", "alice")
+        entries, total, next_cursor = storage.get_history_page(1, 2, before=top, owner="alice")
+        self.assertEqual([e["task_id"] for e in entries], ["a2", "a1"])
+        self.assertEqual(total, 5)  # alice's entries before the cursor
+        self.assertEqual([e["task_id"] for e in storage.get_history_page(0, 2, before=next_cursor, owner="alice")[0]],
+                         ["a0"])
+        self.assertEqual([e["task_id"] for e in storage.get_history_page(0, 5, owner="bob")[0]], ["b0"])
+
+if __name__ == "__main__":
+    unittest.main()
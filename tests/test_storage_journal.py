@@ -0,0 +1,92 @@
+# test_storage_journal.py
+# Write-behind journaling in Storage: changes survive a crash before flush() and replay is idempotent.
+
+import json
+import os
+import tempfile
+import unittest
+from storage import Storage
+
+def task(task_id, title="Dishes", **fields):
+    return dict({"id": task_id, "title": title, "type": "daily", "time": "18:00"}, **fields)
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+
+    def open_write_behind(self):
+        storage = Storage(self.dir)
+        storage.write_behind = True
+        return storage
+
+    def crash(self, storage):
+        """Drop a Storage without flushing, as a killed process would."""
+        if storage._flush_timer is not None:
+            storage._flush_timer.cancel()
+        storage._journal.close()
+
+    def on_disk(self):
+        with open(os.path.join(self.dir, "tasks.json")) as f:
+            return json.load(f)
+
+    def test_unflushed_changes_are_journaled_not_written(self):
+        storage = self.open_write_behind()
+        storage.add_user_if_new("alice", 1)
+        storage.save_task("alice", task("t1"))
+        self.assertEqual(self.on_disk(), {"users": {}})
+        self.assertEqual([t["id"] for t in storage.get_user_tasks("alice")], ["t1"])
+        storage.flush()
+        self.assertEqual([t["id"] for t in self.on_disk()["users"]["alice"]["tasks"]], ["t1"])
+        self.assertEqual(os.path.getsize(storage.journal_file), 0)
+        self.crash(storage)
+
+    def test_flush_keeps_the_data_version(self):
+        storage = self.open_write_behind()
+        storage.add_user_if_new("alice", 1)
+        storage.save_task("alice", task("t1"))
+        version = storage.version
+        storage.flush()
+        self.assertEqual(storage.version, version)
+        storage.get_user_tasks("alice")
+        self.assertEqual(storage.version, version)
+        storage.save_task("alice", task("t2"))
+        self.assertNotEqual(storage.version, version)
+        self.crash(storage)
+
+    def test_replay_after_crash(self):
+        storage = self.open_write_behind()
+        storage.add_user_if_new("alice", 1)
+        storage.save_tasks([("alice", task("t1")), ("alice", task("t2", "Trash")), ("bob", task("t3", "Mow"))])
+        storage.save_task("alice", task("t1", "Dishes!", completions=["2026-10-01"]))
+        storage.delete_task("alice", "t2")
+        storage.delete_tasks([("bob", "t3")])
+        storage.set_user_settings("alice", timezone="Europe/Berlin")
+        self.crash(storage)
+
+        restored = Storage(self.dir)
+        self.assertFalse(os.path.exists(restored.journal_file))
+        alice = self.on_disk()["users"]["alice"]
+        self.assertEqual([(t["id"], t["title"], t["completions"]) for t in alice["tasks"]],
+                         [("t1", "Dishes!", ["2026-10-01"])])
+        self.assertEqual((alice["chat_id"], alice["timezone"]), (1, "Europe/Berlin"))
+        self.assertEqual(self.on_disk()["users"]["bob"]["tasks"], [])
+        # Replay re-applies changes without logging history a second time
+        self.assertEqual(sorted(e["task_id"] for e in restored.get_history()), ["t2", "t3"])
+
+    def test_replay_tolerates_changes_already_flushed_and_a_torn_line(self):
+        storage = self.open_write_behind()
+        storage.save_task("alice", task("t1"))
+        storage.delete_task("alice", "t1")
+        # A crash between rewriting tasks.json and truncating the journal replays both again
+        storage.save_data(storage.tasks_file, storage._indexed_data)
+        self.crash(storage)
+        with open(storage.journal_file, "a") as f:
+            f.write('{"op": "save_task", "args": ["alice"')
+
+        Storage(self.dir)
+        self.assertEqual(self.on_disk()["users"]["alice"]["tasks"], [])
+
+if __name__ == "__main__":
+    unittest.main()
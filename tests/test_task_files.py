@@ -0,0 +1,67 @@
+# test_task_files.py
+# Bulk import/export: an export imports back unchanged in both formats; bulk completion counts each task once.
+
+import tempfile
+import unittest
+from datetime import date, timedelta
+from io import StringIO
+from storage import Storage
+from task_manager import TaskManager
+
+def comparable(task_mgr):
+    return sorted(
+        (owner, task["title"], task["type"], task["time"], task.get("date"), tuple(task.get("days") or ()),
+         tuple(task["completions"]))
+        for owner in task_mgr.storage.get_all_users() for task in task_mgr.storage.get_user_tasks(owner))
+
+class ImportExportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def task_manager(self, name):
+        return TaskManager(Storage(f"{self.tmp.name}/{name}"))
+
+    def test_round_trip(self):
+        source = self.task_manager("source")
+        today = date.today()
+        overdue = (today - timedelta(days=3)).isoformat()
+        done_late = source.add_task("alice", "Return books", "one-time", "10:00", date=today.isoformat())
+        source.add_tasks_bulk([
+            {"owner": "alice", "title": "Dishes, then dry", "type": "daily", "time": "19:00"},
+            {"owner": "bob", "title": 'Mow "front" lawn', "type": "recurring", "days": "Mon,Thu"},
+            {"owner": "bob", "title": "Overdue", "type": "one-time", "date": overdue},
+        ])
+        source.toggle_task("alice", done_late)
+        for fmt in ("csv", "jsonl"):
+            with self.subTest(fmt=fmt):
+                exported = StringIO()
+                self.assertEqual(source.export_tasks(exported, fmt), 4)
+                target = self.task_manager(fmt)
+                target.import_tasks(StringIO(exported.getvalue()), fmt)
+                self.assertEqual(comparable(target), comparable(source))
+
+    def test_import_checks_date_format_but_allows_past(self):
+        task_mgr = self.task_manager("dates")
+        rows = "owner,title,type,date,completions\nalice,Old,one-time,2020-01-01,2020-01-01\n"
+        task_mgr.import_tasks(StringIO(rows), "csv")
+        [task] = task_mgr.storage.get_user_tasks("alice")
+        self.assertEqual((task["date"], list(task["completions"])), ("2020-01-01", ["2020-01-01"]))
+        with self.assertRaisesRegex(ValueError, "Row 1: Date must be"):
+            task_mgr.import_tasks(StringIO("owner,title,type,date\nalice,Bad,one-time,01/02/2020\n"), "csv")
+        with self.assertRaisesRegex(ValueError, "Row 2: Date must be"):
+            task_mgr.import_tasks(StringIO('{"owner": "a", "title": "T"}\n'
+                                           '{"owner": "a", "title": "T", "completions": ["yesterday"]}\n'), "jsonl")
+
+    def test_complete_bulk_skips_duplicate_items(self):
+        task_mgr = self.task_manager("bulk")
+        [dishes, laundry] = task_mgr.add_tasks_bulk([{"owner": "alice", "title": "Dishes"},
+                                                     {"owner": "alice", "title": "Laundry"}])
+        items = [("alice", dishes), ("alice", laundry), ("alice", dishes)]
+        self.assertEqual(task_mgr.complete_tasks_bulk(items), 2)
+        completed = [entry["title"] for entry in task_mgr.storage.get_history() if entry["status"] == "completed"]
+        self.assertEqual(sorted(completed), ["Dishes", "Laundry"])
+        self.assertEqual(task_mgr.complete_tasks_bulk(items), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# test_task_grid.py
+# All Tasks grid paging: page boundaries fit one message, survive toggles, and pages render on their own.
+
+import re
+import tempfile
+import unittest
+from datetime import date, timedelta
+from storage import Storage
+from task_manager import TaskManager
+from ui import UI
+
+class TaskGridTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.task_mgr = TaskManager(Storage(self.tmp.name))
+        self.ui = UI()
+        rows = [{"owner": f"user{i % 3}", "title": f"Task {i} " + "x" * (i * 7 % 180)} for i in range(150)]
+        self.ids = self.task_mgr.add_tasks_bulk(rows)
+
+    def layout(self):
+        return self.ui.task_layout(self.task_mgr.get_due_tasks_view())
+
+    def render(self, layout, page):
+        _, task_ids = self.ui.layout_page(layout, page)
+        return self.ui.task_page_message_and_keyboard(layout, page, self.task_mgr.get_grid_tasks(task_ids))
+
+    def test_pages_fit_and_number_continuously(self):
+        layout = self.layout()
+        self.assertGreater(len(layout), 3)
+        numbers = []
+        for page in range(len(layout)):
+            message, keyboard = self.render(layout, page)
+            self.assertLess(len(message), 4096)
+            numbers += [int(n) for n in re.findall(r"^(\d+)\. ", message, re.MULTILINE)]
+            callbacks = [button.callback_data for row in keyboard.inline_keyboard for button in row]
+            self.assertEqual(page > 0, f"tasks_page_{page - 1}" in callbacks)
+            self.assertEqual(page + 1 < len(layout), f"tasks_page_{page + 1}" in callbacks)
+        self.assertEqual(list(range(1, 151)), numbers)
+        # A page past the end shows the last one
+        self.assertEqual(self.render(layout, len(layout) - 1), self.render(layout, len(layout) + 5))
+
+    def test_toggle_keeps_layout_version(self):
+        version = self.task_mgr.layout_version()
+        self.task_mgr.toggle_task("user0", self.ids[0])
+        self.task_mgr.toggle_task("user1", self.ids[1])
+        self.assertEqual(version, self.task_mgr.layout_version())
+        message, _ = self.render(self.layout(), 0)
+        self.assertIn("✅", message)
+        self.task_mgr.edit_task("user0", self.ids[0], title="Renamed")
+        self.assertNotEqual(version, self.task_mgr.layout_version())
+
+    def test_completing_overdue_task_changes_layout_version(self):
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        [task_id] = self.task_mgr.add_tasks_bulk([{"owner": "user0", "title": "Late", "type": "one-time",
+                                                   "date": yesterday}])
+        version = self.task_mgr.layout_version()
+        self.task_mgr.toggle_task("user0", task_id)
+        self.assertNotEqual(version, self.task_mgr.layout_version())
+
+    def test_deleted_task_is_left_out_of_its_page(self):
+        layout = self.layout()
+        self.task_mgr.delete_task("user0", self.ids[0])
+        message, keyboard = self.render(layout, 0)
+        self.assertNotIn("Task 0 ", message)
+        self.assertIn("**user0's Tasks**", message)
+        self.assertEqual("2", keyboard.inline_keyboard[0][0].text)
+
+if __name__ == "__main__":
+    unittest.main()
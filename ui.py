@@ -5,23 +5,55 @@ Dependencies: python-telegram-bot>=21.0
 Last Modified: 2025-03-01
 """
 
+from collections import OrderedDict
 from datetime import datetime
-try:
-    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-except ImportError:
-    raise ImportError(
-        "Could not import telegram module. "
-        "Please install it using 'pip install python-telegram-bot>=21.0'"
-    )
 from config import TASK_TYPES
+from completions import task_completions
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Telegram rejects messages over 4096 characters; leave room for the header and page footer
+MAX_MESSAGE_CHARS = 3900
+# Longest title shown in the task grid and history, so one huge title can't fill a message
+MAX_TITLE_CHARS = 200
+TASKS_HEADER = "Click a number to toggle task status:\n"
+# Shown before the due date of a one-time task that is past due and not yet done
+OVERDUE_MARK = "‼ "
+
+# Bound on first UI() by _import_telegram(); importing telegram costs more than the rest of the bot's
+# modules together, so code that only formats text (or never builds a UI) doesn't pay for it
+InlineKeyboardButton = InlineKeyboardMarkup = None
+
+def _import_telegram():
+    global InlineKeyboardButton, InlineKeyboardMarkup
+    if InlineKeyboardButton is not None:
+        return
+    try:
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    except ImportError:
+        raise ImportError(
+            "Could not import telegram module. "
+            "Please install it using 'pip install python-telegram-bot>=21.0'"
+        )
+
+def _clip(title):
+    return title if len(title) <= MAX_TITLE_CHARS else title[:MAX_TITLE_CHARS - 1] + "…"
+
 class UI:
     def __init__(self):
+        _import_telegram()
         self.days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
         self.history_page_size = 10  # Number of history entries per page
+        self.tasks_page_size = 40  # Most tasks (and toggle buttons) per All Tasks page
+        # Rendered task grid pages and their layouts keyed by view, user, day and version, most recent last
+        self._views = OrderedDict()
+        self.max_cached_views = 64
+        # Per-task line text for the current day and the toggle keyboard per task-ID sequence,
+        # so a refresh after one toggle only re-renders the line that changed
+        self._lines = {}
+        self._lines_day = None
+        self._toggle_keyboards = OrderedDict()
 
     def main_menu(self, users=None):
         """Generate the main menu keyboard with user-specific buttons, without Add Task."""
@@ -164,83 +196,214 @@ class UI:
         buttons.append([InlineKeyboardButton("Back to Main Menu", callback_data="back")])
         return InlineKeyboardMarkup(buttons)
 
-    def all_tasks_message_and_keyboard(self, tasks, username=None):
-        """Generate message and keyboard for all tasks with number toggle buttons."""
-        if not tasks:
-            message = f"No tasks due today for @{username}!" if username else "No tasks found!"
-            keyboard = [[InlineKeyboardButton("Back to Main Menu", callback_data="back")]]
-        else:
-            today = datetime.now().date()
-            today_str = today.isoformat()
-            weekday = today.strftime("%a")
-            message = "Click a number to toggle task status:\n"
-            task_index = 1
-            task_mapping = []
-            for user in sorted(set(task.get("owner", username) for task in tasks if "owner" in task or username)):  # Use username as fallback
-                user_tasks = [t for t in tasks if t.get("owner", username) == user]
-                if user_tasks:
-                    message += f"\n**{user}'s Tasks**\n"
-                    for task in user_tasks:
-                        status = "✅" if today_str in task.get("completions", []) else "❌"  # Check completions for status
-                        task_type = task.get("type", "daily")
-                        if task_type == "one-time":
-                            due_date_str = task.get("date", "No date")
-                            if due_date_str != "No date":
-                                due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
-                                completions = task.get("completions", [])
-                                completed_on_or_after_due = any(datetime.strptime(c, "%Y-%m-%d").date() >= due_date for c in completions)
-                                overdue = "‼ " if due_date < today and not completed_on_or_after_due else ""
-                                due_month_day = due_date.strftime("%b %d")
-                                extra = f"{overdue}[{due_month_day}]"
-                            else:
-                                extra = "[No date]"
-                        elif task_type == "recurring":
-                            days = ",".join(task.get("days", []))
-                            extra = f"[{days}]"
-                        else:  # daily
-                            extra = "[Daily]"
-                        message += f"{task_index}. {task['title']} {status} {extra}\n"
-                        task_mapping.append((task["id"], task))  # Store task ID and task
-                        task_index += 1
-            
+    def cached_view(self, key):
+        """Return a (message, keyboard) or task layout stored under key by cache_view, or None."""
+        rendered = self._views.get(key)
+        if rendered is not None:
+            self._views.move_to_end(key)
+        return rendered
+
+    def cache_view(self, key, rendered):
+        """Remember a rendered (message, keyboard) or task layout; key should include the data version."""
+        self._views[key] = rendered
+        if len(self._views) > self.max_cached_views:
+            self._views.popitem(last=False)
+        return rendered
+
+    def _task_line(self, task, today_str):
+        """Return "title status [extra]" for one task in the grid, reusing it while its inputs are unchanged."""
+        completions = task_completions(task)
+        done_today = today_str in completions
+        key = (task["id"], today_str, task["title"], task.get("type", "daily"), task.get("date"),
+               tuple(task.get("days", ())), done_today, completions.latest())
+        line = self._lines.get(key)
+        if line is not None:
+            return line
+        status = "✅" if done_today else "❌"  # Check completions for status
+        task_type = task.get("type", "daily")
+        if task_type == "one-time":
+            due_date_str = task.get("date", "No date")
+            if due_date_str != "No date":
+                due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
+                completed_on_or_after_due = completions.completed_on_or_after(due_date)
+                overdue = OVERDUE_MARK if due_date_str < today_str and not completed_on_or_after_due else ""
+                due_month_day = due_date.strftime("%b %d")
+                extra = f"{overdue}[{due_month_day}]"
+            else:
+                extra = "[No date]"
+        elif task_type == "recurring":
+            days = ",".join(task.get("days", []))
+            extra = f"[{days}]"
+        else:  # daily
+            extra = "[Daily]"
+        line = self._lines[key] = f"{_clip(task['title'])} {status} {extra}"
+        return line
+
+    def _task_width(self, task, today_str):
+        """Length of a task's grid line whether or not it is completed.
+
+        ✅ and ❌ are the same length; only the overdue mark of an unfinished one-time task comes and
+        goes with completions, so it is always counted.
+        """
+        width = len(self._task_line(task, today_str))
+        due_date_str = task.get("date")
+        if (task.get("type", "daily") == "one-time" and due_date_str and due_date_str < today_str
+                and task_completions(task).completed_on_or_after(due_date_str)):
+            width += len(OVERDUE_MARK)
+        return width
+
+    def _toggle_keyboard(self, numbered_ids=(), page=0, more=False):
+        """Toggle buttons for one page's (number, task_id) pairs, page navigation and Back.
+
+        Reused while the page's tasks, numbering and neighbours are unchanged.
+        """
+        numbered_ids = tuple(numbered_ids)
+        key = (numbered_ids, page, more)
+        keyboard = self._toggle_keyboards.get(key)
+        if keyboard is None:
             buttons = [
-                InlineKeyboardButton(str(i + 1), callback_data=f"toggle_{task_id}")
-                for i, (task_id, _) in enumerate(task_mapping)
+                InlineKeyboardButton(str(number), callback_data=f"toggle_{task_id}")
+                for number, task_id in numbered_ids
             ]
-            keyboard = [buttons[i:i+5] for i in range(0, len(buttons), 5)]
-            keyboard.append([InlineKeyboardButton("Back to Main Menu", callback_data="back")])
-        return message, InlineKeyboardMarkup(keyboard)
-
-    def history_view(self, history, page=0):
-        """Generate message and keyboard for viewing task history."""
-        if not history:
-            text = "No history available."
-            keyboard = [[InlineKeyboardButton("Back to Main Menu", callback_data="back")]]
+            rows = [buttons[i:i+5] for i in range(0, len(buttons), 5)]
+            navigation = []
+            if page > 0:
+                navigation.append(InlineKeyboardButton("Previous", callback_data=f"tasks_page_{page - 1}"))
+            if more:
+                navigation.append(InlineKeyboardButton("Next", callback_data=f"tasks_page_{page + 1}"))
+            if navigation:
+                rows.append(navigation)
+            rows.append([InlineKeyboardButton("Back to Main Menu", callback_data="back")])
+            keyboard = self._toggle_keyboards[key] = InlineKeyboardMarkup(rows)
+            if len(self._toggle_keyboards) > self.max_cached_views:
+                self._toggle_keyboards.popitem(last=False)
+        return keyboard
+
+    def _lines_today(self):
+        """Return today's date, dropping cached lines from earlier days."""
+        today_str = datetime.now().date().isoformat()
+        if self._lines_day != today_str:
+            # Lines embed each day's status and overdue marks; start fresh each day
+            self._lines.clear()
+            self._lines_day = today_str
+        return today_str
+
+    def task_layout(self, tasks, username=None):
+        """Split the task grid into pages: a list of (first_number, [(task_id, heading or None)]).
+
+        Tasks are grouped by owner (username for tasks without one) and numbered across pages. A page
+        ends at tasks_page_size tasks or before its text could pass MAX_MESSAGE_CHARS. Line lengths
+        are counted as if no task were completed, so toggling completions never moves a page boundary
+        and a layout stays valid until tasks are added, edited or removed.
+        """
+        today_str = self._lines_today()
+        by_owner = {}
+        for task in tasks:
+            owner = task.get("owner", username)
+            if owner:
+                by_owner.setdefault(owner, []).append(task)
+        pages, entries, size, number = [], [], len(TASKS_HEADER), 0
+        for owner in sorted(by_owner):
+            heading = f"\n**{owner}'s Tasks**"
+            for task in by_owner[owner]:
+                number += 1
+                # Tasks from TaskManager carry their owner's local date as "today"
+                width = len(f"{number}. ") + self._task_width(task, task.get("today", today_str))
+                needed = width + 1 + (len(heading) + 1 if heading else 0)
+                if entries and (len(entries) >= self.tasks_page_size or size + needed > MAX_MESSAGE_CHARS):
+                    pages.append((number - len(entries), entries))
+                    entries, size = [], len(TASKS_HEADER)
+                    heading = heading or f"\n**{owner}'s Tasks (continued)**"
+                    needed = width + 1 + len(heading) + 1
+                entries.append((task["id"], heading))
+                heading = None
+                size += needed
+        if entries:
+            pages.append((number - len(entries) + 1, entries))
+        return pages
+
+    @staticmethod
+    def layout_page(layout, page):
+        """Return (page, task_ids) for a page of a task_layout(); a page past the end is the last page."""
+        if not layout:
+            return 0, []
+        page = max(0, min(page, len(layout) - 1))
+        return page, [task_id for task_id, _ in layout[page][1]]
+
+    def task_page_message_and_keyboard(self, layout, page, tasks, username=None):
+        """Generate message and keyboard for one page of a task_layout() with number toggle buttons.
+
+        `tasks` maps task ID to task for at least that page's tasks; tasks missing from it (deleted
+        since the layout was made) are left out. A page past the end shows the last page instead.
+        """
+        if not layout:
+            message = f"No tasks due today for @{username}!" if username else "No tasks found!"
+            return message, self._toggle_keyboard()
+        page, _ = self.layout_page(layout, page)
+        first, entries = layout[page]
+        today_str = self._lines_today()
+        lines, numbered_ids, pending_heading = [], [], None
+        for number, (task_id, heading) in enumerate(entries, first):
+            pending_heading = heading or pending_heading
+            task = tasks.get(task_id)
+            if task is None:
+                continue
+            if pending_heading:
+                lines.append(pending_heading)
+                pending_heading = None
+            lines.append(f"{number}. {self._task_line(task, task.get('today', today_str))}")
+            numbered_ids.append((number, task_id))
+        more = page + 1 < len(layout)
+        message = TASKS_HEADER + "\n".join(lines) + "\n"
+        if page or more:
+            message += f"\nPage {page + 1}"
+        return message, self._toggle_keyboard(numbered_ids, page, more)
+
+    def all_tasks_message_and_keyboard(self, tasks, username=None, page=0):
+        """Generate message and keyboard for one page of the task grid with number toggle buttons.
+
+        A page past the end (tasks were completed or deleted since) shows the last page instead.
+        """
+        layout = self.task_layout(tasks, username)
+        page, task_ids = self.layout_page(layout, page)
+        wanted = set(task_ids)
+        page_tasks = {task["id"]: task for task in tasks if task["id"] in wanted}
+        return self.task_page_message_and_keyboard(layout, page, page_tasks, username)
+
+    def history_view(self, entries, total, page=0, user=None, viewer=None, cursor=None, more=None):
+        """Generate message and keyboard for one page of task history (entries newest first).
+
+        `user` is the active owner filter, if any; `viewer` gets an "Only my tasks" filter button.
+        Previous/Next carry `cursor` (see TaskManager.get_history_cursor) so the pages stay put
+        while new events are logged; `more` says whether a next page exists (default: from total).
+        """
+        suffix = (f"_{cursor}" if cursor is not None else "") + (f"_{user}" if user else "")
+        if more is None:
+            more = (page + 1) * self.history_page_size < total
+        buttons = []
+        if not total:
+            text = f"No history available for @{user}." if user else "No history available."
         else:
-            sorted_history = sorted(history, key=lambda x: x["timestamp"], reverse=True)
-            total_entries = len(sorted_history)
-            start_idx = page * self.history_page_size
-            end_idx = min(start_idx + self.history_page_size, total_entries)
-            if start_idx >= total_entries:
-                start_idx = max(0, total_entries - self.history_page_size)
-                end_idx = total_entries
             lines = []
-            for entry in sorted_history[start_idx:end_idx]:
+            for entry in entries:
                 status = entry["status"].capitalize()
                 time = entry["timestamp"]
-                user = entry["user"]
-                title = entry["title"]
-                lines.append(f"{status}: {title} by {user} at {time}")
+                entry_user = entry["user"]
+                title = _clip(entry["title"])
+                lines.append(f"{status}: {title} by {entry_user} at {time}")
             text = "\n".join(lines) or "No history available."
-            if total_entries > self.history_page_size:
-                text += f"\n\nPage {page + 1} of {((total_entries - 1) // self.history_page_size) + 1}"
-            buttons = []
+            if total > self.history_page_size:
+                text += f"\n\nPage {page + 1} of {((total - 1) // self.history_page_size) + 1}"
             if page > 0:
-                buttons.append(InlineKeyboardButton("Previous", callback_data=f"history_{page - 1}"))
-            if end_idx < total_entries:
-                buttons.append(InlineKeyboardButton("Next", callback_data=f"history_{page + 1}"))
-            buttons.append(InlineKeyboardButton("Back to Main Menu", callback_data="back"))
-            keyboard = [buttons] if len(buttons) <= 3 else [buttons[:2], buttons[2:]]
+                buttons.append(InlineKeyboardButton("Previous", callback_data=f"history_{page - 1}{suffix}"))
+            if more:
+                buttons.append(InlineKeyboardButton("Next", callback_data=f"history_{page + 1}{suffix}"))
+        if user:
+            buttons.append(InlineKeyboardButton("Everyone", callback_data="history_0"))
+        elif viewer:
+            buttons.append(InlineKeyboardButton("Only my tasks", callback_data=f"history_0_{viewer}"))
+        buttons.append(InlineKeyboardButton("Back to Main Menu", callback_data="back"))
+        keyboard = [buttons] if len(buttons) <= 3 else [buttons[:2], buttons[2:]]
         return text, InlineKeyboardMarkup(keyboard)
 
     def reminder_message(self, tasks):
@@ -260,6 +423,26 @@ class UI:
             lines.append(f"- {task['title']} {extra}")
         return "\n".join(lines)
 
+    def due_alert_message(self, titles):
+        """Generate the alert sent when tasks reach their due time."""
+        return "\n".join(["Due now:"] + [f"- {title}" for title in titles])
+
+    def report_message(self, period, report):
+        """Generate the /report summary: per-user counts, rates and streaks, then the most completed tasks."""
+        current, previous = report["current"], report["previous"]
+        lines = [f"{period.capitalize()} report, {current['start']} to {current['end']}"]
+        if not current["users"]:
+            lines.append("No activity yet.")
+        for user, stats in sorted(current["users"].items()):
+            rate = f"{stats['rate']:.0%}" if stats["rate"] is not None else "n/a"
+            before = previous["users"].get(user, {}).get("completed", 0)
+            lines.append(f"@{user}: {stats['completed']} done (last {period}: {before}), {stats['incomplete']} missed, "
+                         f"{rate} done, streak {stats['streak']} (best {stats['best_streak']})")
+        if current["top_tasks"]:
+            lines.append("\nMost completed:")
+            lines += [f"- {title}: {count}" for title, count in current["top_tasks"]]
+        return "\n".join(lines)
+
     def error_message(self, error):
         """Generate an error message with a back button."""
         buttons = [[InlineKeyboardButton("Back to Main Menu", callback_data="back")]]